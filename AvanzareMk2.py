@@ -1,49 +1,44 @@
 # AvanzareMk2.py
 import os
-import discord
-from discord.ext import commands
-from bot.cogs import auth  # bot/cogs/auth.py の AuthCog
-from bot.config import BOT_TOKEN
-import threading
+import logging
+from bot.config import BOT_TOKEN, BOT_PROFILES, CLUSTER_COUNT
+from bot.logs import setup_logging
+from bot.startup import AvanzareBot, default_intents
+
+log = logging.getLogger(__name__)
+
 # ===============================
 # Bot 作成
 # ===============================
-intents = discord.Intents.default()
-intents.members = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+intents = default_intents()
 
 GUILD_ID = os.environ.get("TEST_GUILD_ID")  # ギルド同期用（任意）
 
+# Cog のロードとコマンド同期は setup_hook で行う（bot/startup.py）
+bot = AvanzareBot(command_prefix="!", intents=intents, sync_guild_id=GUILD_ID)
+
 # ===============================
 # on_ready
 # ===============================
 @bot.event
 async def on_ready():
-    print(f"[Bot] Logged in as {bot.user}")
-
-    # Cog ロード
-    try:
-        await bot.load_extension("bot.cogs.auth")
-        print("[Bot] AuthCog ロード完了")
-    except Exception as e:
-        print(f"[Bot] Cog ロード失敗: {e}")
-
-    # コマンド同期
-    try:
-        if GUILD_ID:
-            guild = discord.Object(id=int(GUILD_ID))
-            await bot.tree.sync(guild=guild)
-            print(f"[Bot] ギルド {GUILD_ID} にコマンド同期完了")
-        else:
-            await bot.tree.sync()
-            print("[Bot] グローバルコマンド同期完了")
-    except Exception as e:
-        print(f"[Bot] コマンド同期失敗: {e}")
+    log.info("ログインしました", extra={"user": str(bot.user)})
 
 # ===============================
 # 起動
 # ===============================
 if __name__ == "__main__":
-    if not BOT_TOKEN:
+    if not BOT_TOKEN and not BOT_PROFILES:
         raise RuntimeError("BOT_TOKEN が設定されていません")
-    bot.run(BOT_TOKEN)
+    setup_logging()
+    if BOT_PROFILES:
+        # 複数の Bot を1プロセスで起動（bot/host.py）
+        from bot.host import run_host
+        run_host()
+    elif CLUSTER_COUNT > 1:
+        # シャードを複数プロセスに分けて起動（bot/cluster.py）
+        from bot.cluster import run_cluster
+        run_cluster()
+    else:
+        # ログの設定は setup_logging で済ませているので discord.py 側では行わない
+        bot.run(BOT_TOKEN, log_handler=None)
@@ -0,0 +1,263 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import discord
+
+# Discord のスノーフレークらしい ID（上位ビットに時刻が入るのでシャード計算にも使える）
+_ids = itertools.count(1 << 60)
+MAX_RETRIES = 5
+
+
+def next_id() -> int:
+    return next(_ids)
+
+
+# --------------------------
+# REST 呼び出しの代わり（ローカルのスタンドインへ送る）
+# --------------------------
+class FakeRest:
+    def __init__(self, server):
+        self.server = server
+        self.calls = 0
+        self.rate_limited = 0
+
+    async def request(self, method: str, path: str, json=None):
+        # discord.py の HTTPClient と同じく 429 は retry_after だけ待って再送する
+        for _ in range(MAX_RETRIES):
+            self.calls += 1
+            async with self.server.session.request(method, self.server.url(f"/api/v10{path}"), json=json) as resp:
+                body = await resp.json(content_type=None)
+                if resp.status == 429:
+                    self.rate_limited += 1
+                    await asyncio.sleep(float(body.get("retry_after", 1.0)))
+                    continue
+                if resp.status >= 400:
+                    error = discord.NotFound if resp.status == 404 else discord.HTTPException
+                    raise error(SimpleNamespace(status=resp.status, reason=resp.reason), body)
+                return body
+        raise discord.HTTPException(SimpleNamespace(status=429, reason="Too Many Requests"), body)
+
+
+# --------------------------
+# 最小限の Discord オブジェクト
+# --------------------------
+class FakeAsset:
+    def __init__(self, url: str):
+        self.url = url
+
+
+class FakeRole:
+    def __init__(self, guild, name: str, role_id: int | None = None):
+        self.id = role_id or next_id()
+        self.guild = guild
+        self.name = name
+
+    def is_default(self) -> bool:
+        return self.id == self.guild.id
+
+
+class FakeMember:
+    def __init__(self, guild, name: str, bot: bool = False):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.roles = []
+        self.display_avatar = FakeAsset(f"https://cdn.example/avatars/{self.id}.png")
+        self.timed_out_until = None
+
+    def __str__(self):
+        return self.name
+
+    def get_role(self, role_id: int):
+        return next((r for r in self.roles if r.id == role_id), None)
+
+    def is_timed_out(self) -> bool:
+        return self.timed_out_until is not None
+
+    async def add_roles(self, *roles, reason=None):
+        await self.guild.rest.request("PUT", f"/guilds/{self.guild.id}/members/{self.id}/roles/{roles[0].id}")
+        self.roles.extend(r for r in roles if r not in self.roles)
+
+    async def remove_roles(self, *roles, reason=None):
+        await self.guild.rest.request("DELETE", f"/guilds/{self.guild.id}/members/{self.id}/roles/{roles[0].id}")
+        self.roles = [r for r in self.roles if r not in roles]
+
+    async def edit(self, *, roles=None, reason=None):
+        await self.guild.rest.request("PATCH", f"/guilds/{self.guild.id}/members/{self.id}")
+        if roles is not None:
+            self.roles = list(roles)
+
+    async def timeout(self, until, reason=None):
+        await self.guild.rest.request("PATCH", f"/guilds/{self.guild.id}/members/{self.id}")
+        self.timed_out_until = until
+
+    async def send(self, content=None, **kwargs):
+        # DM（チャンネル作成は省略）
+        return await self.guild.rest.request("POST", f"/users/{self.id}/messages", {"content": content})
+
+
+class FakeWebhook:
+    def __init__(self, channel, name: str):
+        self.id = next_id()
+        self.channel = channel
+        self.name = name
+        self.token = f"token-{self.id}"
+
+    async def send(self, content=None, *, username=None, avatar_url=None, allowed_mentions=None, **kwargs):
+        await self.channel.guild.rest.request(
+            "POST", f"/webhooks/{self.id}/{self.token}", {"content": content, "username": username}
+        )
+        return FakeSent(self.channel, next_id())
+
+    async def edit_message(self, message_id: int, *, content=None, **kwargs):
+        await self.channel.guild.rest.request(
+            "PATCH", f"/webhooks/{self.id}/{self.token}/messages/{message_id}", {"content": content}
+        )
+
+    async def delete_message(self, message_id: int):
+        await self.channel.guild.rest.request("DELETE", f"/webhooks/{self.id}/{self.token}/messages/{message_id}")
+
+
+class FakeSent:
+    # 送信したメッセージ（ID だけ持つ PartialMessage 相当）
+    __slots__ = ("channel", "id")
+
+    def __init__(self, channel, message_id: int):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, *, content=None, **kwargs):
+        await self.channel.guild.rest.request(
+            "PATCH", f"/channels/{self.channel.id}/messages/{self.id}", {"content": content}
+        )
+
+    async def delete(self):
+        await self.channel.guild.rest.request("DELETE", f"/channels/{self.channel.id}/messages/{self.id}")
+
+
+class FakeChannel:
+    def __init__(self, guild, name: str):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.hooks: list[FakeWebhook] = []
+        self.sent = 0
+        self.deleted = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+        await self.guild.rest.request("POST", f"/channels/{self.id}/messages", {"content": content})
+        return FakeSent(self, next_id())
+
+    def get_partial_message(self, message_id: int):
+        return FakeSent(self, message_id)
+
+    async def webhooks(self):
+        await self.guild.rest.request("GET", f"/channels/{self.id}/webhooks")
+        return list(self.hooks)
+
+    async def create_webhook(self, *, name: str, **kwargs):
+        await self.guild.rest.request("POST", f"/channels/{self.id}/webhooks", {"name": name})
+        hook = FakeWebhook(self, name)
+        self.hooks.append(hook)
+        return hook
+
+    async def delete_messages(self, messages, reason=None):
+        await self.guild.rest.request("POST", f"/channels/{self.id}/messages/bulk-delete")
+        self.deleted += len(messages)
+
+
+class FakeGuild:
+    def __init__(self, rest: FakeRest, name: str, channels: int = 1, members: int = 10):
+        self.id = next_id()
+        self.rest = rest
+        self.name = name
+        self.shard_id = 0
+        self.channels = [FakeChannel(self, f"{name}-ch{i}") for i in range(channels)]
+        self.members = {}
+        for i in range(members):
+            self.add_member(FakeMember(self, f"{name}-user{i}"))
+        self.roles = {}
+        self.me = FakeMember(self, "bench-bot", bot=True)
+
+    def add_member(self, member: FakeMember) -> FakeMember:
+        self.members[member.id] = member
+        return member
+
+    def add_role(self, name: str) -> FakeRole:
+        role = FakeRole(self, name)
+        self.roles[role.id] = role
+        return role
+
+    def get_channel(self, channel_id: int):
+        return next((c for c in self.channels if c.id == channel_id), None)
+
+    def get_role(self, role_id: int):
+        return self.roles.get(role_id)
+
+    def get_member(self, user_id: int):
+        return self.members.get(user_id)
+
+    async def query_members(self, *, user_ids: list[int], limit: int = 5, cache: bool = True):
+        # Gateway の REQUEST_GUILD_MEMBERS の代わり（1回の往復で複数人）
+        await self.rest.request("GET", f"/guilds/{self.id}/members")
+        return [m for m in (self.members.get(u) for u in user_ids[:limit]) if m is not None]
+
+    async def fetch_member(self, user_id: int):
+        await self.rest.request("GET", f"/guilds/{self.id}/members/{user_id}")
+        member = self.members.get(user_id)
+        if member is None:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Member")
+        return member
+
+
+class FakeMessage:
+    __slots__ = ("id", "guild", "channel", "author", "content", "attachments", "embeds", "deleted")
+
+    def __init__(self, channel: FakeChannel, author: FakeMember, content: str):
+        self.id = next_id()
+        self.guild = channel.guild
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.attachments = []
+        self.embeds = []
+        self.deleted = False
+
+    async def delete(self):
+        await self.guild.rest.request("DELETE", f"/channels/{self.channel.id}/messages/{self.id}")
+        self.deleted = True
+
+
+# --------------------------
+# Cog を動かすのに必要な分だけの Bot
+# --------------------------
+class FakeBot:
+    def __init__(self):
+        self.guilds: list[FakeGuild] = []
+        self.by_id: dict[int, FakeGuild] = {}
+        self.listeners: dict[str, list] = {}
+        self.latency = 0.0
+
+    def add_guild(self, guild: FakeGuild) -> FakeGuild:
+        self.guilds.append(guild)
+        self.by_id[guild.id] = guild
+        return guild
+
+    def get_guild(self, guild_id: int):
+        return self.by_id.get(guild_id)
+
+    def get_channel(self, channel_id: int):
+        return next((c for g in self.guilds if (c := g.get_channel(channel_id))), None)
+
+    def add_listener(self, func, name: str):
+        self.listeners.setdefault(name, []).append(func)
+
+    def dispatch(self, event: str, *args):
+        pass
+
+    async def wait_until_ready(self):
+        return None
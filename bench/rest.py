@@ -0,0 +1,76 @@
+import random
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+
+# --------------------------
+# Discord REST / OAuth トークンエンドポイントのスタンドイン
+# --------------------------
+class RestStandIn:
+    def __init__(self, latency: float = 0.02, jitter: float = 0.01, rate_limit: float = 0.0,
+                 retry_after: float = 0.05, seed: int = 0):
+        self.latency = latency          # 1リクエストあたりの応答遅延(秒)
+        self.jitter = jitter            # 遅延の揺らぎ(秒)
+        self.rate_limit = rate_limit    # 429 を返す確率
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.limited = 0
+
+        self.app = web.Application()
+        self.app.router.add_post("/api/oauth2/token", self.token)
+        self.app.router.add_route("*", "/api/v10/{tail:.*}", self.rest)
+        self.runner: web.AppRunner | None = None
+        self.session: aiohttp.ClientSession | None = None
+        self.port = 0
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        self.port = self.runner.addresses[0][1]
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+        if self.runner:
+            await self.runner.cleanup()
+
+    # ---------- 応答 ----------
+    async def _delay(self) -> bool:
+        # 遅延をかけて、429 を返すかどうかを決める
+        self.requests += 1
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.rate_limit and self.random.random() < self.rate_limit:
+            self.limited += 1
+            return True
+        return False
+
+    def _limited(self) -> web.Response:
+        return web.json_response(
+            {"message": "You are being rate limited.", "retry_after": self.retry_after, "global": False},
+            status=429,
+            headers={"Retry-After": str(self.retry_after), "X-RateLimit-Scope": "user"},
+        )
+
+    async def token(self, request: web.Request):
+        if await self._delay():
+            return self._limited()
+        form = await request.post()
+        return web.json_response({
+            "access_token": f"bench-{form.get('code', '')}",
+            "token_type": "Bearer",
+            "expires_in": 604800,
+            "scope": "identify guilds",
+        })
+
+    async def rest(self, request: web.Request):
+        if await self._delay():
+            return self._limited()
+        return web.json_response({"id": str(self.requests)})
@@ -0,0 +1,167 @@
+import gc
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BASELINE_DIR = os.path.join(ROOT, "bench", "baselines")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="hunyaBOT オフラインベンチマーク")
+    parser.add_argument("scenarios", nargs="*", help="実行するシナリオ（省略時はすべて）")
+    parser.add_argument("--messages", type=int, default=2000, help="1シナリオあたりのメッセージ数")
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=100, help="同時に処理するメッセージ数")
+    parser.add_argument("--latency", type=float, default=0.02, help="REST スタンドインの応答遅延(秒)")
+    parser.add_argument("--rate-limit", type=float, default=0.01, help="429 を返す確率")
+    parser.add_argument("--violation-rate", type=float, default=0.1, help="invite_watch・invite_only の違反メッセージの割合")
+    parser.add_argument("--discord-limits", action="store_true", help="送信キューと中継前の流量制限を有効のまま測る")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", action="store_true", help="結果をベースラインとして保存")
+    parser.add_argument("--baseline", default="default", help="ベースライン名")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="許容する悪化率（0.2 = 20%%）")
+    return parser.parse_args(argv)
+
+
+def prepare_env(workdir: str):
+    # bot.config を読み込む前に、ベンチ用の保存先とポートを指定しておく
+    os.environ["STORAGE_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["TRANSCRIPT_DIR"] = os.path.join(workdir, "transcripts")
+    os.environ["WEB_HOST"] = "127.0.0.1"
+    os.environ["PORT"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.chdir(workdir)  # Cog が相対パスの data/ を作るため
+    # bot.config は argv[1] を .env の名前として読むので、ベンチの引数は渡さない
+    sys.argv = sys.argv[:1]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+# --------------------------
+# 実行
+# --------------------------
+async def run_scenario(name: str, opts) -> dict:
+    from bench.scenarios import SCENARIOS, Harness
+
+    harness = Harness(opts)
+    await harness.start()
+    gc.collect()
+    rss_before = rss_mb()
+    try:
+        start = time.perf_counter()
+        recorder = await SCENARIOS[name](harness)
+        elapsed = time.perf_counter() - start
+        rss_after = rss_mb()
+    finally:
+        await harness.close()
+
+    lat = recorder.latencies
+    return {
+        "messages": len(lat),
+        "elapsed_s": round(elapsed, 3),
+        "msgs_per_s": round(len(lat) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(lat, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(lat, 0.99) * 1000, 3),
+        "max_ms": round(max(lat, default=0.0) * 1000, 3),
+        "rss_mb": round(rss_after, 1),
+        "rss_delta_mb": round(rss_after - rss_before, 1),
+        "rest_calls": harness.server.requests,
+        "rest_429": harness.server.limited,
+    }
+
+
+def compare(name: str, result: dict, baseline: dict, tolerance: float) -> list[str]:
+    # スループット低下・p99 悪化・メモリ増加を検出
+    problems = []
+    base = baseline.get(name)
+    if not base:
+        return problems
+    if result["msgs_per_s"] < base["msgs_per_s"] * (1 - tolerance):
+        problems.append(f"msgs/s {base['msgs_per_s']} -> {result['msgs_per_s']}")
+    if result["p99_ms"] > base["p99_ms"] * (1 + tolerance) and result["p99_ms"] - base["p99_ms"] > 1.0:
+        problems.append(f"p99 {base['p99_ms']}ms -> {result['p99_ms']}ms")
+    if result["rss_delta_mb"] > max(base["rss_delta_mb"], 1.0) * (1 + tolerance) + 5:
+        problems.append(f"メモリ増加 {base['rss_delta_mb']}MB -> {result['rss_delta_mb']}MB")
+    return problems
+
+
+def report(results: dict, regressions: dict):
+    header = f"{'scenario':<14}{'msgs':>7}{'msgs/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'rss MB':>9}{'+MB':>7}{'REST':>7}{'429':>6}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<14}{r['messages']:>7}{r['msgs_per_s']:>10.1f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+            f"{r['max_ms']:>10.2f}{r['rss_mb']:>9.1f}{r['rss_delta_mb']:>7.1f}{r['rest_calls']:>7}{r['rest_429']:>6}"
+        )
+    for name, problems in regressions.items():
+        for problem in problems:
+            print(f"!! {name}: {problem}")
+
+
+async def main(opts) -> int:
+    from bench.scenarios import SCENARIOS
+    from bot.logs import setup_logging
+
+    setup_logging()
+    names = opts.scenarios or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        print(f"不明なシナリオ: {', '.join(unknown)}（{', '.join(SCENARIOS)}）")
+        return 2
+
+    results = {}
+    for name in names:
+        results[name] = await run_scenario(name, opts)
+
+    path = os.path.join(BASELINE_DIR, f"{opts.baseline}.json")
+    baseline = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+    regressions = {
+        name: problems
+        for name, result in results.items()
+        if (problems := compare(name, result, baseline, opts.tolerance))
+    }
+    report(results, regressions)
+
+    if opts.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "options": {k: v for k, v in vars(opts).items() if k not in ("save", "baseline")},
+                "results": {**baseline, **results},
+            }, f, ensure_ascii=False, indent=2)
+        print(f"ベースラインを保存しました: {path}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    options = parse_args()
+    sys.path.insert(0, ROOT)  # python bench/run.py でも動くように
+    with tempfile.TemporaryDirectory(prefix="hunya-bench-") as workdir:
+        prepare_env(workdir)
+        sys.exit(asyncio.run(main(options)))
@@ -0,0 +1,220 @@
+import time
+import random
+import asyncio
+
+from bench.fakes import FakeBot, FakeGuild, FakeMessage, FakeRest
+from bench.rest import RestStandIn
+
+CLEAN_MESSAGES = [
+    "おはようございます",
+    "今日のイベント何時からでしたっけ？",
+    "了解です！",
+    "That sounds good to me",
+    "スクショ貼っておきます",
+]
+VIOLATIONS = [
+    "参加してね discord.gg/abcdef",
+    "見て https://spam.example/free",
+    "ｂａｄｗｏｒｄ を含む文章",
+]
+INVITE_VIOLATIONS = [
+    "参加してね discord.gg/abcdef",
+    "join https://discord.gg/abc",
+    "招待はこちら discord.com/invite/xyz",
+]
+
+
+# --------------------------
+# 計測結果
+# --------------------------
+class Recorder:
+    def __init__(self):
+        self.latencies: list[float] = []
+
+    async def timed(self, coro):
+        start = time.perf_counter()
+        await coro
+        self.latencies.append(time.perf_counter() - start)
+
+
+async def replay(recorder: Recorder, coros, concurrency: int):
+    # 同時に処理中のメッセージ数を concurrency までに抑えて流し込む
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run(coro):
+        async with sem:
+            await recorder.timed(coro)
+
+    await asyncio.gather(*(run(c) for c in coros))
+
+
+# --------------------------
+# Cog を偽の Bot に載せた実行環境
+# --------------------------
+class Harness:
+    def __init__(self, opts):
+        self.opts = opts
+        self.random = random.Random(opts.seed)
+        self.server = RestStandIn(
+            latency=opts.latency, jitter=opts.latency / 2, rate_limit=opts.rate_limit, seed=opts.seed
+        )
+        self.rest = FakeRest(self.server)
+        self.bot = FakeBot()
+        self.cogs = {}
+
+    async def start(self):
+        from bot.cogs.auth import AuthCog
+        from bot.cogs.global_chat import GlobalChatCog
+        from bot.cogs.invite_watch import InviteWatch
+        from bot.pipeline import get_pipeline
+
+        await self.server.start()
+        if not self.opts.discord_limits:
+            # 送信キューのレート制限を外して、処理そのものの速さを測る
+            import bot.outbound as outbound
+            outbound.CHANNEL_RATE = (1e9, 1.0)
+            outbound.GLOBAL_RATE = (1e9, 1.0)
+
+        self.cogs["global_chat"] = GlobalChatCog(self.bot)
+        self.cogs["invite_watch"] = InviteWatch(self.bot)
+        auth = self.cogs["auth"] = AuthCog(self.bot)
+        auth.exchanger.token_url = self.server.url("/api/oauth2/token")
+        for cog in self.cogs.values():
+            await cog.cog_load()
+        if not self.opts.discord_limits:
+            # 中継前の流量制限も外す（少人数で大量に流すため）
+            for scope in self.cogs["global_chat"].admission.scopes.values():
+                scope.rate = 0
+        self.pipeline = get_pipeline(self.bot)
+
+    async def close(self):
+        for cog in self.cogs.values():
+            await cog.cog_unload()
+        self.bot.scheduler.stop()
+        await self.cogs["auth"].web.stop()
+        await self.server.close()
+
+    def guilds(self, count: int, prefix: str, **kwargs) -> list[FakeGuild]:
+        return [self.bot.add_guild(FakeGuild(self.rest, f"{prefix}{i}", **kwargs)) for i in range(count)]
+
+    def author(self, guild: FakeGuild):
+        return self.random.choice(list(guild.members.values()))
+
+
+# --------------------------
+# シナリオ
+# --------------------------
+def global_network(h: Harness):
+    # 全ギルドの1チャンネルを同じネットワークに参加させる
+    cog = h.cogs["global_chat"]
+    guilds = h.guilds(h.opts.guilds, "global")
+    name = f"bench-{id(h)}"
+    members = [f"{g.id}:{g.channels[0].id}" for g in guilds]
+    cog.networks.set(name, members)
+    for g in guilds:
+        cog.routes.join(name, (g.id, g.channels[0].id))
+
+    messages = []
+    for i in range(h.opts.messages):
+        guild = guilds[i % len(guilds)]
+        messages.append(FakeMessage(guild.channels[0], h.author(guild), h.random.choice(CLEAN_MESSAGES)))
+    return messages
+
+
+async def global_chat(h: Harness) -> Recorder:
+    # 各メッセージをネットワークの全員へ中継する
+    messages = global_network(h)
+    recorder = Recorder()
+    await replay(recorder, (h.pipeline.dispatch(m) for m in messages), h.opts.concurrency)
+    return recorder
+
+
+async def global_delete(h: Harness) -> Recorder:
+    # 中継済みのメッセージを消し、全コピーの削除が終わるまでを測る
+    cog = h.cogs["global_chat"]
+    messages = global_network(h)
+    await replay(Recorder(), (h.pipeline.dispatch(m) for m in messages), h.opts.concurrency)
+    recorder = Recorder()
+    await replay(recorder, (cog.propagate_delete(m.id) for m in messages), h.opts.concurrency)
+    return recorder
+
+
+async def watch(h: Harness, prefix: str, settings: dict, violations: list[str]) -> Recorder:
+    # 監視を有効にしたギルドへ、違反を一定割合含むメッセージを流す
+    cog = h.cogs["invite_watch"]
+    guilds = h.guilds(h.opts.guilds, prefix, channels=3)
+    for g in guilds:
+        cfg = cog.config(g.id)
+        cfg.update({"enabled": True, **settings, "ignore": [g.channels[2].id]})
+        cog.save_config(g.id, cfg)
+
+    messages = []
+    for i in range(h.opts.messages):
+        guild = guilds[i % len(guilds)]
+        channel = h.random.choice(guild.channels)
+        violating = h.random.random() < h.opts.violation_rate
+        content = h.random.choice(violations if violating else CLEAN_MESSAGES)
+        messages.append(FakeMessage(channel, h.author(guild), content))
+
+    recorder = Recorder()
+    await replay(recorder, (h.pipeline.dispatch(m) for m in messages), h.opts.concurrency)
+    # 一括削除・タイムアウトの後処理を待つ
+    await asyncio.gather(*list(cog.wave.flushers.values()), return_exceptions=True)
+    return recorder
+
+
+async def invite_watch(h: Harness) -> Recorder:
+    return await watch(h, "watch", {
+        "url_watch": True, "allow": ["example.com"], "deny": ["spam.example"], "keywords": ["badword"],
+    }, VIOLATIONS)
+
+
+async def invite_only(h: Harness) -> Recorder:
+    # 招待リンクの監視だけを有効にしたギルド（URL・キーワードのルールなし）
+    return await watch(h, "invite", {"url_watch": False, "keywords": []}, INVITE_VIOLATIONS)
+
+
+async def oauth(h: Harness) -> Recorder:
+    # OAuth callback と同じ処理（トークン交換 → メンバー取得 → ロール付与）
+    cog = h.cogs["auth"]
+    guilds = h.guilds(max(1, h.opts.guilds // 10), "auth", members=50)
+    for g in guilds:
+        role = g.add_role("verified")
+        cog.auto_roles.set(g.id, str(role.id))
+
+    requests = []
+    for i in range(h.opts.messages):
+        guild = guilds[i % len(guilds)]
+        member = h.author(guild)
+        requests.append(cog.handle_oauth(f"code{i}", member.id, guild.id))
+
+    recorder = Recorder()
+    await replay(recorder, requests, h.opts.concurrency)
+    return recorder
+
+
+async def storage(h: Harness) -> Recorder:
+    # 設定の書き込み（呼び出し側のコスト）と、まとめ書きの完了まで
+    from bot.storage import get_storage
+
+    store = get_storage()
+    table = store.table(f"bench-{id(h)}")
+    recorder = Recorder()
+    for i in range(h.opts.messages):
+        start = time.perf_counter()
+        table.set(i % 500, {"enabled": True, "ignore": [str(i)], "keywords": ["a", "b", "c"]})
+        recorder.latencies.append(time.perf_counter() - start)
+        if i % 100 == 0:
+            await asyncio.sleep(0)
+    await store.flush()
+    return recorder
+
+
+SCENARIOS = {
+    "global_chat": global_chat,
+    "global_delete": global_delete,
+    "invite_watch": invite_watch,
+    "invite_only": invite_only,
+    "oauth": oauth,
+    "storage": storage,
+}
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+
+from bot.config import (
+    RELAY_USER_RATE, RELAY_USER_BURST, RELAY_CHANNEL_RATE, RELAY_CHANNEL_BURST,
+    RELAY_NETWORK_RATE, RELAY_NETWORK_BURST, RELAY_THROTTLE_MODE, RELAY_THROTTLE_MAX_WAIT,
+)
+from bot.metrics import RELAY_THROTTLED
+from bot.ratelimit import TokenBucket
+
+log = logging.getLogger(__name__)
+
+MAX_BUCKETS = 10000  # これを超えたら満タンに戻った（使われていない）バケットを捨てる
+
+
+# --------------------------
+# 種類ごとのバケット（ユーザー / 送信元チャンネル / ネットワーク）
+# --------------------------
+class BucketSet:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.buckets: dict = {}
+
+    def get(self, key) -> TokenBucket | None:
+        if self.rate <= 0:
+            return None  # 無効
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= MAX_BUCKETS:
+                self.prune()
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def prune(self) -> int:
+        idle = [key for key, bucket in self.buckets.items() if bucket.is_idle()]
+        for key in idle:
+            del self.buckets[key]
+        return len(idle)
+
+
+# --------------------------
+# 中継前の流量制限
+# --------------------------
+class AdmissionControl:
+    def __init__(self, mode: str = RELAY_THROTTLE_MODE, max_wait: float = RELAY_THROTTLE_MAX_WAIT):
+        self.mode = mode
+        self.max_wait = max_wait
+        self.scopes = {
+            "user": BucketSet(RELAY_USER_RATE, RELAY_USER_BURST),
+            "channel": BucketSet(RELAY_CHANNEL_RATE, RELAY_CHANNEL_BURST),
+            "network": BucketSet(RELAY_NETWORK_RATE, RELAY_NETWORK_BURST),
+        }
+
+        # 統計
+        self.admitted = 0
+        self.queued = 0
+        self.dropped = 0
+
+    def _buckets(self, user_id: int, channel_id: int, networks) -> list[tuple[str, TokenBucket]]:
+        keys = [("user", user_id), ("channel", channel_id), *(("network", name) for name in networks)]
+        found = []
+        for scope, key in keys:
+            bucket = self.scopes[scope].get(key)
+            if bucket is not None:
+                found.append((scope, bucket))
+        return found
+
+    async def admit(self, user_id: int, channel_id: int, networks) -> bool:
+        # 全バケットに余裕がある時だけまとめて消費する（1つでも足りなければどれも減らさない）
+        buckets = self._buckets(user_id, channel_id, networks)
+        scope, wait = max(((s, b.delay()) for s, b in buckets), key=lambda r: r[1], default=(None, 0.0))
+        if wait <= 0:
+            for _, bucket in buckets:
+                bucket.try_consume()
+            self.admitted += 1
+            return True
+
+        if self.mode == "queue" and wait <= self.max_wait:
+            # 予約して順番を確保し、使えるようになるまで待ってから中継する
+            wait = max(bucket.reserve() for _, bucket in buckets)
+            RELAY_THROTTLED.inc(scope=scope, action="queued")
+            self.queued += 1
+            await asyncio.sleep(wait)
+            self.admitted += 1
+            return True
+
+        RELAY_THROTTLED.inc(scope=scope, action="dropped")
+        self.dropped += 1
+        log.debug("流量制限で中継しません", extra={"scope": scope, "user_id": user_id, "channel_id": channel_id})
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "buckets": {scope: len(s.buckets) for scope, s in self.scopes.items()},
+        }
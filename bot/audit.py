@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+import discord
+
+from bot.config import (
+    AUDIT_FLUSH_INTERVAL, AUDIT_BUFFER_MAX, AUDIT_JSONL_PATH, AUDIT_JSONL_MAX_BYTES, AUDIT_JSONL_BACKUPS,
+)
+from bot.metrics import AUDIT_EVENTS
+from bot.outbound import get_outbound
+from bot.storage import get_storage
+
+log = logging.getLogger(__name__)
+
+MAX_EMBEDS = 10        # 1メッセージに付けられる埋め込みの上限
+MAX_EMBED_CHARS = 6000  # 1メッセージの埋め込み全体の文字数上限
+
+# 操作ごとの見出しと色
+ACTIONS = {
+    "message_delete": ("メッセージ削除", 0xE67E22),
+    "timeout": ("タイムアウト", 0xE74C3C),
+    "role_grant": ("ロール付与", 0x2ECC71),
+    "role_revoke": ("ロール解除", 0x95A5A6),
+    "role_migration": ("ロール一括移行", 0x1ABC9C),
+    "ticket_open": ("チケット作成", 0x3498DB),
+    "ticket_close": ("チケットクローズ", 0x34495E),
+}
+# 詳細項目の表示名と書式
+FIELDS = {
+    "channel_id": ("チャンネル", lambda v: f"<#{v}>"),
+    "role_id": ("ロール", lambda v: f"<@&{v}>"),
+    "rule": ("ルール", str),
+    "reason": ("理由", str),
+    "content": ("内容", lambda v: f"```{v.replace('`', 'ˋ')}```" if v else "（なし）"),
+    "transcript": ("トランスクリプト", lambda v: f"`{v}`"),
+}
+
+
+# --------------------------
+# ローカルの JSONL 出力（サイズでローテーション）
+# --------------------------
+class JsonlSink:
+    def __init__(self, path: str, max_bytes: int = AUDIT_JSONL_MAX_BYTES, backups: int = AUDIT_JSONL_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = asyncio.Lock()  # ローテーション中に別のギルドが書き込まないように
+
+    async def write(self, events: list[dict]):
+        data = "".join(json.dumps(e, ensure_ascii=False, default=str) + "\n" for e in events)
+        async with self.lock:
+            await asyncio.to_thread(self._write, data)
+
+    def _write(self, data: str):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        encoded = data.encode("utf-8")
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and size + len(encoded) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "ab") as f:
+            f.write(encoded)
+
+    def _rotate(self):
+        # audit.jsonl → audit.jsonl.1 → audit.jsonl.2 …（backups を超えた分は消える）
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+# --------------------------
+# 監査ログ（ギルドごとにまとめて送信）
+# --------------------------
+class AuditLog:
+    def __init__(self, bot, interval: float = AUDIT_FLUSH_INTERVAL, max_buffer: int = AUDIT_BUFFER_MAX,
+                 jsonl_path: str = AUDIT_JSONL_PATH):
+        self.bot = bot
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.channels = get_storage(bot).table("audit_channels")  # guild_id -> channel_id
+        self.sink = JsonlSink(jsonl_path) if jsonl_path else None
+        self.outbound = get_outbound(bot)
+        self.buffers: dict[int, list[dict]] = {}
+        self.flushers: dict[int, asyncio.Task] = {}
+        self.wakeups: dict[int, asyncio.Event] = {}
+        self.closing = False
+
+        # 統計
+        self.recorded = 0
+        self.sent = 0
+        self.dropped = 0
+
+    # ---------- 記録 ----------
+    def record(self, guild_id: int, action: str, user=None, **detail):
+        # 送り先がどこにも無ければ何もしない（呼び出し側のコストを増やさない）
+        if self.sink is None and self.channels.get(guild_id) is None:
+            return
+        event = {
+            "ts": time.time(),
+            "guild_id": guild_id,
+            "action": action,
+            "user_id": user.id if user else None,
+            "user": str(user) if user else None,
+            **{k: v for k, v in detail.items() if v is not None},
+        }
+        AUDIT_EVENTS.inc(action=action)
+        self.recorded += 1
+
+        buffer = self.buffers.setdefault(guild_id, [])
+        buffer.append(event)
+        if len(buffer) > self.max_buffer:
+            # 送信が追いつかない時は古いものから捨てる
+            del buffer[0]
+            self.dropped += 1
+        if len(buffer) >= MAX_EMBEDS and guild_id in self.wakeups:
+            self.wakeups[guild_id].set()
+        if guild_id not in self.flushers:
+            self.flushers[guild_id] = asyncio.create_task(self._flusher(guild_id))
+
+    # ---------- 送信（10件溜まったらすぐ、そうでなければ interval ごと） ----------
+    async def _flusher(self, guild_id: int):
+        try:
+            while self.buffers.get(guild_id):
+                buffer = self.buffers[guild_id]
+                if len(buffer) < MAX_EMBEDS and not self.closing:
+                    wakeup = self.wakeups[guild_id] = asyncio.Event()
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), self.interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    finally:
+                        self.wakeups.pop(guild_id, None)
+                events = buffer[:MAX_EMBEDS]
+                del buffer[:MAX_EMBEDS]
+                await self._write(guild_id, events)
+        finally:
+            self.flushers.pop(guild_id, None)
+            if not self.buffers.get(guild_id):
+                self.buffers.pop(guild_id, None)
+
+    async def _write(self, guild_id: int, events: list[dict]):
+        if self.sink is not None:
+            try:
+                await self.sink.write(events)
+            except OSError as e:
+                log.warning("監査ログの書き込み失敗", extra={"path": self.sink.path, "error": str(e)})
+
+        channel = self.channel(guild_id)
+        if channel is None:
+            return
+        for embeds in self._pack([self.embed(e) for e in events]):
+            try:
+                await self.outbound.send(channel, embeds=embeds, allowed_mentions=discord.AllowedMentions.none())
+                self.sent += len(embeds)
+            except discord.HTTPException as e:
+                log.warning("監査ログの送信失敗", extra={"guild_id": guild_id, "channel_id": channel.id, "error": str(e)})
+                return
+
+    def channel(self, guild_id: int):
+        channel_id = self.channels.get(guild_id)
+        guild = self.bot.get_guild(guild_id) if channel_id else None
+        return guild.get_channel(int(channel_id)) if guild else None
+
+    @staticmethod
+    def _pack(embeds: list[discord.Embed]):
+        # 10個・合計6000文字に収まるように分ける
+        batch, size = [], 0
+        for embed in embeds:
+            if batch and (len(batch) >= MAX_EMBEDS or size + len(embed) > MAX_EMBED_CHARS):
+                yield batch
+                batch, size = [], 0
+            batch.append(embed)
+            size += len(embed)
+        if batch:
+            yield batch
+
+    @staticmethod
+    def embed(event: dict) -> discord.Embed:
+        title, color = ACTIONS.get(event["action"], (event["action"], 0x7F8C8D))
+        lines = []
+        if event.get("user_id"):
+            lines.append(f"<@{event['user_id']}>（{event['user']}）")
+        for key, (label, fmt) in FIELDS.items():
+            if key in event:
+                lines.append(f"**{label}**: {fmt(event[key])}")
+        return discord.Embed(
+            title=title,
+            description="\n".join(lines)[:1000],
+            color=color,
+            timestamp=datetime.fromtimestamp(event["ts"], timezone.utc),
+        )
+
+    # ---------- 終了時 ----------
+    async def close(self):
+        # 溜まっている分を待たずに送る
+        self.closing = True
+        for event in self.wakeups.values():
+            event.set()
+        await asyncio.gather(*list(self.flushers.values()), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "buffered": sum(len(b) for b in self.buffers.values()),
+        }
+
+
+def get_audit(bot) -> AuditLog:
+    audit = getattr(bot, "audit", None)
+    if audit is None:
+        audit = bot.audit = AuditLog(bot)
+    return audit
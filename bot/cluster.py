@@ -0,0 +1,256 @@
+import os
+import time
+import asyncio
+import resource
+import multiprocessing
+import logging
+
+import aiohttp
+
+from bot.config import BOT_TOKEN, CLUSTER_COUNT, SHARD_COUNT, IPC_SOCKET, CLUSTER_STATS_INTERVAL
+from bot.ipc import IPCHub, IPCClient, IPCError, HUB, BROADCAST
+from bot.logs import setup_logging
+from bot.metrics import REGISTRY
+from bot.storage import get_storage
+
+log = logging.getLogger(__name__)
+
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+IDENTIFY_INTERVAL = 5.0   # シャードの IDENTIFY は 5 秒に 1 回まで（プロセスをまたいで守る）
+MONITOR_INTERVAL = 5.0    # 子プロセスの死活確認間隔
+RESTART_DELAY = 10.0      # 落ちたクラスタを起動し直すまでの待ち時間
+
+# 全クラスタで共有する設定テーブル（変更を他プロセスへ通知する）
+SHARED_TABLES = {"global", "invite", "auto_roles", "role_panels", "audit_channels"}
+
+
+# --------------------------
+# シャード / クラスタの割り当て
+# --------------------------
+def shard_of(guild_id: int, shard_count: int) -> int:
+    return (guild_id >> 22) % shard_count
+
+
+def cluster_shards(cluster_id: int, cluster_count: int, shard_count: int) -> list[int]:
+    return [s for s in range(shard_count) if s % cluster_count == cluster_id]
+
+
+def process_stats(bot) -> dict:
+    # このプロセスの負荷（シャードごとのギルド数とレイテンシ）
+    shards = {}
+    for guild in bot.guilds:
+        entry = shards.setdefault(str(guild.shard_id), {"guilds": 0, "latency_ms": None})
+        entry["guilds"] += 1
+    for shard_id, latency in getattr(bot, "latencies", [(0, bot.latency)]):
+        entry = shards.setdefault(str(shard_id), {"guilds": 0, "latency_ms": None})
+        if latency == latency and latency != float("inf"):  # 未接続だと NaN / inf
+            entry["latency_ms"] = round(latency * 1000, 1)
+
+    outbound = getattr(bot, "outbound", None)
+    return {
+        "pid": os.getpid(),
+        "guilds": len(bot.guilds),
+        "shards": shards,
+        "memory_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "queue_depth": outbound.stats()["queue_depth"] if outbound else 0,
+        "updated": time.time(),
+    }
+
+
+# --------------------------
+# クラスタ（子プロセス）側の情報と IPC 連携
+# --------------------------
+class ClusterInfo:
+    def __init__(self, bot, cluster_id: int, cluster_count: int, shard_count: int, bus: IPCClient):
+        self.bot = bot
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
+        self.shard_count = shard_count
+        self.shard_ids = cluster_shards(cluster_id, cluster_count, shard_count)
+        self.bus = bus
+        self.task: asyncio.Task | None = None
+
+    def cluster_of(self, guild_id: int) -> int:
+        return shard_of(guild_id, self.shard_count) % self.cluster_count
+
+    def owns(self, guild_id: int) -> bool:
+        return self.cluster_of(guild_id) == self.cluster_id
+
+    def locate(self, guild_id: int) -> int | None:
+        # 他クラスタ担当ならそのクラスタ ID、自分の担当なら None
+        owner = self.cluster_of(guild_id)
+        return None if owner == self.cluster_id else owner
+
+    # ---------- 開始 / 終了 ----------
+    def attach(self):
+        get_storage().commit_listeners.append(self._on_commit)
+        self.bus.on("config", self._on_config)
+        self.bus.on("metrics", self._on_metrics)
+        if self.task is None:
+            self.task = asyncio.create_task(self._report())
+
+    def detach(self):
+        storage = get_storage()
+        if self._on_commit in storage.commit_listeners:
+            storage.commit_listeners.remove(self._on_commit)
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    # ---------- 設定変更の通知 ----------
+    def _on_commit(self, keys):
+        shared = [[ns, key] for ns, key in keys if ns in SHARED_TABLES]
+        if shared:
+            asyncio.create_task(self._broadcast(shared))
+
+    async def _broadcast(self, keys):
+        try:
+            await self.bus.send(BROADCAST, "config", {"keys": keys})
+        except (IPCError, ConnectionError) as e:
+            log.warning("設定変更の通知に失敗", extra={"error": str(e)})
+
+    async def _on_config(self, data):
+        storage = get_storage()
+        for ns, key in data["keys"]:
+            if await storage.reload(ns, key):
+                # 各 Cog は on_config_update で自分のキャッシュを作り直す
+                self.bot.dispatch("config_update", ns, key)
+
+    async def _on_metrics(self, data):
+        return REGISTRY.collect()
+
+    # ---------- 負荷統計 ----------
+    def stats(self) -> dict:
+        stats = process_stats(self.bot)
+        stats["cluster"] = self.cluster_id
+        return stats
+
+    async def _report(self):
+        while True:
+            try:
+                await self.bus.send(HUB, "stats", self.stats())
+            except (IPCError, ConnectionError):
+                pass
+            await asyncio.sleep(CLUSTER_STATS_INTERVAL)
+
+    async def all_stats(self) -> dict:
+        return await self.bus.request(HUB, "cluster_stats")
+
+
+# --------------------------
+# 子プロセスのエントリポイント
+# --------------------------
+def _cluster_main(cluster_id: int, cluster_count: int, shard_count: int):
+    setup_logging()
+    try:
+        asyncio.run(_run_cluster(cluster_id, cluster_count, shard_count))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_cluster(cluster_id: int, cluster_count: int, shard_count: int):
+    from bot.startup import AvanzareShardedBot, default_intents
+
+    bus = IPCClient(IPC_SOCKET, cluster_id)
+    await bus.connect()
+
+    shard_ids = cluster_shards(cluster_id, cluster_count, shard_count)
+    bot = AvanzareShardedBot(
+        command_prefix="!",
+        intents=default_intents(),
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+        sync_guild_id=os.environ.get("TEST_GUILD_ID"),
+        sync=cluster_id == 0,
+    )
+    # Cog のロード前に設定しておく（各 Cog はこれを見て IPC を使い分ける）
+    bot.cluster = ClusterInfo(bot, cluster_id, cluster_count, shard_count, bus)
+    bot.cluster.attach()
+    log.info("クラスタ起動", extra={"cluster": cluster_id, "shards": shard_ids, "shard_count": shard_count})
+
+    try:
+        async with bot:
+            await bot.start(BOT_TOKEN)
+    finally:
+        bot.cluster.detach()
+        await get_storage().flush()
+        await bus.close()
+
+
+# --------------------------
+# ランチャー（親プロセス）
+# --------------------------
+async def recommended_shards(token: str) -> int:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_URL, headers={"Authorization": f"Bot {token}"}) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+    return int(data["shards"])
+
+
+def format_stats(stats: dict) -> list[str]:
+    lines = []
+    for cluster_id, st in sorted(stats.items(), key=lambda item: int(item[0])):
+        shards = []
+        for shard_id, shard in sorted(st["shards"].items(), key=lambda item: int(item[0])):
+            latency = "-" if shard["latency_ms"] is None else f"{shard['latency_ms']:.0f}ms"
+            shards.append(f"#{shard_id} {shard['guilds']}件/{latency}")
+        lines.append(
+            f"クラスタ {cluster_id}: ギルド {st['guilds']} / メモリ {st['memory_mb']:.0f}MB"
+            f" / 送信待ち {st['queue_depth']} / シャード [{', '.join(shards)}]"
+        )
+    return lines
+
+
+def run_cluster(cluster_count: int = CLUSTER_COUNT, shard_count: int = SHARD_COUNT):
+    asyncio.run(_supervise(cluster_count, shard_count))
+
+
+async def _supervise(cluster_count: int, shard_count: int):
+    if not shard_count:
+        shard_count = max(await recommended_shards(BOT_TOKEN), cluster_count)
+    cluster_count = min(cluster_count, shard_count)
+    log.info("クラスタモードで起動します", extra={"clusters": cluster_count, "shard_count": shard_count})
+
+    hub = IPCHub(IPC_SOCKET)
+    await hub.start()
+
+    ctx = multiprocessing.get_context("spawn")
+    processes: dict[int, multiprocessing.Process] = {}
+
+    def spawn(cluster_id: int):
+        process = ctx.Process(
+            target=_cluster_main,
+            args=(cluster_id, cluster_count, shard_count),
+            name=f"cluster-{cluster_id}",
+        )
+        process.start()
+        processes[cluster_id] = process
+
+    try:
+        for cluster_id in range(cluster_count):
+            spawn(cluster_id)
+            # 先に起動したクラスタの IDENTIFY が終わるまで間を空ける
+            await asyncio.sleep(IDENTIFY_INTERVAL * len(cluster_shards(cluster_id, cluster_count, shard_count)))
+
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(MONITOR_INTERVAL)
+            for cluster_id, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                log.error("クラスタが終了したため再起動します", extra={"cluster": cluster_id, "exitcode": process.exitcode})
+                hub.stats.pop(cluster_id, None)
+                await asyncio.sleep(RESTART_DELAY)
+                spawn(cluster_id)
+
+            if time.monotonic() - last_report >= CLUSTER_STATS_INTERVAL:
+                last_report = time.monotonic()
+                for line in format_stats({str(k): v for k, v in hub.stats.items()}):
+                    log.info(line)
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            await asyncio.to_thread(process.join, 10)
+        await hub.close()
@@ -0,0 +1,44 @@
+import discord
+from discord.ext import commands
+
+from bot.audit import get_audit
+
+class AuditCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.audit = get_audit(bot)
+
+    async def cog_unload(self):
+        # 溜まっている監査ログを送ってから終了
+        await self.audit.close()
+
+    # ===============================
+    # /audit_channel
+    # ===============================
+    @discord.app_commands.command(name="audit_channel", description="監査ログの送信先を設定（省略で解除）")
+    @discord.app_commands.checks.has_permissions(administrator=True)
+    async def audit_channel(self, interaction: discord.Interaction, channel: discord.TextChannel = None):
+        if channel is None:
+            self.audit.channels.delete(interaction.guild.id)
+            await interaction.response.send_message("監査ログの送信を停止しました", ephemeral=True)
+            return
+        self.audit.channels.set(interaction.guild.id, str(channel.id))
+        await interaction.response.send_message(
+            f"✅ 監査ログを {channel.mention} に送信します", ephemeral=True
+        )
+
+    # ===============================
+    # /audit_stats
+    # ===============================
+    @discord.app_commands.command(name="audit_stats", description="監査ログの記録・送信状況を表示")
+    @discord.app_commands.checks.has_permissions(administrator=True)
+    async def audit_stats(self, interaction: discord.Interaction):
+        stats = self.audit.stats()
+        await interaction.response.send_message(
+            f"記録: {stats['recorded']} / 送信: {stats['sent']} / 送信待ち: {stats['buffered']}"
+            f" / 破棄: {stats['dropped']}",
+            ephemeral=True
+        )
+
+async def setup(bot):
+    await bot.add_cog(AuditCog(bot))
@@ -1,6 +1,6 @@
 import os
-import json
 import asyncio
+import logging
 import aiohttp
 from urllib.parse import quote
 
@@ -8,9 +8,19 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from discord.ui import Button, View
-from flask import Flask, request
+from aiohttp import web
 
-from bot.config import CLIENT_ID, CLIENT_SECRET, REDIRECT_URI
+from bot.config import CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, AUTH_CODE_TTL, AUTH_CODE_MAX
+from bot.audit import get_audit
+from bot.ipc import IPCError
+from bot.members import get_members
+from bot.oauth import TokenExchanger, TokenExchangeError, ExchangeQueueFull, get_callback_router
+from bot.role_jobs import RoleMigration
+from bot.scheduler import get_scheduler
+from bot.storage import get_storage, ExpiringTable
+from bot.web import get_web_server
+
+log = logging.getLogger(__name__)
 
 OWNER_ID = 123456789012345678  # 自分の Discord ID に変更
 DATA_DIR = "data"
@@ -18,19 +28,7 @@ os.makedirs(DATA_DIR, exist_ok=True)
 
 AUTO_ROLES_PATH = os.path.join(DATA_DIR, "auto_roles.json")
 AUTH_CODES_PATH = os.path.join(DATA_DIR, "auth_codes.json")
-
-# --------------------------
-# JSON ユーティリティ
-# --------------------------
-def load_json(path, default):
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return default
-
-def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+AUTH_ROLE_TIMEOUT = 60  # ボタン認証で付与したロールを解除するまでの秒数
 
 # --------------------------
 # AuthCog
@@ -38,29 +36,61 @@ def save_json(path, data):
 class AuthCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.auth_codes = self.load_auth_codes()
-        self.start_flask()
-
-    # ---------- データ管理 ----------
-    def load_auto_roles(self):
-        return load_json(AUTO_ROLES_PATH, {})
-
-    def save_auto_roles(self, data):
-        save_json(AUTO_ROLES_PATH, data)
-
-    def load_auth_codes(self):
-        return load_json(AUTH_CODES_PATH, {})
-
-    def save_auth_codes(self):
-        save_json(AUTH_CODES_PATH, self.auth_codes)
+        storage = get_storage(bot)
+        # 読み込みはキャッシュから、書き込みはキー単位でまとめて反映
+        self.auto_roles = storage.table("auto_roles", legacy=AUTO_ROLES_PATH)
+        # 認証コードは数分で失効するので TTL 付きで保持し、古いものは掃除する
+        self.auth_codes = ExpiringTable(
+            storage.table("auth_codes", legacy=AUTH_CODES_PATH), AUTH_CODE_TTL, AUTH_CODE_MAX
+        )
+        # ホストモードでは Bot ごとのアプリ情報を使い、接続プールと callback サーバーは共有する
+        host = getattr(bot, "host", None)
+        self.client_id = host.profile.client_id if host else CLIENT_ID
+        self.client_secret = host.profile.client_secret if host else CLIENT_SECRET
+        self.web = get_web_server()
+        self.router = get_callback_router()
+        self.exchanger = TokenExchanger(connector=host.connector if host else None)
+        self.scheduler = get_scheduler(bot)
+        self.members = get_members(bot)
+        self.audit = get_audit(bot)
+        # 認証ロール変更時の既存メンバーへの一括反映（再起動しても続きから）
+        self.migrations = RoleMigration(bot, self.members, self.audit)
+        # クラスタモードでは callback を受けるのはクラスタ 0 だけ
+        self.cluster = getattr(bot, "cluster", None)
+        self.serve_web = self.cluster is None or self.cluster.cluster_id == 0
+
+    async def cog_load(self):
+        self.auth_codes.start()
+        self.scheduler.register(
+            "auth_role_expire", self.expire_roles, group=lambda payload: payload["guild_id"]
+        )
+        await self.exchanger.start()
+        self.migrations.resume_all(self.cluster.owns if self.cluster else None)
+        if self.cluster:
+            self.cluster.bus.on("oauth", self.receive_oauth)
+        if self.serve_web:
+            self.router.add(self.client_id, self.callback)
+            self.web.add_route("GET", "/callback", self.router.dispatch)
+            await self.web.start()
+            log.info("OAuth callback 登録完了")
+
+    async def cog_unload(self):
+        if self.serve_web and self.router.remove(self.client_id):
+            self.web.remove_route("GET", "/callback")
+        if self.cluster:
+            self.cluster.bus.handlers.pop("oauth", None)
+        self.auth_codes.stop()
+        self.scheduler.unregister("auth_role_expire")
+        self.migrations.stop()
+        await self.exchanger.close()
 
     # ---------- OAuth URL ----------
     def make_oauth_url(self, user_id: int, guild_id: int) -> str:
         redirect_uri = quote(f"{REDIRECT_URI}/callback", safe="")
-        state = f"{user_id}:{guild_id}"
+        state = f"{user_id}:{guild_id}:{self.client_id}"
         return (
             "https://discord.com/api/oauth2/authorize"
-            f"?client_id={CLIENT_ID}"
+            f"?client_id={self.client_id}"
             f"&redirect_uri={redirect_uri}"
             "&response_type=code"
             "&scope=identify%20guilds"
@@ -71,7 +101,7 @@ class AuthCog(commands.Cog):
     @app_commands.command(name="auth_button", description="ボタンで認証")
     async def auth_button(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        role_id = self.load_auto_roles().get(str(interaction.guild.id))
+        role_id = self.auto_roles.get(str(interaction.guild.id))
         if not role_id:
             await interaction.followup.send("⚠️ このサーバーに認証後付与ロールが設定されていません", ephemeral=True)
             return
@@ -81,116 +111,254 @@ class AuthCog(commands.Cog):
             await interaction.followup.send("⚠️ ロールが見つかりません", ephemeral=True)
             return
 
+        scheduler = self.scheduler
+        members = self.members
+        audit = self.audit
+
         class AuthView(View):
             def __init__(self):
                 super().__init__(timeout=None)
 
             @discord.ui.button(label="認証", style=discord.ButtonStyle.primary)
-            async def auth_button_inner(self, button: Button, btn_interaction: discord.Interaction):
+            async def auth_button_inner(self, btn_interaction: discord.Interaction, button: Button):
                 await btn_interaction.response.defer(ephemeral=True)
                 member = btn_interaction.user
                 await member.add_roles(role, reason="ボタン認証開始")
+                # ロールが変わったので、次に参照するときは取り直す
+                members.forget(role.guild.id, member.id)
+                audit.record(role.guild.id, "role_grant", member, role_id=role.id, reason="ボタン認証開始")
                 await btn_interaction.followup.send(
-                    f"✅ 認証用ロールを付与しました。60秒以内に認証されない場合は解除されます",
+                    f"✅ 認証用ロールを付与しました。{AUTH_ROLE_TIMEOUT}秒以内に認証されない場合は解除されます",
                     ephemeral=True
                 )
-                print(f"[auth_button] {member} にロール {role.name} 付与")
-
-                await asyncio.sleep(60)
-                if role in member.roles:
-                    try:
-                        await member.remove_roles(role, reason="認証未完了のため自動解除")
-                        print(f"[auth_button] {member} に付与したロールを自動解除")
-                    except Exception as e:
-                        print(f"[auth_button] ロール解除失敗: {e}")
+                log.info("認証用ロール付与", extra={"guild_id": role.guild.id, "user_id": member.id, "role_id": role.id})
+
+                # 解除はスケジューラに任せる（再起動しても消えない）
+                scheduler.schedule(
+                    f"auth:{role.guild.id}:{member.id}",
+                    "auth_role_expire",
+                    AUTH_ROLE_TIMEOUT,
+                    {"guild_id": role.guild.id, "user_id": member.id, "role_id": role.id},
+                )
 
         await interaction.followup.send("🔐 認証ボタンを押してください", view=AuthView(), ephemeral=True)
 
     # ---------- OAuth 完了処理 ----------
-    async def handle_oauth(self, code: str, user_id: int, guild_id: int):
-        async with aiohttp.ClientSession() as session:
-            token_resp = await session.post(
-                "https://discord.com/api/oauth2/token",
-                data={
-                    "client_id": CLIENT_ID,
-                    "client_secret": CLIENT_SECRET,
+    async def handle_oauth(self, code: str, user_id: int, guild_id: int) -> tuple[bool, str]:
+        try:
+            token_data = await self.exchanger.exchange(
+                f"{user_id}:{guild_id}",
+                {
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
                     "grant_type": "authorization_code",
                     "code": code,
                     "redirect_uri": f"{REDIRECT_URI}/callback",
                 },
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
             )
-            token_data = await token_resp.json()
-            access_token = token_data.get("access_token")
-            if not access_token:
-                print(f"[handle_oauth] access_token取得失敗: {token_data}")
-                return
+        except ExchangeQueueFull:
+            return False, "⏳ 認証が混み合っています。しばらくしてからもう一度お試しください"
+        except (TokenExchangeError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.warning("トークン交換失敗", extra={"guild_id": guild_id, "user_id": user_id, "error": str(e)})
+            return False, "❌ 認証に失敗しました（トークン取得失敗）"
+
+        access_token = token_data.get("access_token")
+        if not access_token:
+            log.warning("access_token 取得失敗", extra={"guild_id": guild_id, "user_id": user_id, "keys": sorted(token_data)})
+            return False, "❌ 認証に失敗しました（トークン取得失敗）"
 
         guild = self.bot.get_guild(guild_id)
         if not guild:
-            return
-        try:
-            member = await guild.fetch_member(user_id)
-        except discord.NotFound:
-            return
+            return False, "❌ サーバーが見つかりません"
+        member = await self.members.get(guild, user_id)
+        if member is None:
+            return False, "❌ サーバーに参加していません"
 
-        role_id = self.load_auto_roles().get(str(guild_id))
+        role_id = self.auto_roles.get(str(guild_id))
         if not role_id:
-            return
+            return False, "⚠️ このサーバーに認証後付与ロールが設定されていません"
 
         role = guild.get_role(int(role_id))
         if not role:
-            return
+            return False, "⚠️ ロールが見つかりません"
 
+        # 認証が済んだので自動解除を取り消す
+        self.scheduler.cancel(f"auth:{guild_id}:{user_id}")
         if role not in member.roles:
             await member.add_roles(role, reason="OAuth認証完了")
-        print(f"[handle_oauth] {member} の認証完了、ロール維持/付与完了")
+            self.members.forget(guild_id, user_id)
+            self.audit.record(guild_id, "role_grant", member, role_id=role.id, reason="OAuth認証完了")
+        log.info("OAuth 認証完了", extra={"guild_id": guild_id, "user_id": user_id})
+        return True, "✅ 認証完了しました。Discordに戻ってください。"
+
+    async def route_oauth(self, code: str, user_id: int, guild_id: int) -> tuple[bool, str]:
+        # ギルドを担当しているクラスタで処理する
+        if self.cluster is None or self.cluster.owns(guild_id):
+            return await self.handle_oauth(code, user_id, guild_id)
+        try:
+            ok, text = await self.cluster.bus.request(
+                self.cluster.cluster_of(guild_id),
+                "oauth",
+                {"code": code, "user_id": user_id, "guild_id": guild_id},
+                timeout=30,
+            )
+        except (IPCError, ConnectionError, asyncio.TimeoutError) as e:
+            log.warning("クラスタへの転送失敗", extra={"guild_id": guild_id, "error": str(e)})
+            return False, "❌ 認証処理中にエラーが発生しました"
+        return ok, text
+
+    async def receive_oauth(self, data: dict):
+        return list(await self.handle_oauth(data["code"], data["user_id"], data["guild_id"]))
+
+    # ---------- 未認証ロールの自動解除 ----------
+    async def expire_roles(self, guild_id: int, payloads: list[dict]):
+        guild = self.bot.get_guild(guild_id)
+        if not guild:
+            return
+
+        async def remove(payload):
+            role = guild.get_role(payload["role_id"])
+            if not role:
+                return
+            # 同じギルドの取得はまとめて行われる
+            member = await self.members.get(guild, payload["user_id"])
+            if member is None:
+                return
+            if role in member.roles:
+                try:
+                    await member.remove_roles(role, reason="認証未完了のため自動解除")
+                    self.members.forget(guild_id, member.id)
+                    self.audit.record(guild_id, "role_revoke", member, role_id=role.id, reason="認証未完了のため自動解除")
+                    log.info("未認証ロールを自動解除", extra={"guild_id": guild_id, "user_id": member.id})
+                except Exception as e:
+                    log.warning("ロール解除失敗", extra={"guild_id": guild_id, "user_id": member.id, "error": str(e)})
+
+        # ギルド単位でまとめて処理
+        await asyncio.gather(*(remove(p) for p in payloads))
 
     # ---------- 管理コマンド ----------
     @app_commands.command(name="set_auth_role", description="認証後に付与するロールを設定")
-    async def set_auth_role(self, interaction: discord.Interaction, role: discord.Role):
+    @app_commands.describe(
+        migrate="これまでのロールを持つメンバーを新しいロールへ移行する",
+        dry_run="設定は変えず、移行の対象になるメンバーだけを報告する",
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_auth_role(self, interaction: discord.Interaction, role: discord.Role,
+                            migrate: bool = False, dry_run: bool = False):
         await interaction.response.defer(ephemeral=True)
-        data = self.load_auto_roles()
-        data[str(interaction.guild.id)] = str(role.id)
-        self.save_auto_roles(data)
-        await interaction.followup.send(f"✅ 認証後ロールを **{role.name}** に設定しました", ephemeral=True)
-        print(f"[set_auth_role] ギルド {interaction.guild.id} にロール {role.id} 設定完了")
-
-    # ---------- Flask サーバー ----------
-    def start_flask(self):
-        app = Flask(__name__)
-
-        @app.route("/callback")
-        def callback():
-            code = request.args.get("code")
-            state = request.args.get("state")
-            if not code or not state:
-                return "❌ 認証に失敗しました"
-
-            try:
-                user_id_str, guild_id_str = state.split(":")
-                user_id = int(user_id_str)
-                guild_id = int(guild_id_str)
-            except:
-                return "❌ state 不正"
-
-            self.auth_codes[f"{user_id}:{guild_id}"] = code
-            self.save_auth_codes()
-
-            # 非同期タスクで Bot 側に通知
-            asyncio.run_coroutine_threadsafe(
-                self.handle_oauth(code, user_id, guild_id),
-                self.bot.loop
-            )
+        previous = self.auto_roles.get(str(interaction.guild.id))
+        if dry_run:
+            # ドライランでは認証後ロールも書き換えない
+            text = f"🔍 認証後ロールを **{role.name}** に変えた場合の移行対象を確認します"
+        else:
+            self.auto_roles.set(interaction.guild.id, str(role.id))
+            text = f"✅ 認証後ロールを **{role.name}** に設定しました"
+        if migrate or dry_run:
+            old = interaction.guild.get_role(int(previous)) if previous else None
+            if old is None or old == role:
+                text += "\n⚠️ 移行元になる以前のロールがありません"
+            else:
+                text += "\n" + self.start_migration(interaction, old, role, remove_old=True, dry_run=dry_run)
+        elif previous and int(previous) != role.id:
+            text += "\n既存のメンバーへの反映は `/auth_role_migrate` で行えます"
+        await interaction.followup.send(text, ephemeral=True)
+        if not dry_run:
+            log.info("認証後ロール設定", extra={"guild_id": interaction.guild.id, "role_id": role.id})
+
+    # ---------- 認証ロールの一括移行 ----------
+    def start_migration(self, interaction: discord.Interaction, from_role: discord.Role,
+                        to_role: discord.Role | None, *, remove_old: bool, dry_run: bool) -> str:
+        guild = interaction.guild
+        if self.migrations.running(guild.id):
+            return "⚠️ 移行ジョブが実行中です（`/auth_role_migrate_status` で確認できます）"
+        top = guild.me.top_role
+        if not dry_run and any(r is not None and r >= top for r in (from_role, to_role)):
+            return "⚠️ Bot より上位のロールは変更できません"
+        self.migrations.start(
+            guild.id, from_role.id, to_role.id if to_role else None,
+            remove_old=remove_old, dry_run=dry_run, channel_id=interaction.channel_id,
+        )
+        log.info("ロール移行開始", extra={"guild_id": guild.id, "from_role": from_role.id,
+                                          "to_role": to_role.id if to_role else None, "dry_run": dry_run})
+        return f"🔁 {'ドライランを' if dry_run else 'ロールの移行を'}開始しました。進捗はこのチャンネルに表示されます"
+
+    @app_commands.command(name="auth_role_migrate", description="ロールを持つメンバーを別のロールへ一括で移行")
+    @app_commands.describe(
+        from_role="移行元のロール",
+        to_role="付与するロール（省略すると現在の認証後ロール）",
+        remove_old="移行元のロールを外す",
+        dry_run="変更せず、対象になるメンバーだけを報告する",
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def auth_role_migrate(self, interaction: discord.Interaction, from_role: discord.Role,
+                                to_role: discord.Role | None = None, remove_old: bool = True,
+                                dry_run: bool = False):
+        if to_role is None:
+            role_id = self.auto_roles.get(str(interaction.guild.id))
+            to_role = interaction.guild.get_role(int(role_id)) if role_id else None
+        if to_role is None and not remove_old:
+            await interaction.response.send_message("⚠️ 付与するロールがありません", ephemeral=True)
+            return
+        text = self.start_migration(interaction, from_role, to_role, remove_old=remove_old, dry_run=dry_run)
+        await interaction.response.send_message(text, ephemeral=True)
+
+    @app_commands.command(name="auth_role_migrate_status", description="ロール移行の進捗を表示")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def auth_role_migrate_status(self, interaction: discord.Interaction):
+        job = self.migrations.get(interaction.guild.id)
+        text = self.migrations.describe(interaction.guild.id, job) if job else "移行ジョブはありません"
+        await interaction.response.send_message(
+            text, ephemeral=True, allowed_mentions=discord.AllowedMentions.none()
+        )
 
-            return "✅ 認証完了しました。Discordに戻ってください。"
+    @app_commands.command(name="auth_role_migrate_cancel", description="実行中のロール移行を中止")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def auth_role_migrate_cancel(self, interaction: discord.Interaction):
+        if self.migrations.cancel(interaction.guild.id):
+            await interaction.response.send_message("🛑 ロール移行を中止しました", ephemeral=True)
+        else:
+            await interaction.response.send_message("実行中の移行ジョブはありません", ephemeral=True)
+
+    @app_commands.command(name="auth_stats", description="OAuth トークン交換の状況を表示")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def auth_stats(self, interaction: discord.Interaction):
+        stats = self.exchanger.stats()
+        await interaction.response.send_message(
+            f"待ち行列: {stats['queue_depth']} / 処理中: {stats['inflight']} / ワーカー: {stats['workers']}\n"
+            f"完了: {stats['completed']} / 失敗: {stats['failed']} / 重複: {stats['duplicates']}"
+            f" / 混雑拒否: {stats['rejected']} / 429: {stats['rate_limited']}\n"
+            f"交換時間 p50: {stats['latency_p50_ms']:.0f}ms / p99: {stats['latency_p99_ms']:.0f}ms",
+            ephemeral=True
+        )
+
+    # ---------- OAuth callback ----------
+    async def callback(self, request: web.Request):
+        code = request.query.get("code")
+        state = request.query.get("state")
+        if not code or not state:
+            return web.Response(text="❌ 認証に失敗しました", status=400)
 
-        def run_flask():
-            port = int(os.environ.get("PORT", 10000))
-            app.run(host="0.0.0.0", port=port, debug=False, use_reloader=False)
+        try:
+            # 末尾の client_id は振り分け済み（CallbackRouter）
+            user_id_str, guild_id_str, *_ = state.split(":")
+            user_id = int(user_id_str)
+            guild_id = int(guild_id_str)
+        except ValueError:
+            return web.Response(text="❌ state 不正", status=400)
 
-        threading.Thread(target=run_flask, daemon=True).start()
-        print("[Flask] OAuth callback サーバー起動")
+        state_key = f"{user_id}:{guild_id}"
+        self.auth_codes.set(state_key, code)
+
+        # Bot と同じループ上で処理し、結果をそのまま返す
+        try:
+            ok, text = await self.route_oauth(code, user_id, guild_id)
+        except Exception:
+            log.exception("認証処理失敗", extra={"guild_id": guild_id, "user_id": user_id})
+            ok, text = False, "❌ 認証処理中にエラーが発生しました"
+        if ok:
+            # 使用済みのコードは保持しない
+            self.auth_codes.pop(state_key)
+        return web.Response(text=text, status=200 if ok else 400)
 
 
 # --------------------------
@@ -0,0 +1,34 @@
+import asyncio
+import discord
+from discord.ext import commands
+
+from bot.cluster import format_stats, process_stats
+from bot.ipc import IPCError
+
+class ClusterCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    # ===============================
+    # /cluster_stats
+    # ===============================
+    @discord.app_commands.command(name="cluster_stats", description="シャード・クラスタごとの負荷を表示")
+    @discord.app_commands.checks.has_permissions(administrator=True)
+    async def cluster_stats(self, interaction: discord.Interaction):
+        cluster = getattr(self.bot, "cluster", None)
+        if cluster is None:
+            # 単一プロセスで動作中はこのプロセスの分だけ
+            stats = {"0": process_stats(self.bot)}
+        else:
+            try:
+                stats = await cluster.all_stats()
+            except (IPCError, ConnectionError, asyncio.TimeoutError) as e:
+                await interaction.response.send_message(f"⚠️ 統計を取得できません: {e}", ephemeral=True)
+                return
+            # 自分の分は最新の値にする
+            stats[str(cluster.cluster_id)] = cluster.stats()
+
+        await interaction.response.send_message("\n".join(format_stats(stats)) or "データがありません", ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(ClusterCog(bot))
@@ -1,67 +1,234 @@
-import json
 import os
+import asyncio
+import logging
 import discord
 from discord.ext import commands
 
-DATA_DIR = "data"
-
-def load(name, default):
-    path = os.path.join(DATA_DIR, f"{name}.json")
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return default
+from bot.admission import AdmissionControl
+from bot.config import RELAY_INDEX_PERSIST
+from bot.ipc import IPCError
+from bot.pipeline import RELAY, MessageContext, get_pipeline
+from bot.relay import RelayFanout, RelayIndex, RouteIndex, signature, unpack
+from bot.storage import get_storage
 
-def save(name, data):
-    with open(os.path.join(DATA_DIR, f"{name}.json"), "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+log = logging.getLogger(__name__)
 
-global_data = load("global", {})
+DATA_DIR = "data"
 
 class GlobalChatCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.networks = get_storage(bot).table("global", legacy=os.path.join(DATA_DIR, "global.json"))
+        # クラスタモードでは他プロセス担当のギルドを IPC で転送する
+        self.cluster = getattr(bot, "cluster", None)
+        self.routes = RouteIndex(bot, self.networks.all(), locate=self.cluster.locate if self.cluster else None)
+        # 中継元メッセージ → 各チャンネルのコピー（編集・削除の反映用）
+        table = None
+        if RELAY_INDEX_PERSIST:
+            table = get_storage(bot).table("relay_index" if self.cluster is None else f"relay_index:{self.cluster.cluster_id}")
+        self.index = RelayIndex(table)
+        self.fanout = RelayFanout(bot, self.index)
+        # 1人の連投が全ネットワークへの送信に増幅されないよう、中継前に流量を制限する
+        self.admission = AdmissionControl()
+
+    async def cog_load(self):
+        get_pipeline(self.bot).register("global_chat", RELAY, self.relay)
+        self.index.start()
+        if self.cluster:
+            self.cluster.bus.on("relay", self.receive_relay)
+            self.cluster.bus.on("relay_update", self.receive_update)
+            self.cluster.bus.on("global_network", self.receive_network)
+
+    async def cog_unload(self):
+        get_pipeline(self.bot).unregister("global_chat")
+        self.index.stop()
+        if self.cluster:
+            for op in ("relay", "relay_update", "global_network"):
+                self.cluster.bus.handlers.pop(op, None)
 
     # ===============================
-    # メッセージ中継
+    # メッセージ中継（パイプラインの relay ステージ）
+    # ===============================
+    async def relay(self, ctx: MessageContext):
+        key = (ctx.guild.id, ctx.channel.id)
+        targets = self.routes.get(key)
+        if targets is None:
+            return
+        remote = self.routes.remote(key) if self.cluster else None
+        if not targets and not remote:
+            return
+        if not await self.admission.admit(ctx.author.id, ctx.channel.id, self.routes.memberships.get(key, ())):
+            return
+
+        payload = self.fanout.payload(ctx.message)
+        remote = remote or {}
+        self.index.begin(payload["source"])
+        copies, forwarded = [], []
+        try:
+            copies, *sent = await asyncio.gather(
+                self.fanout.deliver(payload, targets),
+                *(self.forward(cluster_id, payload, chans) for cluster_id, chans in remote.items()),
+            )
+            forwarded = [cluster_id for cluster_id, ok in zip(remote, sent) if ok]
+        finally:
+            self.index.record(payload["source"], copies, forwarded, signature(payload))
+
+    async def forward(self, cluster_id: int, payload: dict, targets) -> bool:
+        # 担当クラスタへはクラスタごとに1通だけ送る
+        try:
+            await self.cluster.bus.send(cluster_id, "relay", {**payload, "targets": targets})
+            return True
+        except (IPCError, ConnectionError) as e:
+            log.warning("クラスタへの転送失敗", extra={"cluster": cluster_id, "error": str(e)})
+            return False
+
+    async def receive_relay(self, data: dict):
+        targets = [tuple(t) for t in data.pop("targets")]
+        self.index.begin(data["source"])
+        copies = []
+        try:
+            copies = await self.fanout.deliver(data, self.routes.resolve(targets), scope="remote")
+        finally:
+            self.index.record(data["source"], copies)
+
+    # ===============================
+    # 編集・削除の反映
     # ===============================
     @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot or not message.guild:
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        # キャッシュに無い古いメッセージの編集も拾えるよう raw イベントを使う
+        if payload.guild_id is None:
+            return
+        entry = await self.index.get(payload.message_id)
+        if entry is None or payload.message.guild is None:
             return
+        relayed = self.fanout.payload(payload.message)
+        sig = signature(relayed)
+        if sig == entry["sig"]:
+            return  # リンクのプレビュー展開など、本文が変わっていない更新
+        copies = unpack(entry["copies"])
+        self.index.record(payload.message_id, copies, entry["remote"], sig)
+        updated, *_ = await asyncio.gather(
+            self.fanout.update(copies, relayed),
+            *(self.forward_update(c, "edit", payload.message_id, relayed) for c in entry["remote"]),
+        )
+        if updated != copies:
+            # 埋め込みが付いて単独で送り直したコピーがある
+            self.index.record(payload.message_id, updated, entry["remote"], sig)
 
-        identifier = f"{message.guild.id}:{message.channel.id}"
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        if payload.guild_id is not None:
+            await self.propagate_delete(payload.message_id)
 
-        for name, chans in global_data.items():
-            if identifier not in chans:
-                continue
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        # スパムの一括削除もすべての中継先へ反映する
+        if payload.guild_id is not None:
+            await asyncio.gather(*(self.propagate_delete(message_id) for message_id in payload.message_ids))
 
-            for target in chans:
-                if target == identifier:
-                    continue
+    async def propagate_delete(self, source_id: int):
+        entry = await self.index.pop(source_id)
+        if entry is None:
+            return
+        await asyncio.gather(
+            self.fanout.remove(unpack(entry["copies"])),
+            *(self.forward_update(c, "delete", source_id) for c in entry["remote"]),
+        )
 
-                tg, tc = map(int, target.split(":"))
-                guild = self.bot.get_guild(tg)
-                if not guild:
-                    continue
+    async def forward_update(self, cluster_id: int, action: str, source_id: int, payload: dict | None = None):
+        try:
+            await self.cluster.bus.send(
+                cluster_id, "relay_update", {"action": action, "source": source_id, "payload": payload}
+            )
+        except (IPCError, ConnectionError) as e:
+            log.warning("クラスタへの転送失敗", extra={"cluster": cluster_id, "error": str(e)})
 
-                channel = guild.get_channel(tc)
-                if not channel:
-                    continue
+    async def receive_update(self, data: dict):
+        if data["action"] == "delete":
+            entry = await self.index.pop(data["source"])
+            if entry is not None:
+                await self.fanout.remove(unpack(entry["copies"]))
+        else:
+            entry = await self.index.get(data["source"])
+            if entry is not None:
+                copies = unpack(entry["copies"])
+                updated = await self.fanout.update(copies, data["payload"])
+                if updated != copies:
+                    self.index.record(data["source"], updated, entry["remote"], entry["sig"])
 
-                await channel.send(
-                    f"**{message.author.display_name}@{message.guild.name}**\n"
-                    f"{message.content}"
-                )
+    # ===============================
+    # 解決済みチャンネルの破棄
+    # ===============================
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.routes.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        self.routes.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.routes.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        self.routes.invalidate()
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.routes.invalidate()
+        self.fanout.webhooks.invalidate(channel.id)
+
+    @commands.Cog.listener()
+    async def on_config_update(self, ns: str, key: str):
+        # 他クラスタでネットワークが作成・変更された
+        if ns == "global":
+            self.routes.reload(key, self.networks.get(key, []))
+
+    # ---------- ネットワーク構成の変更 ----------
+    # 一覧をまるごと書き換えるので、クラスタモードではクラスタ 0 だけが書き込む（同時参加の取りこぼし防止）
+    async def update_network(self, op: str, name: str, identifier: str | None = None) -> bool:
+        if self.cluster is None or self.cluster.cluster_id == 0:
+            self.apply_network(op, name, identifier)
+            return True
+        try:
+            await self.cluster.bus.request(0, "global_network", {"op": op, "name": name, "identifier": identifier})
+        except (IPCError, ConnectionError, asyncio.TimeoutError) as e:
+            log.warning("ネットワーク変更の転送失敗", extra={"network": name, "error": str(e)})
+            return False
+        # 保存内容は設定変更の通知で読み直される。経路だけ先に反映しておく
+        if op == "join":
+            self.routes.join(name, self.routes.parse(identifier))
+        else:
+            self.routes.add_network(name)
+        return True
+
+    def apply_network(self, op: str, name: str, identifier: str | None = None):
+        if op == "create":
+            if name not in self.networks:
+                self.networks.set(name, [])
+                self.routes.add_network(name)
+        elif op == "join":
+            chans = list(self.networks.get(name, []))
+            if identifier not in chans:
+                chans.append(identifier)
+                self.networks.set(name, chans)
+                self.routes.join(name, self.routes.parse(identifier))
+
+    async def receive_network(self, data: dict):
+        self.apply_network(data["op"], data["name"], data.get("identifier"))
+        return True
 
     # ===============================
     # /global_create
     # ===============================
     @discord.app_commands.command(name="global_create")
     async def global_create(self, interaction: discord.Interaction, name: str):
-        if name not in global_data:
-            global_data[name] = []
-            save("global", global_data)
+        if not await self.update_network("create", name):
+            await interaction.response.send_message("❌ 他のクラスタとの通信に失敗しました", ephemeral=True)
+            return
 
         await interaction.response.send_message(
             "✅ グローバルチャットを作成しました",
@@ -74,16 +241,35 @@ class GlobalChatCog(commands.Cog):
     @discord.app_commands.command(name="global_join")
     async def global_join(self, interaction: discord.Interaction, name: str):
         identifier = f"{interaction.guild.id}:{interaction.channel.id}"
-        chans = global_data.setdefault(name, [])
-
-        if identifier not in chans:
-            chans.append(identifier)
-            save("global", global_data)
+        if not await self.update_network("join", name, identifier):
+            await interaction.response.send_message("❌ 他のクラスタとの通信に失敗しました", ephemeral=True)
+            return
 
         await interaction.response.send_message(
             "✅ グローバルチャットに参加しました",
             ephemeral=True
         )
 
+    # ===============================
+    # /global_stats
+    # ===============================
+    @discord.app_commands.command(name="global_stats", description="中継と送信キューの状況を表示")
+    @discord.app_commands.checks.has_permissions(administrator=True)
+    async def global_stats(self, interaction: discord.Interaction):
+        out = self.fanout.outbound.stats()
+        stages = get_pipeline(self.bot).stats()
+        adm = self.admission.stats()
+        lines = [
+            f"送信待ち: {out['queue_depth']}（最大 {out['max_channel_depth']}/チャンネル）"
+            f" / 送信中チャンネル: {out['active_channels']}",
+            f"送信: {out['sent']} / まとめ送信: {out['coalesced']} / 失敗: {out['failed']}"
+            f" / 429: {out['rate_limited']} / レート制限待ち: {out['rate_limit_wait_s']:.1f}秒",
+            f"流量制限: 中継 {adm['admitted']} / 待機 {adm['queued']} / 破棄 {adm['dropped']}",
+        ]
+        for name, st in stages.items():
+            lines.append(f"`{name}`: {st['count']}件 平均 {st['avg_ms']:.1f}ms 最大 {st['max_ms']:.1f}ms")
+
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(GlobalChatCog(bot))
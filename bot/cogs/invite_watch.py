@@ -1,62 +1,98 @@
-import re, json, os
-from datetime import datetime, timezone, timedelta
+import os
 import discord
 from discord.ext import commands
 
-DATA_DIR = "data"
-INVITE_REGEX = r"(discord\.gg|discord\.com\/invite)\/\S+"
-URL_REGEX = r"https?://[^\s]+"
+from bot.audit import get_audit
+from bot.filters import FilterCache
+from bot.outbound import get_outbound
+from bot.pipeline import MODERATION, MessageContext, get_pipeline
+from bot.spam_wave import SpamWave
+from bot.storage import get_storage
 
-def load(name, d):
-    p = f"{DATA_DIR}/{name}.json"
-    return json.load(open(p,"r",encoding="utf-8")) if os.path.exists(p) else d
+DATA_DIR = "data"
 
-def save(name, d):
-    json.dump(d, open(f"{DATA_DIR}/{name}.json","w",encoding="utf-8"),
-              indent=2, ensure_ascii=False)
+# ルールごとの DM 文面（invite はタイムアウトのみ）
+DM_MESSAGES = {
+    "url": "このチャンネルではURLは禁止されています",
+    "deny": "禁止されているドメインのURLは送信できません",
+    "keyword": "禁止ワードが含まれていたためメッセージを削除しました",
+}
 
-invite_cfg = load("invite", {})
+def default_cfg():
+    return {
+        "enabled": False, "ignore": [], "url_watch": False,
+        "allow": [], "deny": [], "keywords": [],
+    }
 
 class InviteWatch(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.configs = get_storage(bot).table("invite", legacy=os.path.join(DATA_DIR, "invite.json"))
+        self.filters = FilterCache(self.configs)
+        self.audit = get_audit(bot)
+        self.wave = SpamWave(get_outbound(bot), audit=self.audit)
+
+    async def cog_load(self):
+        get_pipeline(self.bot).register("invite_watch", MODERATION, self.moderate)
+
+    async def cog_unload(self):
+        get_pipeline(self.bot).unregister("invite_watch")
+
+    def config(self, guild_id: int) -> dict:
+        cfg = default_cfg()
+        cfg.update(self.configs.get(guild_id, {}))
+        return cfg
+
+    def save_config(self, guild_id: int, cfg: dict):
+        self.configs.set(guild_id, cfg)
+        self.filters.invalidate(guild_id)
 
-    # ===== メッセージ監視 =====
     @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot or not message.guild:
+    async def on_config_update(self, ns: str, key: str):
+        # 他クラスタで設定が変わったらフィルタを作り直す
+        if ns == "invite":
+            self.filters.invalidate(int(key))
+
+    # ===== メッセージ監視（パイプラインの moderation ステージ） =====
+    async def moderate(self, ctx: MessageContext):
+        # 例外チャンネル・ルール判定はコンパイル済みフィルタで1回だけ走査
+        flt = self.filters.get(ctx.guild.id)
+        if flt.pattern is None and not flt.invite:
+            return
+        verdict = flt.check(ctx.channel.id, ctx.normalized)
+        if verdict is None:
             return
 
-        gid = str(message.guild.id)
-        cfg = invite_cfg.setdefault(
-            gid, {"enabled": False, "ignore": [], "url_watch": False}
+        # 削除するメッセージは以降のステージ（中継など）に流さない
+        ctx.stop()
+        message = ctx.message
+        self.audit.record(
+            ctx.guild.id, "message_delete", message.author,
+            channel_id=ctx.channel.id, rule=verdict.rule, content=message.content[:300],
         )
 
-        # 例外チャンネル
-        if message.channel.id in cfg["ignore"]:
-            return
-
-        # 招待リンク監視
-        if cfg["enabled"] and re.search(INVITE_REGEX, message.content):
+        # 違反が集中している間は一括削除・タイムアウトをまとめて処理
+        in_wave = self.wave.observe(message)
+        if in_wave:
+            self.wave.queue_delete(message)
+        else:
             await message.delete()
-            until = datetime.now(timezone.utc) + timedelta(minutes=10)
-            await message.author.timeout(until, reason="招待リンク送信")
 
-        # URL監視
-        elif cfg["url_watch"] and re.search(URL_REGEX, message.content):
-            await message.delete()
-            await message.author.send("このチャンネルではURLは禁止されています")
+        # 招待リンク
+        if verdict.rule == "invite":
+            await self.wave.timeout_once(message.author, "招待リンク送信", defer=in_wave)
+
+        # URL / ドメイン / キーワード（ウェーブ中は DM しない）
+        elif not in_wave:
+            await self.wave.dm_once(message.author, DM_MESSAGES[verdict.rule])
 
     # ===== 招待リンク ON/OFF =====
     @discord.app_commands.command(name="invite_watch")
     @discord.app_commands.checks.has_permissions(administrator=True)
     async def invite_watch(self, interaction: discord.Interaction, enabled: bool):
-        cfg = invite_cfg.setdefault(
-            str(interaction.guild.id),
-            {"enabled": False, "ignore": [], "url_watch": False}
-        )
+        cfg = self.config(interaction.guild.id)
         cfg["enabled"] = enabled
-        save("invite", invite_cfg)
+        self.save_config(interaction.guild.id, cfg)
         await interaction.response.send_message(
             f"招待リンク監視を {'有効' if enabled else '無効'} にしました",
             ephemeral=True
@@ -66,12 +102,9 @@ class InviteWatch(commands.Cog):
     @discord.app_commands.command(name="url_watch")
     @discord.app_commands.checks.has_permissions(administrator=True)
     async def url_watch(self, interaction: discord.Interaction, enabled: bool):
-        cfg = invite_cfg.setdefault(
-            str(interaction.guild.id),
-            {"enabled": False, "ignore": [], "url_watch": False}
-        )
+        cfg = self.config(interaction.guild.id)
         cfg["url_watch"] = enabled
-        save("invite", invite_cfg)
+        self.save_config(interaction.guild.id, cfg)
         await interaction.response.send_message(
             f"URL監視を {'有効' if enabled else '無効'} にしました",
             ephemeral=True
@@ -83,13 +116,10 @@ class InviteWatch(commands.Cog):
     async def invite_ignore_add(
         self, interaction: discord.Interaction, channel: discord.TextChannel
     ):
-        cfg = invite_cfg.setdefault(
-            str(interaction.guild.id),
-            {"enabled": False, "ignore": [], "url_watch": False}
-        )
+        cfg = self.config(interaction.guild.id)
         if channel.id not in cfg["ignore"]:
             cfg["ignore"].append(channel.id)
-        save("invite", invite_cfg)
+        self.save_config(interaction.guild.id, cfg)
         await interaction.response.send_message(
             f"{channel.mention} を例外チャンネルに追加しました",
             ephemeral=True
@@ -101,17 +131,73 @@ class InviteWatch(commands.Cog):
     async def invite_ignore_remove(
         self, interaction: discord.Interaction, channel: discord.TextChannel
     ):
-        cfg = invite_cfg.setdefault(
-            str(interaction.guild.id),
-            {"enabled": False, "ignore": [], "url_watch": False}
-        )
+        cfg = self.config(interaction.guild.id)
         if channel.id in cfg["ignore"]:
             cfg["ignore"].remove(channel.id)
-        save("invite", invite_cfg)
+        self.save_config(interaction.guild.id, cfg)
         await interaction.response.send_message(
             f"{channel.mention} を監視対象に戻しました",
             ephemeral=True
         )
 
+    # ===== ドメイン許可/拒否リスト =====
+    @discord.app_commands.command(name="invite_domain_add")
+    @discord.app_commands.checks.has_permissions(administrator=True)
+    @discord.app_commands.choices(mode=[
+        discord.app_commands.Choice(name="許可", value="allow"),
+        discord.app_commands.Choice(name="拒否", value="deny"),
+    ])
+    async def invite_domain_add(
+        self, interaction: discord.Interaction, domain: str, mode: str
+    ):
+        domain = domain.lower().strip(".")
+        cfg = self.config(interaction.guild.id)
+        if domain not in cfg[mode]:
+            cfg[mode].append(domain)
+        self.save_config(interaction.guild.id, cfg)
+        await interaction.response.send_message(
+            f"`{domain}` を{'許可' if mode == 'allow' else '拒否'}リストに追加しました",
+            ephemeral=True
+        )
+
+    @discord.app_commands.command(name="invite_domain_remove")
+    @discord.app_commands.checks.has_permissions(administrator=True)
+    async def invite_domain_remove(self, interaction: discord.Interaction, domain: str):
+        domain = domain.lower().strip(".")
+        cfg = self.config(interaction.guild.id)
+        for mode in ("allow", "deny"):
+            if domain in cfg[mode]:
+                cfg[mode].remove(domain)
+        self.save_config(interaction.guild.id, cfg)
+        await interaction.response.send_message(
+            f"`{domain}` をドメインリストから削除しました",
+            ephemeral=True
+        )
+
+    # ===== 禁止ワード =====
+    @discord.app_commands.command(name="invite_keyword_add")
+    @discord.app_commands.checks.has_permissions(administrator=True)
+    async def invite_keyword_add(self, interaction: discord.Interaction, keyword: str):
+        cfg = self.config(interaction.guild.id)
+        if keyword not in cfg["keywords"]:
+            cfg["keywords"].append(keyword)
+        self.save_config(interaction.guild.id, cfg)
+        await interaction.response.send_message(
+            f"`{keyword}` を禁止ワードに追加しました",
+            ephemeral=True
+        )
+
+    @discord.app_commands.command(name="invite_keyword_remove")
+    @discord.app_commands.checks.has_permissions(administrator=True)
+    async def invite_keyword_remove(self, interaction: discord.Interaction, keyword: str):
+        cfg = self.config(interaction.guild.id)
+        if keyword in cfg["keywords"]:
+            cfg["keywords"].remove(keyword)
+        self.save_config(interaction.guild.id, cfg)
+        await interaction.response.send_message(
+            f"`{keyword}` を禁止ワードから削除しました",
+            ephemeral=True
+        )
+
 async def setup(bot):
     await bot.add_cog(InviteWatch(bot))
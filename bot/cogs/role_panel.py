@@ -1,35 +1,177 @@
+import re
+import asyncio
+import logging
 import discord
 from discord.ext import commands
-from discord.ui import View, Button
+from discord.ui import View, Button, Select
+
+from bot.members import MemberLookup, get_members
+from bot.storage import get_storage
+
+log = logging.getLogger(__name__)
+
+EDIT_WINDOW = 1.5   # 同じメンバーの連続クリックをまとめる時間(秒)
+MAX_SELECT_ROLES = 25
+ROLE_MENTION = re.compile(r"<@&(\d+)>|(\d{15,})")
+
+
+# --------------------------
+# メンバーごとのロール変更をまとめて1回の編集にする
+# --------------------------
+class RoleEditBatcher:
+    def __init__(self, members: MemberLookup, window: float = EDIT_WINDOW):
+        self.members = members
+        self.window = window
+        self.pending: dict[tuple[int, int], dict] = {}
+
+    def _state(self, member: discord.Member) -> dict:
+        self.members.remember(member)
+        key = (member.guild.id, member.id)
+        state = self.pending.get(key)
+        if state is None:
+            state = self.pending[key] = {"member": member, "add": set(), "remove": set()}
+            asyncio.get_running_loop().call_later(
+                self.window, lambda: asyncio.create_task(self._flush(key))
+            )
+        state["member"] = member
+        return state
+
+    def toggle(self, member: discord.Member, role_id: int) -> bool:
+        state = self._state(member)
+        has = role_id in state["add"] or (
+            role_id not in state["remove"] and member.get_role(role_id) is not None
+        )
+        if has:
+            state["add"].discard(role_id)
+            state["remove"].add(role_id)
+        else:
+            state["remove"].discard(role_id)
+            state["add"].add(role_id)
+        return not has
+
+    def replace(self, member: discord.Member, panel_roles: set[int], selected: set[int]):
+        state = self._state(member)
+        state["add"] = (state["add"] - panel_roles) | selected
+        state["remove"] = (state["remove"] | panel_roles) - selected
+
+    async def _flush(self, key):
+        state = self.pending.pop(key, None)
+        if state is None:
+            return
+        member = state["member"]
+        member = await self.members.get(member.guild, member.id) or member
+
+        current = {r.id for r in member.roles if not r.is_default()}
+        wanted = (current - state["remove"]) | state["add"]
+        if wanted == current:
+            return
+
+        roles = [r for r in (member.guild.get_role(i) for i in wanted) if r]
+        try:
+            # 追加・削除をまとめて1回の API 呼び出しで反映
+            updated = await member.edit(roles=roles, reason="ロールパネル")
+        except discord.HTTPException as e:
+            log.warning("ロール更新失敗", extra={"guild_id": member.guild.id, "user_id": member.id, "error": str(e)})
+            updated = None
+        # 次のクリックが古いロールを基準にしないよう、更新後のメンバーに差し替える
+        if updated is not None:
+            self.members.remember(updated)
+        else:
+            self.members.forget(member.guild.id, member.id)
+
 
 class RolePanelCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.panels = get_storage(bot).table("role_panels")
+        self.batcher = RoleEditBatcher(get_members(bot))
+
+    async def cog_load(self):
+        # 保存済みパネルを永続 View として登録し直す（再起動後もボタンが動く）
+        for message_id, panel in self.panels.items():
+            self.bot.add_view(self.build_view(panel), message_id=int(message_id))
+
+    def build_view(self, panel: dict) -> View:
+        roles = [(int(role_id), name) for role_id, name in panel["roles"]]
+        if panel["mode"] == "select":
+            return self.RoleSelectView(self.batcher, roles)
+        return self.RolePanelView(self.batcher, roles)
 
     # ===============================
-    # ロールパネル View
+    # ロールパネル View（ボタン）
     # ===============================
     class RolePanelView(View):
-        def __init__(self, roles):
+        def __init__(self, batcher: RoleEditBatcher, roles: list[tuple[int, str]]):
             super().__init__(timeout=None)
 
-            for role in roles:
-                button = Button(label=role.name)
-
-                async def callback(interaction: discord.Interaction, r=role):
-                    if r in interaction.user.roles:
-                        await interaction.user.remove_roles(r)
-                    else:
-                        await interaction.user.add_roles(r)
+            for role_id, name in roles:
+                button = Button(label=name[:80], custom_id=f"role_panel:toggle:{role_id}")
 
+                async def callback(interaction: discord.Interaction, r=role_id):
+                    added = batcher.toggle(interaction.user, r)
                     await interaction.response.send_message(
-                        "✅ ロールを更新しました",
-                        ephemeral=True
+                        f"✅ <@&{r}> を{'付与' if added else '解除'}します",
+                        ephemeral=True,
+                        allowed_mentions=discord.AllowedMentions.none(),
                     )
 
                 button.callback = callback
                 self.add_item(button)
 
+    # ===============================
+    # ロールパネル View（セレクトメニュー）
+    # ===============================
+    class RoleSelectView(View):
+        def __init__(self, batcher: RoleEditBatcher, roles: list[tuple[int, str]]):
+            super().__init__(timeout=None)
+            panel_roles = {role_id for role_id, _ in roles}
+
+            select = Select(
+                custom_id="role_panel:select",
+                placeholder="ロールを選択してください",
+                min_values=0,
+                max_values=len(roles),
+                options=[discord.SelectOption(label=name[:100], value=str(role_id)) for role_id, name in roles],
+            )
+
+            async def callback(interaction: discord.Interaction):
+                batcher.replace(interaction.user, panel_roles, {int(v) for v in select.values})
+                await interaction.response.send_message("✅ ロールを更新しました", ephemeral=True)
+
+            select.callback = callback
+            self.add_item(select)
+
+    # ===============================
+    # パネル保存
+    # ===============================
+    async def send_panel(self, interaction: discord.Interaction, mode: str, roles: list[discord.Role]):
+        panel = {
+            "guild_id": interaction.guild.id,
+            "channel_id": interaction.channel.id,
+            "mode": mode,
+            "roles": [[str(r.id), r.name] for r in roles],
+        }
+        view = self.build_view(panel)
+        await interaction.response.send_message("ロールを選択してください", view=view)
+        message = await interaction.original_response()
+        self.panels.set(message.id, panel)
+        # 同じ custom_id のパネルが複数あってもメッセージ単位で振り分ける
+        self.bot.add_view(view, message_id=message.id)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self.forget_panel(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        # 一括削除で消えたパネルも、再起動時に View を登録し直さないよう消しておく
+        for message_id in payload.message_ids:
+            self.forget_panel(message_id)
+
+    def forget_panel(self, message_id: int):
+        if message_id in self.panels:
+            self.panels.delete(message_id)
+
     # ===============================
     # /role_panel コマンド
     # ===============================
@@ -44,11 +186,30 @@ class RolePanelCog(commands.Cog):
         r5: discord.Role = None,
     ):
         roles = [r for r in [r1, r2, r3, r4, r5] if r]
+        await self.send_panel(interaction, "button", roles)
 
-        await interaction.response.send_message(
-            "ロールを選択してください",
-            view=self.RolePanelView(roles)
-        )
+    # ===============================
+    # /role_panel_select コマンド（最大25ロール）
+    # ===============================
+    @discord.app_commands.command(name="role_panel_select", description="セレクトメニュー形式のロールパネルを作成")
+    @discord.app_commands.describe(roles="ロールのメンションまたはIDを空白区切りで指定（最大25個）")
+    async def role_panel_select(self, interaction: discord.Interaction, roles: str):
+        found = []
+        for mention, raw_id in ROLE_MENTION.findall(roles):
+            role = interaction.guild.get_role(int(mention or raw_id))
+            if role and not role.is_default() and role not in found:
+                found.append(role)
+
+        if not found:
+            await interaction.response.send_message("⚠️ ロールが見つかりません", ephemeral=True)
+            return
+        if len(found) > MAX_SELECT_ROLES:
+            await interaction.response.send_message(
+                f"⚠️ ロールは最大{MAX_SELECT_ROLES}個までです", ephemeral=True
+            )
+            return
+
+        await self.send_panel(interaction, "select", found)
 
 async def setup(bot):
     await bot.add_cog(RolePanelCog(bot))
@@ -2,38 +2,115 @@ import discord
 from discord.ext import commands
 from discord.ui import View, Button
 
+from bot.audit import get_audit
+from bot.members import get_members
+from bot.outbound import get_outbound
+from bot.tickets import CATEGORY_NAME, TicketEngine, TicketRegistry
+from bot.transcripts import TranscriptArchiver
+
 class TicketCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.engine = TicketEngine(bot)
+        self.registry = TicketRegistry(bot)
+        self.archiver = TranscriptArchiver()
+        self.members = get_members(bot)
+        self.audit = get_audit(bot)
+        self.opening: set[tuple[int, int]] = set()
+
+    async def cog_load(self):
+        # パネル・閉じるボタンは再起動後も動くように永続 View として登録
+        self.bot.add_view(self.TicketView(self))
+        self.bot.add_view(self.CloseView(self))
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Tickets カテゴリから開いているチケットを拾い直す
+        for guild in self.bot.guilds:
+            category = self.engine.cached_category(guild) or discord.utils.get(
+                guild.categories, name=CATEGORY_NAME
+            )
+            if category:
+                self.registry.rebuild(guild, category)
 
     class TicketView(View):
-        @discord.ui.button(label="🎫 チケット作成", style=discord.ButtonStyle.green)
+        def __init__(self, cog: "TicketCog"):
+            super().__init__(timeout=None)
+            self.cog = cog
+
+        @discord.ui.button(label="🎫 チケット作成", style=discord.ButtonStyle.green, custom_id="ticket:open")
         async def open(self, i: discord.Interaction, _):
-            cat = discord.utils.get(i.guild.categories, name="Tickets")
-            if not cat:
-                cat = await i.guild.create_category("Tickets")
-
-            ch = await i.guild.create_text_channel(
-                f"ticket-{i.user.name}",
-                category=cat,
-                overwrites={
-                    i.guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                    i.user: discord.PermissionOverwrite(read_messages=True)
-                }
-            )
+            # 3秒の応答期限に間に合うよう先に defer
+            await i.response.defer(ephemeral=True)
+            cog = self.cog
+            key = (i.guild.id, i.user.id)
+
+            # 1ユーザー1チケット
+            existing = i.guild.get_channel(cog.registry.get(*key) or 0)
+            if existing or key in cog.opening:
+                mention = existing.mention if existing else ""
+                await i.followup.send(f"⚠️ すでにチケットがあります {mention}", ephemeral=True)
+                return
+
+            # ボタンを押したメンバーは共有キャッシュに入れておく（メンバーを全員保持しない場合の参照用）
+            user = cog.members.remember(i.user)
+            cog.opening.add(key)
+            try:
+                ch = await cog.engine.open(i.guild, user)
+                cog.registry.add(i.guild.id, i.user.id, ch.id)
+            finally:
+                cog.opening.discard(key)
+            cog.audit.record(i.guild.id, "ticket_open", i.user, channel_id=ch.id)
 
-            class CloseView(View):
-                @discord.ui.button(label="❌ チケットを閉じる", style=discord.ButtonStyle.red)
-                async def close(self, inter: discord.Interaction, _):
-                    await inter.response.send_message("削除します", ephemeral=True)
-                    await ch.delete()
+            await get_outbound(i.client).send(ch, f"{i.user.mention} のチケット", view=cog.CloseView(cog))
+            await i.followup.send(f"作成しました {ch.mention}", ephemeral=True)
 
-            await ch.send(f"{i.user.mention} のチケット", view=CloseView())
-            await i.response.send_message("作成しました", ephemeral=True)
+    class CloseView(View):
+        def __init__(self, cog: "TicketCog"):
+            super().__init__(timeout=None)
+            self.cog = cog
+
+        @discord.ui.button(label="❌ チケットを閉じる", style=discord.ButtonStyle.red, custom_id="ticket:close")
+        async def close(self, inter: discord.Interaction, _):
+            ch = inter.channel
+            if self.cog.registry.owner(ch.id) is None and not ch.name.startswith("ticket-"):
+                await inter.response.send_message("⚠️ チケットチャンネルではありません", ephemeral=True)
+                return
+            if ch.id in self.cog.archiver.jobs:
+                await inter.response.send_message("⏳ 保存中です", ephemeral=True)
+                return
+
+            # 履歴の保存はバックグラウンドで行い、保存できてから削除する
+            await inter.response.send_message("トランスクリプトを保存してから削除します", ephemeral=True)
+
+            owner = self.cog.registry.owner(ch.id)
+            audit = self.cog.audit
+
+            async def delete(path):
+                await ch.delete(reason="チケットクローズ")
+                audit.record(
+                    ch.guild.id, "ticket_close", inter.user,
+                    reason=f"#{ch.name}" + (f"（作成者 <@{owner[1]}>）" if owner else ""), transcript=path,
+                )
+
+            self.cog.archiver.submit(ch, then=delete)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.engine.discard(channel.id, channel.guild.id)
+        self.registry.remove(channel.id)
 
     @discord.app_commands.command(name="ticket_panel")
     async def ticket_panel(self, interaction: discord.Interaction):
-        await interaction.response.send_message("チケット作成", view=self.TicketView())
+        await interaction.response.send_message("チケット作成", view=self.TicketView(self))
+        # 初回クリックに備えてプールを温めておく
+        self.engine.schedule_refill(interaction.guild)
+
+    @discord.app_commands.command(name="ticket_count", description="開いているチケットの数を表示")
+    async def ticket_count(self, interaction: discord.Interaction):
+        await interaction.response.send_message(
+            f"🎫 開いているチケット: {self.registry.count(interaction.guild.id)} 件", ephemeral=True
+        )
 
 async def setup(bot):
     await bot.add_cog(TicketCog(bot))
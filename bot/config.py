@@ -13,6 +13,80 @@ BOT_TOKEN = os.environ.get("BOT_TOKEN")
 CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 REDIRECT_URI = os.getenv("REDIRECT_URI")
+OAUTH_TOKEN_URL = os.getenv("OAUTH_TOKEN_URL", "https://discord.com/api/oauth2/token")
+OAUTH_WORKERS = int(os.getenv("OAUTH_WORKERS", 4))          # トークン交換ワーカー数
+OAUTH_QUEUE_SIZE = int(os.getenv("OAUTH_QUEUE_SIZE", 200))  # 待ち行列の上限（超えたら混雑応答）
+OAUTH_MAX_RETRIES = int(os.getenv("OAUTH_MAX_RETRIES", 3))
+AUTH_CODE_TTL = float(os.getenv("AUTH_CODE_TTL", 600))         # 認証コードの保持時間(秒)
+AUTH_CODE_MAX = int(os.getenv("AUTH_CODE_MAX", 10000))         # 保持する認証コードの上限
 
-# # ===== Flask =====
-# PORT = int(os.getenv("PORT", 5000))
+# ===== Web (OAuth callback) =====
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("PORT", 10000))
+
+# ===== 送信 =====
+OUTBOUND_CONCURRENCY = int(os.getenv("OUTBOUND_CONCURRENCY", 8))  # 同時送信数の上限
+
+# ===== グローバルチャット =====
+RELAY_TIMEOUT = float(os.getenv("RELAY_TIMEOUT", 15))        # 1チャンネルあたりの送信タイムアウト(秒)
+RELAY_INDEX_SIZE = int(os.getenv("RELAY_INDEX_SIZE", 20000))  # 編集・削除を反映できる中継元メッセージ数の上限
+RELAY_INDEX_TTL = float(os.getenv("RELAY_INDEX_TTL", 86400))  # 中継後に編集・削除を反映する期間(秒)
+RELAY_INDEX_PERSIST = os.getenv("RELAY_INDEX_PERSIST", "false").lower() in ("1", "true", "yes")  # 再起動後も反映する
+
+# 中継前の流量制限（RATE は1秒あたりの件数、BURST は連続で許す件数。RATE=0 で無効）
+RELAY_USER_RATE = float(os.getenv("RELAY_USER_RATE", 0.5))
+RELAY_USER_BURST = int(os.getenv("RELAY_USER_BURST", 5))
+RELAY_CHANNEL_RATE = float(os.getenv("RELAY_CHANNEL_RATE", 2))
+RELAY_CHANNEL_BURST = int(os.getenv("RELAY_CHANNEL_BURST", 10))
+RELAY_NETWORK_RATE = float(os.getenv("RELAY_NETWORK_RATE", 5))
+RELAY_NETWORK_BURST = int(os.getenv("RELAY_NETWORK_BURST", 20))
+RELAY_THROTTLE_MODE = os.getenv("RELAY_THROTTLE_MODE", "drop")           # drop: 捨てる / queue: 待たせる
+RELAY_THROTTLE_MAX_WAIT = float(os.getenv("RELAY_THROTTLE_MAX_WAIT", 5))  # queue で待たせる上限(秒)
+
+# ===== ストレージ =====
+STORAGE_PATH = os.getenv("STORAGE_PATH", "data/hunya.db")
+STORAGE_FLUSH_DELAY = float(os.getenv("STORAGE_FLUSH_DELAY", 0.5))  # 書き込みをまとめる待ち時間(秒)
+
+# ===== InviteWatch スパムウェーブ =====
+WAVE_THRESHOLD = int(os.getenv("WAVE_THRESHOLD", 5))      # この件数の違反で一括処理モードへ
+WAVE_WINDOW = float(os.getenv("WAVE_WINDOW", 10))         # 違反を数える時間幅(秒)
+WAVE_COOLDOWN = float(os.getenv("WAVE_COOLDOWN", 30))     # 最後の違反からモードを解除するまで(秒)
+
+# ===== チケット =====
+TICKET_POOL_SIZE = int(os.getenv("TICKET_POOL_SIZE", 2))  # ギルドごとに事前作成しておくチャンネル数
+TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR", "data/transcripts")
+TRANSCRIPT_CONCURRENCY = int(os.getenv("TRANSCRIPT_CONCURRENCY", 2))  # ギルドごとの同時保存数
+
+# ===== メンバーキャッシュ =====
+# 有効にすると起動時のメンバー取得（chunk）をやめ、必要なメンバーだけを LRU に保持する
+LOW_MEMORY_MEMBERS = os.getenv("LOW_MEMORY_MEMBERS", "false").lower() in ("1", "true", "yes")
+MEMBER_CACHE_SIZE = int(os.getenv("MEMBER_CACHE_SIZE", 5000))        # 保持するメンバー数の上限
+MEMBER_CACHE_TTL = float(os.getenv("MEMBER_CACHE_TTL", 300))         # 取り直すまでの時間(秒)
+MEMBER_FETCH_WINDOW = float(os.getenv("MEMBER_FETCH_WINDOW", 0.05))  # 取得要求をまとめる待ち時間(秒)
+
+# ===== 認証ロールの一括移行 =====
+ROLE_JOB_CONCURRENCY = int(os.getenv("ROLE_JOB_CONCURRENCY", 2))          # 同時に更新するメンバー数
+ROLE_JOB_RATE = float(os.getenv("ROLE_JOB_RATE", 2))                      # 1秒あたりのロール更新数
+ROLE_JOB_CHUNK = int(os.getenv("ROLE_JOB_CHUNK", 100))                    # チェックポイントを保存する間隔(人)
+ROLE_JOB_REPORT_INTERVAL = float(os.getenv("ROLE_JOB_REPORT_INTERVAL", 15))  # 進捗メッセージを更新する間隔(秒)
+
+# ===== 監査ログ =====
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", 5))  # 10件に満たなくても送信するまでの時間(秒)
+AUDIT_BUFFER_MAX = int(os.getenv("AUDIT_BUFFER_MAX", 1000))         # ギルドごとに溜めておく件数の上限
+AUDIT_JSONL_PATH = os.getenv("AUDIT_JSONL_PATH", "")                # 空なら JSONL には書き出さない
+AUDIT_JSONL_MAX_BYTES = int(os.getenv("AUDIT_JSONL_MAX_BYTES", 10 * 1024 * 1024))  # これを超えたらローテーション
+AUDIT_JSONL_BACKUPS = int(os.getenv("AUDIT_JSONL_BACKUPS", 5))      # 残す世代数
+
+# ===== ホストモード =====
+# カンマ区切りのプロファイル名（<名前>.env）を指定すると、各 Bot を1プロセス・1ループで起動する
+BOT_PROFILES = [name.strip() for name in os.getenv("BOT_PROFILES", "").split(",") if name.strip()]
+
+# ===== クラスタ =====
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", 1))     # 2 以上でシャードをプロセスに分けて起動
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 0))         # 0 なら Discord の推奨値を使う
+IPC_SOCKET = os.getenv("IPC_SOCKET", "data/ipc.sock")  # クラスタ間通信用の Unix ソケット
+CLUSTER_STATS_INTERVAL = float(os.getenv("CLUSTER_STATS_INTERVAL", 30))  # 負荷統計の報告間隔(秒)
+
+# ===== ログ =====
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text / json（1行1レコードの構造化ログ）
@@ -0,0 +1,99 @@
+import re
+import unicodedata
+from typing import NamedTuple
+
+# 招待リンクと URL
+INVITE_PATTERN = r"(?P<invite>(?:https?://)?(?:www\.)?discord(?:app)?\.(?:gg|com/invite)/\S+)"
+URL_PATTERN = r"(?P<url>https?://(?P<host>[^\s/?#:]+)\S*)"
+# 招待は URL の中（リダイレクトのクエリなど）にも埋め込まれるので、URL とは別に探す
+INVITE_RE = re.compile(INVITE_PATTERN, re.IGNORECASE)
+
+
+class Verdict(NamedTuple):
+    rule: str   # invite / url / deny / keyword
+    match: str
+
+
+def _domain_set(domains) -> frozenset:
+    return frozenset(d.lower().strip(".") for d in domains)
+
+
+def _in_domains(host: str, domains: frozenset) -> bool:
+    # サブドメインも含めて一致（a.b.example.com -> example.com）
+    labels = host.split(".")
+    return any(".".join(labels[i:]) in domains for i in range(len(labels)))
+
+
+# --------------------------
+# ギルドごとのコンパイル済みフィルタ
+# --------------------------
+class GuildFilter:
+    __slots__ = ("ignore", "invite", "url", "allow", "deny", "pattern", "needs_dot")
+
+    def __init__(self, cfg: dict):
+        self.ignore = frozenset(cfg.get("ignore", []))
+        self.invite = cfg.get("enabled", False)
+        self.url = cfg.get("url_watch", False)
+        self.allow = _domain_set(cfg.get("allow", []))
+        self.deny = _domain_set(cfg.get("deny", []))
+        # 本文は NFKC + casefold 済みで渡されるのでキーワードも揃える
+        keywords = [unicodedata.normalize("NFKC", k).casefold() for k in cfg.get("keywords", []) if k]
+
+        # URL とキーワードのルールを1つの正規表現にまとめ、1回の走査で判定する
+        parts = []
+        if self.url or self.deny:
+            parts.append(URL_PATTERN)
+        if keywords:
+            words = sorted(keywords, key=len, reverse=True)
+            parts.append("(?P<keyword>" + "|".join(map(re.escape, words)) + ")")
+        self.pattern = re.compile("|".join(parts), re.IGNORECASE) if parts else None
+        # リンク系だけなら "." も "://" も含まないメッセージは正規表現を通さない
+        self.needs_dot = not keywords
+
+    def check(self, channel_id: int, content: str) -> Verdict | None:
+        if (self.pattern is None and not self.invite) or channel_id in self.ignore:
+            return None
+        if self.needs_dot and "." not in content and "://" not in content:
+            return None
+
+        if self.invite:
+            m = INVITE_RE.search(content)
+            if m:
+                return Verdict("invite", m.group())
+        if self.pattern is None:
+            return None
+        for m in self.pattern.finditer(content):
+            kind = m.lastgroup
+            if kind == "url":
+                host = m.group("host").lower()
+                if self.deny and _in_domains(host, self.deny):
+                    return Verdict("deny", m.group())
+                if self.allow and _in_domains(host, self.allow):
+                    continue
+                if self.url:
+                    return Verdict("url", m.group())
+            elif kind == "keyword":
+                return Verdict("keyword", m.group())
+        return None
+
+
+EMPTY_FILTER = GuildFilter({})
+
+
+# --------------------------
+# 設定変更時だけ作り直すキャッシュ
+# --------------------------
+class FilterCache:
+    def __init__(self, configs):
+        self.configs = configs  # storage Table
+        self.filters: dict[int, GuildFilter] = {}
+
+    def get(self, guild_id: int) -> GuildFilter:
+        flt = self.filters.get(guild_id)
+        if flt is None:
+            cfg = self.configs.get(guild_id)
+            flt = self.filters[guild_id] = GuildFilter(cfg) if cfg else EMPTY_FILTER
+        return flt
+
+    def invalidate(self, guild_id: int):
+        self.filters.pop(guild_id, None)
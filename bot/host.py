@@ -0,0 +1,161 @@
+import os
+import asyncio
+import logging
+
+import aiohttp
+import discord
+from aiohttp import web
+from dotenv import dotenv_values
+
+from bot.config import BOT_PROFILES, CLUSTER_COUNT
+from bot.metrics import REGISTRY, GATEWAY_LATENCY, OUTBOUND_QUEUE_DEPTH, render
+from bot.storage import get_storage
+from bot.web import get_web_server
+
+log = logging.getLogger(__name__)
+
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), "..")  # bot/config.py と同じく <名前>.env を探す
+
+
+# --------------------------
+# プロファイル（Bot ごとに変わる設定）
+# --------------------------
+class Profile:
+    def __init__(self, name: str, token: str, client_id: str | None = None, client_secret: str | None = None,
+                 sync_guild_id: str | None = None, namespace: str | None = None):
+        self.name = name
+        self.token = token
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.sync_guild_id = sync_guild_id
+        # ストレージのテーブル名の接頭辞（空なら単独起動時と同じテーブルを使う）
+        self.namespace = name if namespace is None else namespace
+
+
+def load_profile(name: str) -> Profile:
+    path = os.path.join(PROFILE_DIR, f"{name}.env")
+    if not os.path.exists(path):
+        raise RuntimeError(f"プロファイル {name} の設定ファイルがありません: {path}")
+    values = dotenv_values(path)
+    if not values.get("BOT_TOKEN"):
+        raise RuntimeError(f"プロファイル {name} に BOT_TOKEN が設定されていません")
+    return Profile(
+        name,
+        values["BOT_TOKEN"],
+        client_id=values.get("CLIENT_ID"),
+        client_secret=values.get("CLIENT_SECRET"),
+        sync_guild_id=values.get("TEST_GUILD_ID") or None,
+        namespace=values.get("STORAGE_NAMESPACE"),
+    )
+
+
+def load_profiles(names: list[str]) -> list[Profile]:
+    profiles = [load_profile(name) for name in names]
+    namespaces = [p.namespace for p in profiles]
+    if len(set(namespaces)) != len(namespaces):
+        raise RuntimeError("STORAGE_NAMESPACE がプロファイル間で重複しています")
+    client_ids = [p.client_id for p in profiles if p.client_id]
+    if len(set(client_ids)) != len(client_ids):
+        raise RuntimeError("CLIENT_ID がプロファイル間で重複しています")
+    return profiles
+
+
+# --------------------------
+# 共有の接続プール
+# --------------------------
+class SharedConnector(aiohttp.TCPConnector):
+    # Bot ごとのセッションが閉じても他の Bot の接続は残す（ホスト終了時に shutdown で閉じる）
+    def close(self, *, abort_ssl: bool = False):
+        return asyncio.sleep(0)
+
+    async def shutdown(self):
+        await super().close()
+
+
+class HostInfo:
+    def __init__(self, profile: Profile, connector: aiohttp.BaseConnector, bots: list):
+        self.profile = profile
+        self.connector = connector
+        self.bots = bots  # 同じプロセスで動いている全 Bot
+
+
+# --------------------------
+# ホスト（複数の Bot を1つのループで動かす）
+# --------------------------
+class Host:
+    def __init__(self, profiles: list[Profile]):
+        from bot.startup import AvanzareBot, default_intents
+
+        # REST・Gateway・トークン交換の接続を全 Bot で使い回す
+        self.connector = SharedConnector(limit=0)
+        self.bots = []
+        for profile in profiles:
+            bot = AvanzareBot(
+                command_prefix="!",
+                intents=default_intents(),
+                sync_guild_id=profile.sync_guild_id,
+                connector=self.connector,
+            )
+            # Cog のロード前に設定しておく（ストレージの名前空間・OAuth の振り分けに使う）
+            bot.host = HostInfo(profile, self.connector, self.bots)
+            bot.add_listener(self._ready_logger(bot), "on_ready")
+            self.bots.append(bot)
+
+    @staticmethod
+    def _ready_logger(bot):
+        async def on_ready():
+            log.info("ログインしました", extra={"profile": bot.host.profile.name, "user": str(bot.user)})
+        return on_ready
+
+    async def run(self):
+        web_server = get_web_server()
+        REGISTRY.add_collector(self.collect_metrics)
+        web_server.add_route("GET", "/metrics", self.metrics)
+        await web_server.start()
+        log.info("ホストモードで起動します", extra={"profiles": [b.host.profile.name for b in self.bots]})
+        try:
+            await asyncio.gather(*(self._run_bot(bot) for bot in self.bots))
+        finally:
+            web_server.remove_route("GET", "/metrics")
+            await web_server.stop()
+            await get_storage().flush()
+            await self.connector.shutdown()
+
+    async def _run_bot(self, bot):
+        # 1つの Bot が起動に失敗しても他の Bot は動かし続ける
+        name = bot.host.profile.name
+        try:
+            async with bot:
+                await bot.start(bot.host.profile.token)
+        except discord.LoginFailure as e:
+            log.error("ログイン失敗", extra={"profile": name, "error": str(e)})
+        except Exception:
+            log.exception("Bot が停止しました", extra={"profile": name})
+
+    # ---------- メトリクス（シャードは "プロファイル/番号" で区別） ----------
+    def collect_metrics(self):
+        GATEWAY_LATENCY.clear()
+        for bot in self.bots:
+            for shard_id, latency in bot.shard_latencies():
+                GATEWAY_LATENCY.set(latency, shard=f"{bot.host.profile.name}/{shard_id}")
+        OUTBOUND_QUEUE_DEPTH.set(sum(bot.queue_depth() for bot in self.bots))
+
+    async def metrics(self, request: web.Request):
+        return web.Response(
+            text=render(REGISTRY.collect()), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+
+def run_host(names: list[str] = BOT_PROFILES):
+    if CLUSTER_COUNT > 1:
+        raise RuntimeError("BOT_PROFILES と CLUSTER_COUNT は同時に使えません")
+    profiles = load_profiles(names)
+    try:
+        asyncio.run(_run_host(profiles))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_host(profiles: list[Profile]):
+    # 接続プールはループ上で作る必要がある
+    await Host(profiles).run()
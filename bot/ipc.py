@@ -0,0 +1,233 @@
+import os
+import json
+import asyncio
+import itertools
+import logging
+
+log = logging.getLogger(__name__)
+
+MAX_LINE = 1 << 20       # 1メッセージ（1行）の上限
+RECONNECT_DELAY = 2.0
+HUB = "hub"              # 宛先: ハブ自身
+BROADCAST = "*"          # 宛先: 送信元以外の全クラスタ
+
+
+class IPCError(Exception):
+    pass
+
+
+def _encode(msg: dict) -> bytes:
+    return json.dumps(msg, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+# --------------------------
+# ハブ（ランチャー側）: Unix ソケットで各クラスタのメッセージを中継
+# --------------------------
+class IPCHub:
+    def __init__(self, path: str):
+        self.path = path
+        self.clients: dict[int, asyncio.StreamWriter] = {}
+        self.stats: dict[int, dict] = {}  # cluster_id -> 最新の負荷統計
+        self.server: asyncio.AbstractServer | None = None
+
+    async def start(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # 前回の残骸
+        self.server = await asyncio.start_unix_server(self._handle, self.path, limit=MAX_LINE)
+        log.info("IPC ハブ起動", extra={"path": self.path})
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for writer in self.clients.values():
+            writer.close()
+        self.clients.clear()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        cluster_id = None
+        try:
+            while line := await reader.readline():
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if msg.get("op") == "hello":
+                    cluster_id = msg["from"]
+                    self.clients[cluster_id] = writer
+                    log.info("クラスタ接続", extra={"cluster": cluster_id})
+                    # 登録が済んでから送信を始めてもらう
+                    await self._write(writer, {"op": "welcome", "from": HUB, "to": cluster_id})
+                    continue
+                await self.route(msg)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            if cluster_id is not None and self.clients.get(cluster_id) is writer:
+                del self.clients[cluster_id]
+                log.warning("クラスタ切断", extra={"cluster": cluster_id})
+            writer.close()
+
+    async def route(self, msg: dict):
+        to = msg.get("to")
+        if to == HUB:
+            await self._handle_hub(msg)
+        elif to == BROADCAST:
+            for cluster_id, writer in list(self.clients.items()):
+                if cluster_id != msg.get("from"):
+                    await self._write(writer, msg)
+        else:
+            writer = self.clients.get(to)
+            if writer is not None:
+                await self._write(writer, msg)
+            elif msg.get("id") is not None:
+                await self._reply(msg, error=f"クラスタ {to} に接続できません")
+
+    async def _handle_hub(self, msg: dict):
+        op = msg.get("op")
+        if op == "stats":
+            self.stats[msg["from"]] = msg["data"]
+        elif op == "cluster_stats":
+            await self._reply(msg, data={str(k): v for k, v in sorted(self.stats.items())})
+
+    async def _reply(self, msg: dict, data=None, error: str | None = None):
+        writer = self.clients.get(msg.get("from"))
+        if writer is not None:
+            await self._write(writer, {
+                "op": "reply", "from": HUB, "to": msg["from"],
+                "reply_to": msg["id"], "data": data, "error": error,
+            })
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, msg: dict):
+        try:
+            writer.write(_encode(msg))
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+# --------------------------
+# クライアント（各クラスタ側）
+# --------------------------
+class IPCClient:
+    def __init__(self, path: str, cluster_id: int):
+        self.path = path
+        self.cluster_id = cluster_id
+        self.handlers: dict[str, object] = {}
+        self.pending: dict[int, asyncio.Future] = {}
+        self.ids = itertools.count(1)
+        self.writer: asyncio.StreamWriter | None = None
+        self.connected = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    # ---------- 接続 ----------
+    async def connect(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        await self.connected.wait()
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+    async def _run(self):
+        while True:
+            try:
+                reader, self.writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE)
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+
+            await self._write({"op": "hello", "from": self.cluster_id})
+            try:
+                while line := await reader.readline():
+                    try:
+                        msg = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._receive(msg)
+            except (ConnectionError, ValueError):
+                pass
+
+            # ハブが落ちたら待機中の要求を失敗させて再接続
+            self.connected.clear()
+            self.writer = None
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(IPCError("IPC ハブとの接続が切れました"))
+            self.pending.clear()
+            log.warning("ハブから切断されました、再接続します")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    # ---------- 送信 ----------
+    def on(self, op: str, handler):
+        # handler(data) -> 応答データ（request の場合）
+        self.handlers[op] = handler
+
+    async def send(self, to, op: str, data=None):
+        await self._write({"op": op, "from": self.cluster_id, "to": to, "data": data})
+
+    async def request(self, to, op: str, data=None, timeout: float = 10.0):
+        msg_id = next(self.ids)
+        future = self.pending[msg_id] = asyncio.get_running_loop().create_future()
+        try:
+            await self._write({"op": op, "from": self.cluster_id, "to": to, "id": msg_id, "data": data})
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(msg_id, None)
+
+    async def _write(self, msg: dict):
+        if self.writer is None:
+            raise IPCError("IPC ハブに接続していません")
+        self.writer.write(_encode(msg))
+        await self.writer.drain()
+
+    # ---------- 受信 ----------
+    def _receive(self, msg: dict):
+        if msg.get("op") == "welcome":
+            self.connected.set()
+            return
+        if msg.get("op") == "reply":
+            future = self.pending.get(msg.get("reply_to"))
+            if future and not future.done():
+                if msg.get("error"):
+                    future.set_exception(IPCError(msg["error"]))
+                else:
+                    future.set_result(msg.get("data"))
+            return
+
+        handler = self.handlers.get(msg.get("op"))
+        if handler is None:
+            if msg.get("id") is not None:
+                asyncio.create_task(self._respond(msg, error=f"未対応の操作: {msg.get('op')}"))
+            return
+        asyncio.create_task(self._dispatch(handler, msg))
+
+    async def _dispatch(self, handler, msg: dict):
+        try:
+            result = await handler(msg.get("data"))
+        except Exception as e:
+            log.exception("IPC メッセージの処理に失敗", extra={"op": msg.get("op")})
+            if msg.get("id") is not None:
+                await self._respond(msg, error=str(e))
+            return
+        if msg.get("id") is not None:
+            await self._respond(msg, data=result)
+
+    async def _respond(self, msg: dict, data=None, error: str | None = None):
+        try:
+            await self._write({
+                "op": "reply", "from": self.cluster_id, "to": msg["from"],
+                "reply_to": msg["id"], "data": data, "error": error,
+            })
+        except (IPCError, ConnectionError):
+            pass
@@ -0,0 +1,143 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+import discord
+
+from bot.config import MEMBER_CACHE_SIZE, MEMBER_CACHE_TTL, MEMBER_FETCH_WINDOW
+
+log = logging.getLogger(__name__)
+
+QUERY_LIMIT = 100  # query_members(user_ids=...) の1回あたりの上限
+
+
+# --------------------------
+# メンバー参照（キャッシュ優先 + まとめて取得）
+# --------------------------
+class MemberLookup:
+    def __init__(self, size: int = MEMBER_CACHE_SIZE, ttl: float = MEMBER_CACHE_TTL,
+                 window: float = MEMBER_FETCH_WINDOW):
+        self.size = size
+        self.ttl = ttl          # ロール変更を取りこぼさないよう、古いものは取り直す
+        self.window = window    # 同じギルドへの取得要求をまとめる待ち時間(秒)
+        self.cache: OrderedDict[tuple[int, int], tuple[discord.Member, float]] = OrderedDict()
+        self.pending: dict[int, dict[int, asyncio.Future]] = {}
+        self.flushers: dict[int, asyncio.Task] = {}
+
+        # 統計
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    # ---------- キャッシュ ----------
+    def remember(self, member: discord.Member) -> discord.Member:
+        # インタラクションなどで受け取った最新のメンバーを入れておく
+        if not isinstance(member, discord.Member):
+            return member
+        key = (member.guild.id, member.id)
+        self.cache[key] = (member, time.monotonic() + self.ttl)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+        return member
+
+    def forget(self, guild_id: int, user_id: int):
+        self.cache.pop((guild_id, user_id), None)
+
+    def cached(self, guild: discord.Guild, user_id: int) -> discord.Member | None:
+        # Gateway のキャッシュにあればそれが一番新しい
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        key = (guild.id, user_id)
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        member, expires = entry
+        if expires < time.monotonic():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return member
+
+    # ---------- 取得 ----------
+    async def get(self, guild: discord.Guild, user_id: int) -> discord.Member | None:
+        member = self.cached(guild, user_id)
+        if member is not None:
+            self.hits += 1
+            return member
+        self.misses += 1
+
+        pending = self.pending.setdefault(guild.id, {})
+        future = pending.get(user_id)
+        if future is None:
+            future = pending[user_id] = asyncio.get_running_loop().create_future()
+            if len(pending) >= QUERY_LIMIT:
+                self._start_flush(guild, delay=0)
+            elif guild.id not in self.flushers:
+                self._start_flush(guild, delay=self.window)
+        # 取得に失敗しても、同じ future を待っている他の呼び出しは巻き込まない
+        return await asyncio.shield(future)
+
+    def _start_flush(self, guild: discord.Guild, delay: float):
+        task = self.flushers.get(guild.id)
+        if task is not None and delay > 0:
+            return
+        self.flushers[guild.id] = asyncio.create_task(self._flush(guild, delay))
+
+    async def _flush(self, guild: discord.Guild, delay: float):
+        if delay:
+            await asyncio.sleep(delay)
+        # 待っている間に上限に達して別のタスクが取得済みなら、その後に溜まった分だけを扱う
+        if self.flushers.get(guild.id) is asyncio.current_task():
+            del self.flushers[guild.id]
+        pending = self.pending.pop(guild.id, {})
+        ids = list(pending)
+        for i in range(0, len(ids), QUERY_LIMIT):
+            chunk = {user_id: pending[user_id] for user_id in ids[i:i + QUERY_LIMIT]}
+            try:
+                found = await self._fetch(guild, list(chunk))
+            except Exception as e:
+                log.warning("メンバー取得失敗", extra={"guild_id": guild.id, "count": len(chunk), "error": str(e)})
+                found = {}
+            for user_id, future in chunk.items():
+                if not future.done():
+                    member = found.get(user_id)
+                    future.set_result(self.remember(member) if member else None)
+
+    async def _fetch(self, guild: discord.Guild, user_ids: list[int]) -> dict[int, discord.Member]:
+        self.fetches += 1
+        if len(user_ids) > 1:
+            try:
+                # Gateway 経由で最大100人を1回で取得（キャッシュには入れない）
+                members = await guild.query_members(user_ids=user_ids, limit=len(user_ids), cache=False)
+                return {m.id: m for m in members}
+            except (asyncio.TimeoutError, discord.ClientException, RuntimeError) as e:
+                log.debug("query_members 失敗、REST で取得", extra={"guild_id": guild.id, "error": str(e)})
+
+        async def fetch(user_id):
+            try:
+                return await guild.fetch_member(user_id)
+            except discord.NotFound:
+                return None
+
+        members = await asyncio.gather(*(fetch(u) for u in user_ids))
+        return {m.id: m for m in members if m is not None}
+
+    # ---------- 統計 ----------
+    def stats(self) -> dict:
+        return {
+            "cached": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+            "pending": sum(len(p) for p in self.pending.values()),
+        }
+
+
+def get_members(bot) -> MemberLookup:
+    lookup = getattr(bot, "member_lookup", None)
+    if lookup is None:
+        lookup = bot.member_lookup = MemberLookup()
+    return lookup
@@ -0,0 +1,279 @@
+import re
+import time
+import math
+from types import SimpleNamespace
+
+import aiohttp
+
+# 秒単位の既定バケット（Discord API・ディスク書き込み・ハンドラ処理を想定）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# --------------------------
+# メトリクス（Prometheus テキスト形式で出力）
+# --------------------------
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield "_total", dict(zip(self.labelnames, key)), value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def clear(self):
+        self.values.clear()
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield "", dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self.values.get(key)
+        if state is None:
+            # [各バケットの件数..., +Inf の件数, 合計]
+            state = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        else:
+            state[len(self.buckets)] += 1
+        state[-1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        for key, state in self.values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            cumulative += state[len(self.buckets)]
+            yield "_bucket", {**labels, "le": "+Inf"}, cumulative
+            yield "_sum", labels, state[-1]
+            yield "_count", labels, cumulative
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+        self.collectors = []  # 出力直前に呼ぶ関数（ゲージの更新など）
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels=()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collector):
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        if collector in self.collectors:
+            self.collectors.remove(collector)
+
+    def collect(self) -> list[dict]:
+        for collector in list(self.collectors):
+            try:
+                collector()
+            except Exception:
+                pass
+        return [
+            {
+                "name": m.name,
+                "type": m.kind,
+                "help": m.help,
+                "samples": [[suffix, labels, value] for suffix, labels, value in m.samples()],
+            }
+            for m in self.metrics.values()
+        ]
+
+    def render(self) -> str:
+        return render(self.collect())
+
+
+def merge(families_by_source: dict[str, list[dict]], label: str) -> list[dict]:
+    # 複数プロセス分をラベルで区別して1つにまとめる（クラスタモード）
+    merged: dict[str, dict] = {}
+    for source, families in families_by_source.items():
+        for family in families:
+            target = merged.setdefault(family["name"], {**family, "samples": []})
+            for suffix, labels, value in family["samples"]:
+                target["samples"].append([suffix, {label: source, **labels}, value])
+    return list(merged.values())
+
+
+def render(families: list[dict]) -> str:
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family['name']} {family['help']}")
+        lines.append(f"# TYPE {family['name']} {family['type']}")
+        for suffix, labels, value in family["samples"]:
+            lines.append(f"{family['name']}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+REGISTRY = Registry()
+
+# ---------- 計測項目 ----------
+LISTENER_SECONDS = REGISTRY.histogram(
+    "hunya_listener_seconds", "イベントリスナーの処理時間", ("event", "listener")
+)
+COMMAND_SECONDS = REGISTRY.histogram(
+    "hunya_command_seconds", "アプリケーションコマンドの処理時間", ("command", "status")
+)
+PIPELINE_SECONDS = REGISTRY.histogram(
+    "hunya_pipeline_stage_seconds", "メッセージパイプラインのステージ処理時間", ("stage",)
+)
+REST_REQUESTS = REGISTRY.counter(
+    "hunya_rest_requests", "REST リクエスト数", ("method", "route", "status")
+)
+REST_SECONDS = REGISTRY.histogram(
+    "hunya_rest_request_seconds", "REST リクエストの応答時間", ("method", "route")
+)
+REST_RATE_LIMITED = REGISTRY.counter(
+    "hunya_rest_rate_limited", "429 応答の数", ("method", "route", "scope")
+)
+RELAY_SECONDS = REGISTRY.histogram(
+    "hunya_relay_fanout_seconds", "グローバルチャット1件の全宛先への中継時間", ("scope",)
+)
+RELAY_TARGETS = REGISTRY.counter(
+    "hunya_relay_deliveries", "中継の宛先ごとの結果", ("result",)
+)
+RELAY_THROTTLED = REGISTRY.counter(
+    "hunya_relay_throttled", "流量制限で待たせた・捨てた中継元メッセージ数", ("scope", "action")
+)
+RELAY_UPDATES = REGISTRY.counter(
+    "hunya_relay_updates", "中継済みコピーの編集・削除の結果", ("action", "result")
+)
+AUDIT_EVENTS = REGISTRY.counter("hunya_audit_events", "記録した監査イベント数", ("action",))
+STORAGE_WRITE_SECONDS = REGISTRY.histogram(
+    "hunya_storage_write_seconds", "ストレージの1バッチ書き込み時間", ("result",)
+)
+STORAGE_WRITE_ROWS = REGISTRY.counter("hunya_storage_write_rows", "書き込んだ行数")
+GATEWAY_LATENCY = REGISTRY.gauge(
+    "hunya_gateway_latency_seconds", "ゲートウェイの HEARTBEAT 応答時間", ("shard",)
+)
+OUTBOUND_QUEUE_DEPTH = REGISTRY.gauge("hunya_outbound_queue_depth", "送信待ちのメッセージ数")
+
+
+# --------------------------
+# REST 呼び出しの計測（aiohttp TraceConfig）
+# --------------------------
+API_PREFIX = re.compile(r"^/api(/v\d+)?")
+SNOWFLAKE = re.compile(r"/\d{15,}")
+TOKEN_PATH = re.compile(r"/(webhooks|interactions)/\{id\}/[^/?]+")
+REACTION_PATH = re.compile(r"/reactions/[^/]+")
+
+
+def route_of(url) -> str:
+    # ID やトークンを伏せてルート単位に集計する（ラベルの種類を増やしすぎない）
+    path = API_PREFIX.sub("", url.path)
+    path = SNOWFLAKE.sub("/{id}", path)
+    path = TOKEN_PATH.sub(r"/\1/{id}/{token}", path)
+    path = REACTION_PATH.sub("/reactions/{emoji}", path)
+    return f"{url.host}{path}"
+
+
+def rest_trace() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx: SimpleNamespace())
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        route = route_of(params.url)
+        status = params.response.status
+        REST_REQUESTS.inc(method=params.method, route=route, status=status)
+        REST_SECONDS.observe(time.perf_counter() - ctx.start, method=params.method, route=route)
+        if status == 429:
+            scope = params.response.headers.get("X-RateLimit-Scope", "unknown")
+            REST_RATE_LIMITED.inc(method=params.method, route=route, scope=scope)
+
+    async def on_request_exception(session, ctx, params):
+        REST_REQUESTS.inc(method=params.method, route=route_of(params.url), status="error")
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
@@ -0,0 +1,208 @@
+import time
+import asyncio
+from collections import deque
+
+import aiohttp
+from aiohttp import web
+
+from bot.config import OAUTH_TOKEN_URL, OAUTH_WORKERS, OAUTH_QUEUE_SIZE, OAUTH_MAX_RETRIES
+from bot.metrics import rest_trace
+
+MAX_RETRY_WAIT = 30.0  # Retry-After がこれより長い場合は打ち切る
+
+
+class TokenExchangeError(Exception):
+    pass
+
+
+class ExchangeQueueFull(TokenExchangeError):
+    pass
+
+
+# --------------------------
+# OAuth トークン交換ワーカープール
+# --------------------------
+class TokenExchanger:
+    def __init__(
+        self,
+        token_url: str = OAUTH_TOKEN_URL,
+        workers: int = OAUTH_WORKERS,
+        queue_size: int = OAUTH_QUEUE_SIZE,
+        max_retries: int = OAUTH_MAX_RETRIES,
+        connector: aiohttp.BaseConnector | None = None,
+    ):
+        self.token_url = token_url
+        self.workers = workers
+        self.max_retries = max_retries
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.inflight: dict[str, asyncio.Future] = {}
+        self.session: aiohttp.ClientSession | None = None
+        self.connector = connector  # ホストモードでは全 Bot 共通の接続プールを使う
+        self.tasks: list[asyncio.Task] = []
+        self.paused_until = 0.0  # 429 を受けたら全ワーカーで待つ
+
+        # 統計
+        self.latencies = deque(maxlen=512)
+        self.completed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.rate_limited = 0
+
+    # ---------- 起動/停止 ----------
+    async def start(self):
+        if self.session:
+            return
+        # 長寿命のセッションで接続を使い回す（毎回の TCP+TLS を避ける）
+        self.session = aiohttp.ClientSession(
+            connector=self.connector or aiohttp.TCPConnector(limit=self.workers, keepalive_timeout=60),
+            connector_owner=self.connector is None,
+            timeout=aiohttp.ClientTimeout(total=15),
+            trace_configs=[rest_trace()],
+        )
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for fut in self.inflight.values():
+            if not fut.done():
+                fut.set_exception(TokenExchangeError("shutdown"))
+        self.inflight.clear()
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    # ---------- 交換 ----------
+    async def exchange(self, state: str, data: dict) -> dict:
+        # 同じ state の交換が進行中なら重複コードは捨てて結果を共有
+        fut = self.inflight.get(state)
+        if fut is not None:
+            self.duplicates += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((state, data, fut, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ExchangeQueueFull("token exchange queue is full")
+        self.inflight[state] = fut
+        return await asyncio.shield(fut)
+
+    async def _worker(self):
+        while True:
+            state, data, fut, queued_at = await self.queue.get()
+            try:
+                result = await self._post(data)
+            except Exception as e:
+                self.failed += 1
+                if not fut.done():
+                    fut.set_exception(e)
+            else:
+                self.completed += 1
+                if not fut.done():
+                    fut.set_result(result)
+            finally:
+                self.latencies.append(time.monotonic() - queued_at)
+                self.inflight.pop(state, None)
+                self.queue.task_done()
+
+    async def _post(self, data: dict) -> dict:
+        for attempt in range(self.max_retries + 1):
+            wait = self.paused_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            async with self.session.post(self.token_url, data=data) as resp:
+                if resp.status != 429 and resp.status < 500:
+                    return await resp.json(content_type=None)
+
+                if resp.status == 429:
+                    self.rate_limited += 1
+                retry_after = await self._retry_after(resp)
+
+            if attempt == self.max_retries or retry_after > MAX_RETRY_WAIT:
+                raise TokenExchangeError(f"token endpoint returned {resp.status}")
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+        raise TokenExchangeError("unreachable")
+
+    @staticmethod
+    async def _retry_after(resp: aiohttp.ClientResponse) -> float:
+        header = resp.headers.get("Retry-After")
+        if header:
+            try:
+                return float(header)
+            except ValueError:
+                pass
+        try:
+            body = await resp.json(content_type=None)
+            return float(body.get("retry_after", 1.0))
+        except Exception:
+            return 1.0
+
+    # ---------- 統計 ----------
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def pct(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        return {
+            "queue_depth": self.queue.qsize(),
+            "inflight": len(self.inflight),
+            "workers": self.workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "rate_limited": self.rate_limited,
+            "latency_p50_ms": pct(0.50),
+            "latency_p99_ms": pct(0.99),
+        }
+
+
+# --------------------------
+# OAuth callback の振り分け（ホストモードでは state の client_id で Bot を選ぶ）
+# --------------------------
+class CallbackRouter:
+    def __init__(self):
+        self.handlers: dict[str, object] = {}
+
+    def add(self, client_id: str | None, handler):
+        self.handlers[str(client_id)] = handler
+
+    def remove(self, client_id: str | None) -> bool:
+        # 残りが無くなったら True（ルートを外してよい）
+        self.handlers.pop(str(client_id), None)
+        return not self.handlers
+
+    def resolve(self, state: str | None):
+        # state は "user_id:guild_id:client_id"。client_id の無い古い形式は Bot が1つの時だけ受け付ける
+        parts = (state or "").split(":")
+        if len(parts) == 3:
+            return self.handlers.get(parts[2])
+        if len(self.handlers) == 1:
+            return next(iter(self.handlers.values()))
+        return None
+
+    async def dispatch(self, request: web.Request):
+        handler = self.resolve(request.query.get("state"))
+        if handler is None:
+            return web.Response(text="❌ state 不正", status=400)
+        return await handler(request)
+
+
+_router: CallbackRouter | None = None
+
+
+def get_callback_router() -> CallbackRouter:
+    global _router
+    if _router is None:
+        _router = CallbackRouter()
+    return _router
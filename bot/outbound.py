@@ -0,0 +1,162 @@
+import asyncio
+from collections import deque
+
+import discord
+
+from bot.config import OUTBOUND_CONCURRENCY
+from bot.ratelimit import TokenBucket
+
+MESSAGE_LIMIT = 2000
+CHANNEL_RATE = (5, 5.0)   # Discord のチャンネルごとのメッセージ送信上限（5件/5秒）
+GLOBAL_RATE = (50, 1.0)   # Bot 全体の上限（50リクエスト/秒）
+MAX_BUCKETS = 1000        # これを超えたら使われていないバケットを捨てる
+
+
+class Outgoing:
+    __slots__ = ("destination", "content", "kwargs", "line", "sender", "future")
+
+    def __init__(self, destination, content, kwargs, line, sender, future):
+        self.destination = destination
+        self.content = content
+        self.kwargs = kwargs
+        self.line = line        # まとめ送信できる中継行（None なら単独送信）
+        self.sender = sender    # 単独送信時のコルーチン関数（Webhook など）
+        self.future = future
+
+
+class Coalesced:
+    __slots__ = ("message", "lines", "position")
+
+    def __init__(self, message, lines: list[str], position: int):
+        self.message = message    # 複数の中継行をまとめて送った1通
+        self.lines = lines        # まとめた行（送信順）
+        self.position = position  # そのうち何行目か
+
+
+# --------------------------
+# 送信スケジューラ（チャンネルごとのキュー + レート制限 + まとめ送信）
+# --------------------------
+class OutboundScheduler:
+    def __init__(self, concurrency: int = OUTBOUND_CONCURRENCY):
+        self.queues: dict[int, deque[Outgoing]] = {}
+        self.workers: dict[int, asyncio.Task] = {}
+        self.buckets: dict[int, TokenBucket] = {}
+        self.global_bucket = TokenBucket(GLOBAL_RATE[0] / GLOBAL_RATE[1], GLOBAL_RATE[0])
+        self.sem = asyncio.Semaphore(concurrency)
+
+        # 統計
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.wait_seconds = 0.0
+
+    # ---------- 投入 ----------
+    def send(self, destination, content=None, *, line=None, sender=None, **kwargs) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        item = Outgoing(destination, content, kwargs, line, sender, future)
+        self.queues.setdefault(destination.id, deque()).append(item)
+        if destination.id not in self.workers:
+            self.workers[destination.id] = asyncio.create_task(self._worker(destination.id))
+        return future
+
+    # ---------- チャンネルごとのワーカー ----------
+    async def _worker(self, key: int):
+        queue = self.queues[key]
+        try:
+            while queue:
+                batch = self._take(queue)
+                if not batch:
+                    continue
+                await self._wait_for_bucket(key)
+                try:
+                    async with self.sem:
+                        result = await self._deliver(batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    if isinstance(e, discord.HTTPException) and e.status == 429:
+                        self.rate_limited += 1
+                    for item in batch:
+                        if not item.future.done():
+                            item.future.set_exception(e)
+                else:
+                    self.sent += 1
+                    lines = [item.line for item in batch] if len(batch) > 1 else None
+                    for position, item in enumerate(batch):
+                        if not item.future.done():
+                            item.future.set_result(Coalesced(result, lines, position) if lines else result)
+        finally:
+            self.workers.pop(key, None)
+            if not queue:
+                self.queues.pop(key, None)
+
+    def _take(self, queue: deque) -> list[Outgoing]:
+        first = queue.popleft()
+        if first.future.cancelled():
+            return []  # 送信前に諦められたもの（タイムアウトなど）は捨てる
+        batch = [first]
+        if first.line is None:
+            return batch
+
+        # 溜まっている中継行は 2000 文字まで1通にまとめる
+        length = len(first.line)
+        while queue and queue[0].line is not None and length + 1 + len(queue[0].line) <= MESSAGE_LIMIT:
+            item = queue.popleft()
+            if item.future.cancelled():
+                continue
+            length += 1 + len(item.line)
+            batch.append(item)
+        return batch
+
+    async def _deliver(self, batch: list[Outgoing]):
+        first = batch[0]
+        if len(batch) > 1:
+            self.coalesced += len(batch) - 1
+            return await first.destination.send(
+                "\n".join(item.line for item in batch),
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+        if first.sender is not None:
+            return await first.sender()
+        if first.line is not None and first.content is None:
+            return await first.destination.send(
+                first.line, allowed_mentions=discord.AllowedMentions.none(), **first.kwargs
+            )
+        return await first.destination.send(first.content, **first.kwargs)
+
+    async def _wait_for_bucket(self, key: int):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) > MAX_BUCKETS:
+                self._prune()
+            bucket = self.buckets[key] = TokenBucket(CHANNEL_RATE[0] / CHANNEL_RATE[1], CHANNEL_RATE[0])
+
+        wait = max(bucket.reserve(), self.global_bucket.reserve())
+        if wait > 0:
+            self.wait_seconds += wait
+            await asyncio.sleep(wait)
+
+    def _prune(self):
+        for key in [k for k, b in self.buckets.items() if k not in self.workers and b.is_idle()]:
+            del self.buckets[key]
+
+    # ---------- 統計 ----------
+    def stats(self) -> dict:
+        depths = [len(q) for q in self.queues.values()]
+        return {
+            "queue_depth": sum(depths),
+            "max_channel_depth": max(depths, default=0),
+            "active_channels": len(self.workers),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "rate_limit_wait_s": self.wait_seconds,
+        }
+
+
+def get_outbound(bot) -> OutboundScheduler:
+    outbound = getattr(bot, "outbound", None)
+    if outbound is None:
+        outbound = bot.outbound = OutboundScheduler()
+    return outbound
@@ -0,0 +1,102 @@
+import time
+import unicodedata
+import logging
+
+import discord
+
+from bot.metrics import PIPELINE_SECONDS
+
+log = logging.getLogger(__name__)
+
+# ステージの順番（小さいほど先に実行）
+MODERATION = 100
+RELAY = 500
+
+
+# --------------------------
+# 1メッセージ分の共有コンテキスト
+# --------------------------
+class MessageContext:
+    __slots__ = ("message", "guild", "author", "channel", "_normalized", "stopped")
+
+    def __init__(self, message: discord.Message):
+        self.message = message
+        self.guild = message.guild
+        self.author = message.author
+        self.channel = message.channel
+        self._normalized = None
+        self.stopped = False
+
+    @property
+    def content(self) -> str:
+        return self.message.content
+
+    @property
+    def normalized(self) -> str:
+        # 全角/半角・大文字小文字の揺れを吸収した本文（必要になった時に1回だけ作る）
+        if self._normalized is None:
+            self._normalized = unicodedata.normalize("NFKC", self.message.content).casefold()
+        return self._normalized
+
+    def stop(self):
+        # 以降のステージを実行しない
+        self.stopped = True
+
+
+# --------------------------
+# 順序付きメッセージ処理パイプライン
+# --------------------------
+class MessagePipeline:
+    def __init__(self, bot):
+        self.bot = bot
+        self.stages: list[tuple[int, str, object]] = []
+        self.timings: dict[str, list[float]] = {}  # name -> [回数, 合計秒, 最大秒]
+        bot.add_listener(self.dispatch, "on_message")
+
+    def register(self, name: str, order: int, handler):
+        self.unregister(name)
+        self.stages.append((order, name, handler))
+        self.stages.sort(key=lambda stage: stage[0])
+        self.timings.setdefault(name, [0, 0.0, 0.0])
+
+    def unregister(self, name: str):
+        self.stages = [stage for stage in self.stages if stage[1] != name]
+
+    async def dispatch(self, message: discord.Message):
+        # 共通の前処理（Bot・DM は全ステージ対象外）
+        if message.author.bot or not message.guild or not self.stages:
+            return
+
+        ctx = MessageContext(message)
+        for _, name, handler in self.stages:
+            start = time.perf_counter()
+            try:
+                await handler(ctx)
+            except Exception:
+                log.exception("ステージでエラー", extra={"stage": name, "guild_id": ctx.guild.id})
+            finally:
+                elapsed = time.perf_counter() - start
+                timing = self.timings[name]
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] = max(timing[2], elapsed)
+                PIPELINE_SECONDS.observe(elapsed, stage=name)
+            if ctx.stopped:
+                break
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "count": count,
+                "avg_ms": total / count * 1000 if count else 0.0,
+                "max_ms": peak * 1000,
+            }
+            for name, (count, total, peak) in self.timings.items()
+        }
+
+
+def get_pipeline(bot) -> MessagePipeline:
+    pipeline = getattr(bot, "pipeline", None)
+    if pipeline is None:
+        pipeline = bot.pipeline = MessagePipeline(bot)
+    return pipeline
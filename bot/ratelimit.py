@@ -0,0 +1,40 @@
+import time
+
+
+# --------------------------
+# トークンバケット
+# --------------------------
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate            # 1秒あたりの補充量
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, n: float = 1) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def reserve(self, n: float = 1) -> float:
+        # 予約して、使えるようになるまでの待ち時間(秒)を返す
+        self._refill(time.monotonic())
+        self.tokens -= n
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+    def delay(self, n: float = 1) -> float:
+        # 消費せずに、n 使えるようになるまでの待ち時間(秒)を返す
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
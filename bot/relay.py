@@ -0,0 +1,464 @@
+import json
+import time
+import zlib
+import asyncio
+import logging
+from functools import partial
+
+import discord
+
+from bot.config import RELAY_TIMEOUT, RELAY_INDEX_SIZE, RELAY_INDEX_TTL
+from bot.metrics import RELAY_SECONDS, RELAY_TARGETS, RELAY_UPDATES
+from bot.outbound import MESSAGE_LIMIT, Coalesced, get_outbound
+from bot.storage import ExpiringTable
+
+log = logging.getLogger(__name__)
+
+WEBHOOK_NAME = "hunyaBOT Global Chat"
+MAX_EMBEDS = 10  # 1メッセージに付けられる埋め込みの上限
+
+
+# --------------------------
+# チャンネルごとの Webhook プール
+# --------------------------
+class WebhookPool:
+    def __init__(self, bot):
+        self.bot = bot
+        self.hooks: dict[int, discord.Webhook] = {}
+        self.locks: dict[int, asyncio.Lock] = {}
+        self.disabled: set[int] = set()  # Webhook 権限が無いチャンネル
+
+    async def get(self, channel) -> discord.Webhook | None:
+        hook = self.hooks.get(channel.id)
+        if hook or channel.id in self.disabled:
+            return hook
+
+        # 同じチャンネルで同時に作成しないようにロック
+        lock = self.locks.setdefault(channel.id, asyncio.Lock())
+        async with lock:
+            hook = self.hooks.get(channel.id)
+            if hook or channel.id in self.disabled:
+                return hook
+
+            try:
+                for wh in await channel.webhooks():
+                    if wh.name == WEBHOOK_NAME and wh.token:
+                        hook = wh
+                        break
+                if not hook:
+                    hook = await channel.create_webhook(name=WEBHOOK_NAME)
+            except (discord.Forbidden, discord.HTTPException) as e:
+                log.warning("Webhook 取得失敗", extra={"channel_id": channel.id, "error": str(e)})
+                self.disabled.add(channel.id)
+                return None
+
+            self.hooks[channel.id] = hook
+            return hook
+
+    def invalidate(self, channel_id: int):
+        self.hooks.pop(channel_id, None)
+        self.disabled.discard(channel_id)
+
+
+# --------------------------
+# 並列中継エンジン
+# --------------------------
+class RelayFanout:
+    def __init__(self, bot, index: "RelayIndex | None" = None, timeout: float = RELAY_TIMEOUT):
+        self.bot = bot
+        self.webhooks = WebhookPool(bot)
+        self.outbound = get_outbound(bot)
+        self.index = index  # まとめ送信した1通の行を覚えておく先（None なら編集・削除の対象外）
+        self.timeout = timeout
+
+    @staticmethod
+    def payload(message: discord.Message) -> dict:
+        # 中継に必要な情報だけを抜き出す（他プロセスへもこの形で渡す）
+        name = f"{message.author.display_name}@{message.guild.name}"
+        # Webhook は名前を username で送るので本文を全部使える。Bot の送信は名前の行の分だけ削る
+        content = relay_content(message, MESSAGE_LIMIT)
+        body = content
+        if len(name) + 5 + len(content) > MESSAGE_LIMIT:
+            body = relay_content(message, MESSAGE_LIMIT - len(name) - 5)
+        return {
+            "source": message.id,
+            "content": content,
+            "username": name[:80],
+            "avatar_url": message.author.display_avatar.url,
+            # リンクのプレビューは URL から自動で付くので、それ以外の埋め込みだけ
+            "embeds": [e.to_dict() for e in message.embeds if e.type == "rich"][:MAX_EMBEDS],
+            "line": f"**{name}**\n{body}",
+        }
+
+    async def relay(self, message: discord.Message, channels):
+        return await self.deliver(self.payload(message), channels)
+
+    async def deliver(self, payload: dict, channels, scope: str = "local") -> list[tuple[int, int, int, int]]:
+        # 全ターゲットへ同時に送信（1チャンネルの失敗・遅延は他に影響しない）
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._deliver(payload, ch) for ch in channels),
+            return_exceptions=True,
+        )
+        RELAY_SECONDS.observe(time.perf_counter() - start, scope=scope)
+        # 編集・削除を反映できるコピー（チャンネル, メッセージ, Webhook, まとめ送信の何行目か）
+        return [r for r in results if isinstance(r, tuple)]
+
+    async def _deliver(self, payload: dict, channel):
+        result = "ok"
+        copy = None
+        try:
+            copy = await asyncio.wait_for(self._send(payload, channel), self.timeout)
+        except asyncio.TimeoutError:
+            result = "timeout"
+            log.warning("送信タイムアウト", extra={"channel_id": channel.id})
+        except discord.NotFound:
+            # Webhook が削除された場合は次回作り直す
+            result = "not_found"
+            self.webhooks.invalidate(channel.id)
+        except Exception as e:
+            result = "error"
+            log.warning("送信失敗", extra={"channel_id": channel.id, "error": str(e)})
+        RELAY_TARGETS.inc(result=result)
+        return copy
+
+    async def _send(self, payload: dict, channel):
+        # 送信はチャンネルごとのキューに積む（混雑時は複数行を1通にまとめる）
+        embeds = [discord.Embed.from_dict(e) for e in payload.get("embeds", ())]
+        line = None if embeds else payload["line"]  # 埋め込み付きはまとめずに単独で送る
+        hook = await self.webhooks.get(channel)
+        if hook:
+            sender = partial(
+                hook.send,
+                payload["content"],
+                username=payload["username"],
+                avatar_url=payload["avatar_url"],
+                embeds=embeds,
+                allowed_mentions=discord.AllowedMentions.none(),
+                wait=True,  # 後から編集・削除するためにメッセージ ID を受け取る
+            )
+            sent = await self.outbound.send(channel, line=line, sender=sender)
+        elif line:
+            sent = await self.outbound.send(channel, line=line)
+        else:
+            sent = await self.outbound.send(
+                channel, payload["line"], embeds=embeds, allowed_mentions=discord.AllowedMentions.none()
+            )
+        if isinstance(sent, Coalesced):
+            # 他の発言とまとめた1通は、行単位で書き換えられるように行の一覧を残す
+            if self.index is None:
+                return None
+            self.index.combine(sent.message.id, sent.lines)
+            return channel.id, sent.message.id, 0, sent.position
+        if sent is None:
+            return None
+        return channel.id, sent.id, hook.id if hook else 0, -1
+
+    # ---------- 編集・削除の反映 ----------
+    async def update(self, copies, payload: dict) -> list[tuple[int, int, int, int]]:
+        # 単独で送り直したコピーは新しいものに置き換わる（呼び出し側で索引を更新する）
+        return list(await asyncio.gather(*(self._apply("edit", copy, payload) for copy in copies)))
+
+    async def remove(self, copies):
+        await asyncio.gather(*(self._apply("delete", copy, None) for copy in copies))
+
+    async def _apply(self, action: str, copy, payload: dict | None):
+        channel_id, message_id, webhook_id, part = copy
+        channel = self.bot.get_channel(channel_id)
+        result = "ok"
+        try:
+            if channel is None:
+                result = "missing"
+            elif part >= 0 and payload is not None and payload["embeds"]:
+                copy = await self._resend(channel, copy, payload)
+                result = "resent" if copy[3] < 0 else "missing"
+            else:
+                if part >= 0:
+                    sender = self._line_editor(channel, message_id, part, payload)
+                else:
+                    sender = await self._editor(channel, message_id, webhook_id, payload)
+                if sender is None:
+                    result = "missing"
+                else:
+                    # 同じチャンネルの送信待ちより後に実行されるよう、送信キューを通す
+                    await asyncio.wait_for(self.outbound.send(channel, sender=sender), self.timeout)
+        except discord.NotFound:
+            result = "not_found"  # コピーが既に消されている
+        except asyncio.TimeoutError:
+            result = "timeout"
+        except Exception as e:
+            result = "error"
+            log.warning("中継コピーの更新失敗", extra={"action": action, "channel_id": channel_id, "error": str(e)})
+        RELAY_UPDATES.inc(action=action, result=result)
+        return copy
+
+    async def _resend(self, channel, copy, payload: dict):
+        # まとめた1通には埋め込みを付けられないので、単独で送り直してから元の行を外す
+        resent = await asyncio.wait_for(self._send(payload, channel), self.timeout)
+        if resent is None:
+            return copy
+        sender = self._line_editor(channel, copy[1], copy[3], None)
+        if sender is not None:
+            try:
+                await asyncio.wait_for(self.outbound.send(channel, sender=sender), self.timeout)
+            except (discord.HTTPException, asyncio.TimeoutError) as e:
+                log.warning("まとめ送信の行の削除失敗", extra={"channel_id": channel.id, "error": str(e)})
+        return resent
+
+    async def _editor(self, channel, message_id: int, webhook_id: int, payload: dict | None):
+        # 送ったときと同じ送り主（Webhook / Bot）で編集・削除する
+        if webhook_id:
+            hook = await self.webhooks.get(channel)
+            if hook is None or hook.id != webhook_id:
+                return None
+            if payload is None:
+                return partial(hook.delete_message, message_id)
+            return partial(
+                hook.edit_message,
+                message_id,
+                content=payload["content"],
+                embeds=[discord.Embed.from_dict(e) for e in payload["embeds"]],
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+        message = channel.get_partial_message(message_id)
+        if payload is None:
+            return message.delete
+        return partial(
+            message.edit,
+            content=payload["line"],
+            embeds=[discord.Embed.from_dict(e) for e in payload["embeds"]],
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
+
+    def _line_editor(self, channel, message_id: int, part: int, payload: dict | None):
+        entry = self.index.combined(message_id) if self.index is not None else None
+        if entry is None or part >= len(entry["lines"]):
+            return None
+        entry["lines"][part] = payload["line"] if payload is not None else None
+        self.index.save_combined(message_id, entry)
+        message = channel.get_partial_message(message_id)
+
+        async def apply():
+            # キューで順番が来た時点の内容で書き換える（同じ1通への連続した変更は1回で済む）
+            entry = self.index.combined(message_id)
+            if entry is None:
+                return None  # 先に全行が消えて削除済み
+            remaining = [line for line in entry["lines"] if line is not None]
+            if not remaining:
+                self.index.drop_combined(message_id)
+                return await message.delete()
+            content = "\n".join(remaining)[:MESSAGE_LIMIT]
+            shown = zlib.crc32(content.encode("utf-8"))
+            if shown == entry["shown"]:
+                return None
+            entry["shown"] = shown
+            self.index.save_combined(message_id, entry)
+            return await message.edit(content=content, allowed_mentions=discord.AllowedMentions.none())
+
+        return apply
+
+
+def relay_content(message: discord.Message, limit: int) -> str:
+    # 添付ファイルは URL を本文の後ろに付ける（画像は Discord 側で展開される）
+    urls = "\n".join(a.url for a in message.attachments)
+    body = message.content
+    budget = limit - (len(urls) + 1 if urls else 0)
+    if len(body) > budget:
+        body = body[:max(0, budget - 1)] + "…"
+    return "\n".join(part for part in (body, urls) if part)
+
+
+def signature(payload: dict) -> int:
+    # 本文・埋め込みが変わったかどうかの判定用（プロセスをまたいでも同じ値）
+    data = json.dumps([payload["content"], payload["embeds"]], sort_keys=True, ensure_ascii=False)
+    return zlib.crc32(data.encode("utf-8"))
+
+
+# --------------------------
+# 中継元メッセージ → 中継先コピーの索引
+# --------------------------
+class RelayIndex:
+    def __init__(self, table=None, ttl: float = RELAY_INDEX_TTL, size: int = RELAY_INDEX_SIZE):
+        # table を渡すと再起動後も編集・削除を反映できる（None ならメモリ上だけ）
+        self.entries = ExpiringTable(table, ttl, size)
+        self.pending: dict[int, asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def start(self):
+        self.entries.start()
+
+    def stop(self):
+        self.entries.stop()
+
+    # ---------- 記録 ----------
+    def begin(self, source_id: int):
+        # 中継中に届いた編集・削除は、中継が終わるまで待たせる
+        self.pending.setdefault(source_id, asyncio.get_running_loop().create_future())
+
+    def record(self, source_id: int, copies, remote=(), sig: int = 0):
+        if copies or remote:
+            self.entries.set(source_id, {"copies": pack(copies), "remote": list(remote), "sig": sig})
+        future = self.pending.pop(source_id, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    # ---------- 参照 ----------
+    async def get(self, source_id: int) -> dict | None:
+        future = self.pending.get(source_id)
+        if future is not None:
+            await asyncio.shield(future)
+        return self.entries.get(source_id)
+
+    async def pop(self, source_id: int) -> dict | None:
+        entry = await self.get(source_id)
+        if entry is not None:
+            self.entries.pop(source_id)
+        return entry
+
+    # ---------- まとめ送信した1通 ----------
+    def combine(self, message_id: int, lines: list[str]):
+        # 同じ1通に入った全行が同じ lines を受け取るので、最初の1回だけ記録する
+        if self.combined(message_id) is None:
+            content = "\n".join(lines)
+            self.save_combined(message_id, {"lines": list(lines), "shown": zlib.crc32(content.encode("utf-8"))})
+
+    def combined(self, message_id: int) -> dict | None:
+        return self.entries.get(f"c{message_id}")
+
+    def save_combined(self, message_id: int, entry: dict):
+        self.entries.set(f"c{message_id}", entry)
+
+    def drop_combined(self, message_id: int):
+        self.entries.pop(f"c{message_id}")
+
+
+def pack(copies) -> str:
+    # 1件あたりのメモリを抑えるため "channel:message:webhook:行" をカンマでつなげて持つ
+    return ",".join(f"{c}:{m}:{w}:{p}" for c, m, w, p in copies)
+
+
+def unpack(packed: str) -> list[tuple[int, int, int, int]]:
+    return [tuple(map(int, copy.split(":"))) for copy in packed.split(",") if copy]
+
+
+# --------------------------
+# ルーティングインデックス
+# --------------------------
+class Route:
+    __slots__ = ("targets", "channels", "remote")
+
+    def __init__(self, targets):
+        self.targets = targets  # [(guild_id, channel_id), ...]
+        self.channels = None    # 解決済みチャンネル（遅延解決）
+        self.remote = None      # 他クラスタ担当のターゲット {cluster_id: [(guild_id, channel_id), ...]}
+
+
+class RouteIndex:
+    def __init__(self, bot, networks: dict[str, list[str]], locate=None):
+        self.bot = bot
+        # locate(guild_id) -> 担当クラスタ ID（自プロセスなら None）。単一プロセスでは不要
+        self.locate = locate
+        self.networks: dict[str, list[tuple[int, int]]] = {}
+        self.memberships: dict[tuple[int, int], list[str]] = {}
+        self.routes: dict[tuple[int, int], Route] = {}
+
+        for name, chans in networks.items():
+            self.add_network(name)
+            for identifier in chans:
+                self._add_member(name, self.parse(identifier))
+        self._rebuild(self.memberships)
+
+    @staticmethod
+    def parse(identifier: str) -> tuple[int, int]:
+        tg, tc = identifier.split(":")
+        return int(tg), int(tc)
+
+    # ---------- 参照 ----------
+    def get(self, key: tuple[int, int]):
+        # ネットワーク未参加のチャンネルはここで None（辞書1回の参照のみ）
+        route = self.routes.get(key)
+        if route is None:
+            return None
+        if route.channels is None:
+            self._resolve(route)
+        return route.channels
+
+    def remote(self, key: tuple[int, int]) -> dict[int, list[tuple[int, int]]]:
+        route = self.routes.get(key)
+        if route is None:
+            return {}
+        if route.channels is None:
+            self._resolve(route)
+        return route.remote
+
+    def _resolve(self, route: Route):
+        route.remote = {}
+        local = []
+        for target in route.targets:
+            owner = self.locate(target[0]) if self.locate else None
+            if owner is None:
+                local.append(target)
+            else:
+                route.remote.setdefault(owner, []).append(target)
+        route.channels = self.resolve(local)
+
+    def resolve(self, targets):
+        channels = []
+        for tg, tc in targets:
+            guild = self.bot.get_guild(tg)
+            if not guild:
+                continue
+            channel = guild.get_channel(tc)
+            if channel:
+                channels.append(channel)
+        return channels
+
+    def invalidate(self):
+        # ギルド/チャンネルの増減時に解決済みキャッシュを破棄
+        for route in self.routes.values():
+            route.channels = None
+            route.remote = None
+
+    # ---------- 更新 ----------
+    def add_network(self, name: str):
+        self.networks.setdefault(name, [])
+
+    def join(self, name: str, key: tuple[int, int]):
+        self.add_network(name)
+        if key in self.networks[name]:
+            return
+        self._add_member(name, key)
+        # 影響するのは同じネットワークのメンバーだけ
+        self._rebuild(self.networks[name])
+
+    def reload(self, name: str, identifiers: list[str]):
+        # 他プロセスで変更されたネットワークを丸ごと置き換える
+        self.add_network(name)
+        old = self.networks[name]
+        for key in old:
+            names = self.memberships.get(key, [])
+            if name in names:
+                names.remove(name)
+        self.networks[name] = []
+        for identifier in identifiers:
+            self._add_member(name, self.parse(identifier))
+        self._rebuild(set(old) | set(self.networks[name]))
+
+    def _add_member(self, name, key):
+        members = self.networks[name]
+        if key not in members:
+            members.append(key)
+        names = self.memberships.setdefault(key, [])
+        if name not in names:
+            names.append(name)
+
+    def _rebuild(self, keys):
+        for key in keys:
+            targets = {}
+            for name in self.memberships.get(key, ()):
+                for member in self.networks[name]:
+                    if member != key:
+                        targets[member] = None
+            self.routes[key] = Route(list(targets))
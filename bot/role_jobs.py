@@ -0,0 +1,235 @@
+import time
+import asyncio
+import logging
+
+import discord
+
+from bot.config import ROLE_JOB_CONCURRENCY, ROLE_JOB_RATE, ROLE_JOB_CHUNK, ROLE_JOB_REPORT_INTERVAL
+from bot.outbound import get_outbound
+from bot.ratelimit import TokenBucket
+from bot.storage import get_storage
+
+log = logging.getLogger(__name__)
+
+SAMPLE_SIZE = 20  # ドライランで報告するメンバー数
+
+
+# --------------------------
+# 認証ロールの一括移行（チェックポイントから再開できる）
+# --------------------------
+class RoleMigration:
+    def __init__(self, bot, members=None, audit=None,
+                 concurrency: int = ROLE_JOB_CONCURRENCY, rate: float = ROLE_JOB_RATE):
+        self.bot = bot
+        self.members = members  # bot/members.py の共有キャッシュ（変更したメンバーを捨てる）
+        self.audit = audit
+        self.jobs = get_storage(bot).table("role_jobs")  # guild_id -> 進捗（チェックポイント）
+        self.tasks: dict[int, asyncio.Task] = {}
+        self.sem = asyncio.Semaphore(concurrency)
+        # 全ギルド共通のペース配分（429 を待つより先に、通常の操作の分を空けておく）
+        self.bucket = TokenBucket(rate, max(1.0, rate))
+        self.reported: dict[int, float] = {}
+
+    # ---------- 操作 ----------
+    def get(self, guild_id: int) -> dict | None:
+        return self.jobs.get(guild_id)
+
+    def running(self, guild_id: int) -> bool:
+        task = self.tasks.get(guild_id)
+        return task is not None and not task.done()
+
+    def start(self, guild_id: int, from_role: int, to_role: int | None, *, remove_old: bool = True,
+              dry_run: bool = False, channel_id: int | None = None) -> dict:
+        job = {
+            "from_role": from_role,
+            "to_role": to_role,
+            "remove_old": remove_old,
+            "dry_run": dry_run,
+            "status": "running",
+            "after": 0,          # ここまでのユーザー ID は処理済み
+            "scanned": 0,
+            "changed": 0,
+            "failed": 0,
+            "sample": [],
+            "channel_id": channel_id,
+            "message_id": None,  # 進捗を書き換えるメッセージ
+            "started_at": time.time(),
+        }
+        self.jobs.set(guild_id, job)
+        self._spawn(guild_id)
+        return job
+
+    def resume_all(self, owns=None):
+        # 再起動前に走っていたジョブを続きから再開する
+        for guild_id, job in list(self.jobs.items()):
+            guild_id = int(guild_id)
+            if job.get("status") == "running" and (owns is None or owns(guild_id)):
+                self._spawn(guild_id)
+
+    def cancel(self, guild_id: int) -> bool:
+        job = self.jobs.get(guild_id)
+        if job is None or job["status"] != "running":
+            return False
+        job["status"] = "cancelled"
+        self.jobs.set(guild_id, job)
+        task = self.tasks.get(guild_id)
+        if task is not None and not task.done():
+            task.cancel()  # 終了報告はタスク側で行う
+        else:
+            asyncio.create_task(self._report(guild_id, job, final=True))
+        return True
+
+    def stop(self):
+        # 終了時はタスクだけ止める（状態は running のまま残し、次回起動時に再開）
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+
+    def _spawn(self, guild_id: int):
+        if not self.running(guild_id):
+            self.tasks[guild_id] = asyncio.create_task(self._run(guild_id))
+
+    # ---------- 本体 ----------
+    async def _run(self, guild_id: int):
+        await self.bot.wait_until_ready()
+        job = self.jobs.get(guild_id)
+        guild = self.bot.get_guild(guild_id)
+        try:
+            if guild is None or guild.get_role(job["from_role"]) is None:
+                job["status"] = "error"
+                job["error"] = "サーバーまたは移行元ロールが見つかりません"
+                return
+            if job["to_role"] and guild.get_role(job["to_role"]) is None:
+                job["status"] = "error"
+                job["error"] = "移行先ロールが見つかりません"
+                return
+
+            # キャッシュに頼らず REST で ID 順に取得する（after で続きから取れる）
+            chunk = []
+            after = discord.Object(id=job["after"]) if job["after"] else None
+            async for member in guild.fetch_members(limit=None, after=after):
+                chunk.append(member)
+                if len(chunk) >= ROLE_JOB_CHUNK:
+                    await self._process(guild, job, chunk)
+                    chunk = []
+            if chunk:
+                await self._process(guild, job, chunk)
+            job["status"] = "done"
+        except asyncio.CancelledError:
+            raise
+        except discord.Forbidden as e:
+            # 権限不足は全員に対して失敗するので打ち切る
+            job["status"] = "error"
+            job["error"] = f"権限がありません（{e.text}）"
+        except Exception as e:
+            log.exception("ロール移行失敗", extra={"guild_id": guild_id})
+            job["status"] = "error"
+            job["error"] = str(e)
+        finally:
+            if job is not None and job["status"] != "running":
+                job["finished_at"] = time.time()
+                self.jobs.set(guild_id, job)
+                self.tasks.pop(guild_id, None)
+                await self._report(guild_id, job, final=True)
+                if self.audit and job["status"] == "done" and not job["dry_run"]:
+                    self.audit.record(
+                        guild_id, "role_migration", None, role_id=job["to_role"],
+                        reason=f"<@&{job['from_role']}> から {job['changed']} 人を移行（失敗 {job['failed']}）",
+                    )
+                log.info("ロール移行終了", extra={"guild_id": guild_id, "status": job["status"],
+                                                  "scanned": job["scanned"], "changed": job["changed"]})
+
+    async def _process(self, guild: discord.Guild, job: dict, chunk: list[discord.Member]):
+        await asyncio.gather(*(self._count(guild, job, member) for member in chunk))
+        job["scanned"] += len(chunk)
+        # チャンク単位でチェックポイントを保存（途中で止まった分は再開時に変更済みとして飛ばされる）
+        job["after"] = chunk[-1].id
+        self.jobs.set(guild.id, job)
+        await self._report(guild.id, job)
+
+    async def _count(self, guild: discord.Guild, job: dict, member: discord.Member):
+        result = await self._apply(guild, job, member)
+        if result == "changed":
+            job["changed"] += 1
+            if job["dry_run"] and len(job["sample"]) < SAMPLE_SIZE:
+                job["sample"].append(member.id)
+        elif result == "failed":
+            job["failed"] += 1
+
+    async def _apply(self, guild: discord.Guild, job: dict, member: discord.Member) -> str:
+        if member.bot or member.get_role(job["from_role"]) is None:
+            return "skipped"
+        roles = {r.id: r for r in member.roles if not r.is_default()}
+        if job["remove_old"] and job["to_role"] != job["from_role"]:
+            roles.pop(job["from_role"], None)
+        if job["to_role"]:
+            roles.setdefault(job["to_role"], guild.get_role(job["to_role"]))
+        if roles.keys() == {r.id for r in member.roles if not r.is_default()}:
+            return "skipped"
+        if job["dry_run"]:
+            return "changed"
+
+        async with self.sem:
+            wait = self.bucket.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                # 追加・削除を1回の API 呼び出しで反映
+                await member.edit(roles=list(roles.values()), reason="認証ロール移行")
+            except discord.Forbidden:
+                raise
+            except discord.HTTPException as e:
+                log.warning("ロール移行で更新失敗", extra={"guild_id": guild.id, "user_id": member.id, "error": str(e)})
+                return "failed"
+        if self.members:
+            self.members.forget(guild.id, member.id)
+        return "changed"
+
+    # ---------- 進捗報告 ----------
+    def describe(self, guild_id: int, job: dict) -> str:
+        guild = self.bot.get_guild(guild_id)
+        total = getattr(guild, "member_count", None) or 0
+        progress = f"{job['scanned']}/{total}" if total else str(job["scanned"])
+        status = {
+            "running": "実行中", "done": "完了", "cancelled": "中止", "error": f"エラー: {job.get('error', '')}",
+        }[job["status"]]
+        to = f"<@&{job['to_role']}>" if job["to_role"] else "（なし）"
+        lines = [
+            f"🔁 認証ロール移行{'（ドライラン）' if job['dry_run'] else ''}: <@&{job['from_role']}> → {to}"
+            f"{'（移行元は外す）' if job['remove_old'] else ''}",
+            f"確認 {progress} / {'変更予定' if job['dry_run'] else '変更'} {job['changed']}"
+            f" / 失敗 {job['failed']} / {status}",
+        ]
+        if job["dry_run"] and job["sample"]:
+            more = "…" if job["changed"] > len(job["sample"]) else ""
+            lines.append("対象: " + " ".join(f"<@{u}>" for u in job["sample"]) + more)
+        return "\n".join(lines)
+
+    async def _report(self, guild_id: int, job: dict, final: bool = False):
+        now = time.monotonic()
+        if not final and now - self.reported.get(guild_id, 0) < ROLE_JOB_REPORT_INTERVAL:
+            return
+        self.reported[guild_id] = now
+        guild = self.bot.get_guild(guild_id)
+        channel = guild.get_channel(job["channel_id"]) if guild and job.get("channel_id") else None
+        if channel is None:
+            return
+        text = self.describe(guild_id, job)
+        try:
+            if job["message_id"]:
+                # 1通のメッセージを書き換えて進捗を表示する
+                await channel.get_partial_message(job["message_id"]).edit(
+                    content=text, allowed_mentions=discord.AllowedMentions.none()
+                )
+            else:
+                message = await get_outbound(self.bot).send(
+                    channel, text, allowed_mentions=discord.AllowedMentions.none()
+                )
+                job["message_id"] = message.id
+                self.jobs.set(guild_id, job)
+        except discord.NotFound:
+            job["message_id"] = None
+        except discord.HTTPException as e:
+            log.warning("進捗の報告に失敗", extra={"guild_id": guild_id, "error": str(e)})
+        if final:
+            self.reported.pop(guild_id, None)
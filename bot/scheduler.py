@@ -0,0 +1,120 @@
+import time
+import heapq
+import asyncio
+import logging
+
+from bot.storage import get_storage
+
+log = logging.getLogger(__name__)
+
+BATCH_WINDOW = 1.0  # この時間内に期限が来るジョブはまとめて処理
+RETRY_DELAY = 60.0  # ハンドラ未登録のジョブを再確認するまでの時間
+
+
+# --------------------------
+# 永続化された期限付きジョブのスケジューラ
+# --------------------------
+class Scheduler:
+    def __init__(self, bot, table):
+        self.bot = bot
+        self.table = table  # job_id -> {"kind", "due", "payload"}
+        self.heap: list[tuple[float, str]] = []
+        self.handlers: dict[str, tuple] = {}
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+        # 再起動前のジョブを復元
+        for job_id, job in table.items():
+            heapq.heappush(self.heap, (job["due"], job_id))
+
+    # ---------- 登録 ----------
+    def register(self, kind: str, handler, group=None):
+        # handler(group_key, [payload, ...]) をグループ単位で呼ぶ
+        self.handlers[kind] = (handler, group or (lambda payload: None))
+        self.start()
+
+    def unregister(self, kind: str):
+        self.handlers.pop(kind, None)
+
+    def schedule(self, job_id: str, kind: str, delay: float, payload: dict):
+        due = time.time() + delay
+        self.table.set(job_id, {"kind": kind, "due": due, "payload": payload})
+        heapq.heappush(self.heap, (due, job_id))
+        if self.heap[0][1] == job_id:
+            self.wakeup.set()
+
+    def cancel(self, job_id: str):
+        # ヒープからは取り出し時に読み捨てる
+        self.table.delete(job_id)
+
+    def pending(self, kind: str | None = None) -> int:
+        return sum(1 for job in self.table.all().values() if kind is None or job["kind"] == kind)
+
+    # ---------- 実行 ----------
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            batches = self._take_due()
+            for (kind, key), jobs in batches.items():
+                handler, _ = self.handlers[kind]
+                asyncio.create_task(self._dispatch(kind, handler, key, jobs))
+
+            self.wakeup.clear()
+            timeout = self.heap[0][0] - time.time() if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _take_due(self) -> dict:
+        limit = time.time() + BATCH_WINDOW
+        batches: dict[tuple, list] = {}
+        retry = []
+        while self.heap and self.heap[0][0] <= limit:
+            due, job_id = heapq.heappop(self.heap)
+            job = self.table.get(job_id)
+            if job is None or job["due"] != due:
+                continue  # 取り消し済み・再登録済み
+            entry = self.handlers.get(job["kind"])
+            if entry is None:
+                retry.append(job_id)
+                continue
+            key = entry[1](job["payload"])
+            batches.setdefault((job["kind"], key), []).append((job_id, due, job["payload"]))
+
+        for job_id in retry:
+            job = self.table.get(job_id)
+            job["due"] = time.time() + RETRY_DELAY
+            self.table.set(job_id, job)
+            heapq.heappush(self.heap, (job["due"], job_id))
+        return batches
+
+    async def _dispatch(self, kind, handler, key, jobs):
+        try:
+            await handler(key, [payload for _, _, payload in jobs])
+        except Exception:
+            log.exception("ジョブの処理に失敗", extra={"kind": kind, "jobs": len(jobs)})
+        # 処理が終わってから消す（途中で落ちたら再起動後にやり直す）
+        for job_id, due, _ in jobs:
+            job = self.table.get(job_id)
+            if job is not None and job["due"] == due:
+                self.table.delete(job_id)
+
+
+def get_scheduler(bot) -> Scheduler:
+    scheduler = getattr(bot, "scheduler", None)
+    if scheduler is None:
+        # クラスタモードではジョブもクラスタごとに分ける（担当ギルドのジョブだけを持つ）
+        cluster = getattr(bot, "cluster", None)
+        name = "schedule" if cluster is None else f"schedule:{cluster.cluster_id}"
+        scheduler = bot.scheduler = Scheduler(bot, get_storage(bot).table(name))
+    return scheduler
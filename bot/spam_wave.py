@@ -0,0 +1,146 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone, timedelta
+
+import discord
+
+from bot.config import WAVE_THRESHOLD, WAVE_WINDOW, WAVE_COOLDOWN
+
+log = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0     # 一括削除までの待ち時間(秒)
+BULK_LIMIT = 100         # bulk delete の1回あたり上限
+DM_COOLDOWN = 300.0      # 同じユーザーへの DM 間隔(秒)
+TIMEOUT_MINUTES = 10
+
+
+# --------------------------
+# スパムウェーブ検知と一括処理
+# --------------------------
+class SpamWave:
+    def __init__(
+        self,
+        outbound,
+        threshold: int = WAVE_THRESHOLD,
+        window: float = WAVE_WINDOW,
+        cooldown: float = WAVE_COOLDOWN,
+        audit=None,
+    ):
+        self.outbound = outbound
+        self.audit = audit
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+
+        self.hits: dict[int, deque] = {}        # guild_id / channel_id -> 違反時刻
+        self.wave_until: dict[int, float] = {}  # guild_id / channel_id -> モード終了時刻
+        self.buffers: dict[int, list[discord.Message]] = {}
+        self.flushers: dict[int, asyncio.Task] = {}
+        self.pending_timeouts: dict[int, dict[int, tuple[discord.Member, str]]] = {}
+        self.timed_out: dict[tuple[int, int], float] = {}
+        self.dm_sent: dict[int, float] = {}
+        self.last_prune = 0.0
+
+    # ---------- 検知 ----------
+    def observe(self, message: discord.Message) -> bool:
+        now = time.monotonic()
+        if now - self.last_prune > 60:
+            self._prune()
+        in_wave = False
+        for key in (message.guild.id, message.channel.id):
+            hits = self.hits.setdefault(key, deque())
+            hits.append(now)
+            while hits and hits[0] < now - self.window:
+                hits.popleft()
+            if len(hits) >= self.threshold:
+                if self.wave_until.get(key, 0) < now:
+                    log.warning("スパムウェーブ検知", extra={"key": key, "hits": len(hits), "window_s": self.window})
+                self.wave_until[key] = now + self.cooldown
+            if self.wave_until.get(key, 0) >= now:
+                in_wave = True
+        return in_wave
+
+    # ---------- 削除 ----------
+    def queue_delete(self, message: discord.Message):
+        self.buffers.setdefault(message.channel.id, []).append(message)
+        self._schedule_flush(message.channel)
+
+    def _schedule_flush(self, channel):
+        task = self.flushers.get(channel.id)
+        if task is None or task.done():
+            self.flushers[channel.id] = asyncio.create_task(self._flush(channel))
+
+    async def _flush(self, channel):
+        await asyncio.sleep(FLUSH_INTERVAL)
+        messages = self.buffers.pop(channel.id, [])
+        self.flushers.pop(channel.id, None)
+
+        for i in range(0, len(messages), BULK_LIMIT):
+            chunk = messages[i:i + BULK_LIMIT]
+            try:
+                await channel.delete_messages(chunk, reason="スパムウェーブ一括削除")
+            except discord.HTTPException as e:
+                log.warning("一括削除失敗", extra={"channel_id": channel.id, "error": str(e)})
+                for message in chunk:
+                    try:
+                        await message.delete()
+                    except discord.HTTPException:
+                        pass
+
+        await self._flush_timeouts(channel.guild.id)
+        self._prune()
+
+    # ---------- タイムアウト（ユーザーごとに1回） ----------
+    async def timeout_once(self, member: discord.Member, reason: str, defer: bool = False):
+        key = (member.guild.id, member.id)
+        if self.timed_out.get(key, 0) > time.monotonic() or member.is_timed_out():
+            return
+        if defer:
+            self.pending_timeouts.setdefault(member.guild.id, {})[member.id] = (member, reason)
+            return
+        self.timed_out[key] = time.monotonic() + TIMEOUT_MINUTES * 60
+        await self._timeout(member, reason)
+
+    async def _flush_timeouts(self, guild_id: int):
+        pending = self.pending_timeouts.pop(guild_id, {})
+        targets = []
+        for member, reason in pending.values():
+            key = (guild_id, member.id)
+            if self.timed_out.get(key, 0) > time.monotonic():
+                continue
+            self.timed_out[key] = time.monotonic() + TIMEOUT_MINUTES * 60
+            targets.append(self._timeout(member, reason))
+        await asyncio.gather(*targets)
+
+    async def _timeout(self, member: discord.Member, reason: str):
+        until = datetime.now(timezone.utc) + timedelta(minutes=TIMEOUT_MINUTES)
+        try:
+            await member.timeout(until, reason=reason)
+        except discord.HTTPException as e:
+            log.warning("タイムアウト失敗", extra={"member_id": member.id, "error": str(e)})
+            return
+        if self.audit:
+            self.audit.record(member.guild.id, "timeout", member, reason=f"{reason}（{TIMEOUT_MINUTES}分）")
+
+    # ---------- DM（ユーザーごとに間引く） ----------
+    async def dm_once(self, user, text: str):
+        now = time.monotonic()
+        if self.dm_sent.get(user.id, 0) > now:
+            return
+        self.dm_sent[user.id] = now + DM_COOLDOWN
+        try:
+            await self.outbound.send(user, text)
+        except discord.HTTPException:
+            pass
+
+    # ---------- 掃除 ----------
+    def _prune(self):
+        now = time.monotonic()
+        self.last_prune = now
+        for key in [k for k, hits in self.hits.items() if not hits or hits[-1] < now - self.window]:
+            del self.hits[key]
+        for table in (self.wave_until, self.timed_out, self.dm_sent):
+            for key in [k for k, until in table.items() if until < now]:
+                del table[key]
@@ -0,0 +1,200 @@
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+import hashlib
+
+import discord
+from discord.ext import commands
+from aiohttp import web
+
+from bot.config import LOW_MEMORY_MEMBERS
+from bot.metrics import (
+    REGISTRY, LISTENER_SECONDS, COMMAND_SECONDS, GATEWAY_LATENCY, OUTBOUND_QUEUE_DEPTH,
+    merge, render, rest_trace,
+)
+from bot.storage import get_storage
+from bot.web import get_web_server
+
+log = logging.getLogger(__name__)
+
+COGS_PACKAGE = "bot.cogs"
+COGS_DIR = os.path.join(os.path.dirname(__file__), "cogs")
+
+
+# --------------------------
+# Cog の検出と並列ロード
+# --------------------------
+def discover_cogs() -> list[str]:
+    return sorted(
+        f"{COGS_PACKAGE}.{name[:-3]}"
+        for name in os.listdir(COGS_DIR)
+        if name.endswith(".py") and not name.startswith("_")
+    )
+
+
+async def load_cogs(bot: commands.Bot, extensions: list[str] | None = None) -> dict[str, float]:
+    async def load(name):
+        start = time.perf_counter()
+        try:
+            await bot.load_extension(name)
+            error = None
+        except Exception as e:
+            error = e
+        return name, time.perf_counter() - start, error
+
+    results = await asyncio.gather(*(load(name) for name in extensions or discover_cogs()))
+
+    loaded = {}
+    for name, elapsed, error in results:
+        if error:
+            log.error("Cog ロード失敗", extra={"cog": name, "ms": round(elapsed * 1000), "error": str(error)})
+        else:
+            loaded[name] = elapsed
+            log.info("Cog ロード完了", extra={"cog": name, "ms": round(elapsed * 1000)})
+    return loaded
+
+
+# --------------------------
+# コマンド同期（内容が変わった時だけ）
+# --------------------------
+def command_hash(tree: discord.app_commands.CommandTree, guild: discord.abc.Snowflake | None = None) -> str:
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda c: (c.get("type", 1), c["name"]),
+    )
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+async def sync_commands(bot: commands.Bot, guild_id: str | None = None) -> bool:
+    guild = discord.Object(id=int(guild_id)) if guild_id else None
+    if guild:
+        bot.tree.copy_global_to(guild=guild)
+
+    meta = get_storage().table("meta")
+    key = f"command_hash:{bot.application_id}:{guild_id or 'global'}"
+    digest = command_hash(bot.tree, guild)
+    if meta.get(key) == digest:
+        log.info("コマンドに変更なし、同期をスキップ")
+        return False
+
+    await bot.tree.sync(guild=guild)
+    meta.set(key, digest)
+    log.info("コマンド同期完了", extra={"scope": guild_id or "global"})
+    return True
+
+
+# --------------------------
+# Bot 本体
+# --------------------------
+def default_intents() -> discord.Intents:
+    intents = discord.Intents.default()
+    intents.members = True
+    return intents
+
+
+class InstrumentedTree(discord.app_commands.CommandTree):
+    async def _call(self, interaction: discord.Interaction):
+        # コマンドごとの処理時間（エラーは CommandTree 側で処理済み）
+        start = time.perf_counter()
+        try:
+            await super()._call(interaction)
+        finally:
+            command = interaction.command
+            COMMAND_SECONDS.observe(
+                time.perf_counter() - start,
+                command=command.qualified_name if command else "unknown",
+                status="error" if interaction.command_failed else "ok",
+            )
+
+
+class StartupMixin:
+    def __init__(self, *args, sync_guild_id: str | None = None, sync: bool = True, **kwargs):
+        # REST 呼び出しの計測と、コマンド処理時間の計測
+        kwargs.setdefault("http_trace", rest_trace())
+        kwargs.setdefault("tree_cls", InstrumentedTree)
+        if LOW_MEMORY_MEMBERS:
+            # 全メンバーを保持しない（必要な分は bot/members.py の LRU から引く）
+            kwargs.setdefault("chunk_guilds_at_startup", False)
+            kwargs.setdefault("member_cache_flags", discord.MemberCacheFlags.none())
+        super().__init__(*args, **kwargs)
+        self.sync_guild_id = sync_guild_id
+        self.sync = sync  # クラスタモードではクラスタ 0 だけが同期する
+
+    async def setup_hook(self):
+        # 接続前に1回だけ実行される（再接続のたびに走らない）
+        start = time.perf_counter()
+        await load_cogs(self)
+        if self.sync:
+            try:
+                await sync_commands(self, self.sync_guild_id)
+            except Exception as e:
+                log.error("コマンド同期失敗", extra={"error": str(e)})
+
+        # ホストモードではメトリクスはホスト側でまとめて出す（bot/host.py）
+        host = getattr(self, "host", None)
+        if host is None:
+            REGISTRY.add_collector(self.collect_metrics)
+        cluster = getattr(self, "cluster", None)
+        if host is None and (cluster is None or cluster.cluster_id == 0):
+            web_server = get_web_server()
+            web_server.add_route("GET", "/metrics", self.metrics)
+            await web_server.start()
+        log.info("起動準備完了", extra={"ms": round((time.perf_counter() - start) * 1000)})
+
+    async def _run_event(self, coro, event_name: str, *args, **kwargs):
+        # リスナーごとの処理時間
+        start = time.perf_counter()
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            LISTENER_SECONDS.observe(
+                time.perf_counter() - start,
+                event=event_name,
+                listener=getattr(coro, "__qualname__", event_name),
+            )
+
+    # ---------- メトリクス ----------
+    def shard_latencies(self):
+        for shard_id, latency in getattr(self, "latencies", [(self.shard_id or 0, self.latency)]):
+            if math.isfinite(latency):
+                yield shard_id, latency
+
+    def queue_depth(self) -> int:
+        outbound = getattr(self, "outbound", None)
+        return outbound.stats()["queue_depth"] if outbound else 0
+
+    def collect_metrics(self):
+        GATEWAY_LATENCY.clear()
+        for shard_id, latency in self.shard_latencies():
+            GATEWAY_LATENCY.set(latency, shard=shard_id)
+        OUTBOUND_QUEUE_DEPTH.set(self.queue_depth())
+
+    async def metrics(self, request: web.Request):
+        families = REGISTRY.collect()
+        cluster = getattr(self, "cluster", None)
+        if cluster:
+            # クラスタ 0 が全クラスタ分をまとめて返す
+            others = [c for c in range(cluster.cluster_count) if c != cluster.cluster_id]
+            results = await asyncio.gather(
+                *(cluster.bus.request(c, "metrics", timeout=5) for c in others), return_exceptions=True
+            )
+            sources = {str(cluster.cluster_id): families}
+            for cluster_id, result in zip(others, results):
+                if not isinstance(result, BaseException):
+                    sources[str(cluster_id)] = result
+            families = merge(sources, "cluster")
+        return web.Response(
+            text=render(families), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+
+class AvanzareBot(StartupMixin, commands.Bot):
+    pass
+
+
+class AvanzareShardedBot(StartupMixin, commands.AutoShardedBot):
+    pass
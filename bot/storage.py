@@ -0,0 +1,367 @@
+import os
+import json
+import time
+import atexit
+import asyncio
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from bot.config import STORAGE_PATH, STORAGE_FLUSH_DELAY
+from bot.metrics import STORAGE_WRITE_SECONDS, STORAGE_WRITE_ROWS
+
+log = logging.getLogger(__name__)
+
+_DELETED = object()
+RETRY_MAX_DELAY = 30.0  # 書き込み失敗時の再試行間隔の上限(秒)
+
+
+# --------------------------
+# テーブル（名前空間ごとのキー/値 + 読み込みキャッシュ）
+# --------------------------
+class Table:
+    def __init__(self, storage: "Storage", name: str, data: dict):
+        self.storage = storage
+        self.name = name
+        self.cache = data
+
+    def get(self, key, default=None):
+        return self.cache.get(str(key), default)
+
+    def __contains__(self, key):
+        return str(key) in self.cache
+
+    def __len__(self):
+        return len(self.cache)
+
+    def keys(self):
+        return self.cache.keys()
+
+    def items(self):
+        return self.cache.items()
+
+    def all(self) -> dict:
+        return self.cache
+
+    def set(self, key, value):
+        key = str(key)
+        self.cache[key] = value
+        self.storage._mark(self.name, key, value)
+
+    def delete(self, key):
+        key = str(key)
+        if self.cache.pop(key, _DELETED) is not _DELETED:
+            self.storage._mark(self.name, key, _DELETED)
+
+
+# --------------------------
+# SQLite (WAL) ストレージ
+# --------------------------
+class Storage:
+    def __init__(self, path: str = STORAGE_PATH, flush_delay: float = STORAGE_FLUSH_DELAY):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.flush_delay = flush_delay
+        # クラスタモードでは複数プロセスが同じファイルに書くのでロック待ちを長めに取る
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (ns, key)) WITHOUT ROWID"
+        )
+
+        self.tables: dict[str, Table] = {}
+        self.pending: dict[tuple[str, str], object] = {}
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        # 書き込みは専用スレッド1本で直列に行う（イベントループを止めない）
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self.flush_handle = None
+        self.retry_delay = 0.0  # 書き込み失敗時の再試行間隔（失敗が続くほど延ばす）
+        self.closed = False
+        self.commit_listeners = []  # listener([(ns, key), ...]) 書き込み確定後にループ上で呼ぶ
+        atexit.register(self.close)
+
+    # ---------- テーブル ----------
+    def table(self, name: str, legacy: str | None = None) -> Table:
+        table = self.tables.get(name)
+        if table:
+            return table
+
+        rows = self.conn.execute("SELECT key, value FROM kv WHERE ns = ?", (name,)).fetchall()
+        data = {key: json.loads(value) for key, value in rows}
+        table = self.tables[name] = Table(self, name, data)
+
+        # 旧 JSON ファイルからの移行（初回のみ）
+        if not rows and legacy and os.path.exists(legacy):
+            with open(legacy, "r", encoding="utf-8") as f:
+                for key, value in json.load(f).items():
+                    table.set(key, value)
+            log.info("旧 JSON ファイルを移行しました", extra={"path": legacy, "table": name})
+        return table
+
+    # ---------- 書き込み ----------
+    def _mark(self, ns: str, key: str, value):
+        with self.lock:
+            self.pending[(ns, key)] = value
+        self._schedule()
+
+    def _schedule(self):
+        if self.flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # ループ外（起動前など）はその場で書き込む
+            self._write(self._take())
+            return
+        self.flush_handle = loop.call_later(self.flush_delay, self._flush_later, loop)
+
+    def _flush_later(self, loop):
+        self.flush_handle = None
+        batch = self._take()
+        if batch:
+            future = loop.run_in_executor(self.executor, self._write, batch)
+            future.add_done_callback(lambda f: self._notify(batch, f))
+
+    def _take(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        # シリアライズはループ側で行い、書き込みスレッドとの競合を避ける
+        return [
+            (ns, key, None if value is _DELETED else json.dumps(value, ensure_ascii=False))
+            for (ns, key), value in pending.items()
+        ]
+
+    def _write(self, batch) -> bool:
+        if not batch:
+            return False
+        with self.db_lock:
+            return self._commit(batch)
+
+    def _notify(self, batch, future):
+        if future.cancelled():
+            return
+        if future.exception() or not future.result():
+            self._retry()
+            return
+        self.retry_delay = 0.0
+        keys = [(ns, key) for ns, key, _ in batch]
+        for listener in self.commit_listeners:
+            try:
+                listener(keys)
+            except Exception:
+                log.exception("書き込み通知に失敗")
+
+    def _retry(self):
+        # 失敗したバッチは pending に戻してあるので、後から変更が無くても間を空けて書き直す
+        if self.closed:
+            return
+        self.retry_delay = min(RETRY_MAX_DELAY, max(self.flush_delay, self.retry_delay * 2))
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self.flush_handle = loop.call_later(self.retry_delay, self._flush_later, loop)
+
+    def _commit(self, batch) -> bool:
+        # 1バッチ = 1トランザクション（途中でクラッシュしても壊れない）
+        start = time.perf_counter()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT INTO kv (ns, key, value) VALUES (?, ?, ?)"
+                " ON CONFLICT (ns, key) DO UPDATE SET value = excluded.value",
+                [row for row in batch if row[2] is not None],
+            )
+            self.conn.executemany(
+                "DELETE FROM kv WHERE ns = ? AND key = ?",
+                [(ns, key) for ns, key, value in batch if value is None],
+            )
+            self.conn.execute("COMMIT")
+            STORAGE_WRITE_SECONDS.observe(time.perf_counter() - start, result="ok")
+            STORAGE_WRITE_ROWS.inc(len(batch))
+            return True
+        except sqlite3.Error as e:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            STORAGE_WRITE_SECONDS.observe(time.perf_counter() - start, result="error")
+            log.error("書き込み失敗", extra={"rows": len(batch), "error": str(e)})
+            # 新しい変更が無いキーだけ次回に再送
+            with self.lock:
+                for ns, key, value in batch:
+                    self.pending.setdefault(
+                        (ns, key), _DELETED if value is None else json.loads(value)
+                    )
+            return False
+
+    async def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch = self._take()
+        if await asyncio.get_running_loop().run_in_executor(self.executor, self._write, batch):
+            self.retry_delay = 0.0
+            for listener in self.commit_listeners:
+                listener([(ns, key) for ns, key, _ in batch])
+        elif batch:
+            self._retry()
+
+    # ---------- 他プロセスの変更の取り込み ----------
+    async def reload(self, ns: str, key: str) -> bool:
+        table = self.tables.get(ns)
+        if table is None:
+            return False
+        if (ns, key) in self.pending:
+            return False  # こちらの未書き込みの変更を優先
+
+        def read():
+            with self.db_lock:
+                return self.conn.execute(
+                    "SELECT value FROM kv WHERE ns = ? AND key = ?", (ns, key)
+                ).fetchone()
+
+        row = await asyncio.get_running_loop().run_in_executor(self.executor, read)
+        if row is None:
+            table.cache.pop(key, None)
+        else:
+            table.cache[key] = json.loads(row[0])
+        return True
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        self.executor.shutdown(wait=True)
+        self._write(self._take())
+        self.conn.close()
+
+
+# --------------------------
+# Bot ごとの名前空間（ホストモードで1つのストレージを複数の Bot で使う）
+# --------------------------
+class StorageView:
+    def __init__(self, storage: Storage, namespace: str):
+        self.storage = storage
+        self.namespace = namespace
+
+    def table(self, name: str, legacy: str | None = None) -> Table:
+        # 旧 JSON ファイルは単独起動時のデータなので取り込まない
+        return self.storage.table(f"{self.namespace}:{name}")
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+_storage: Storage | None = None
+_views: dict[str, StorageView] = {}
+
+
+def get_storage(bot=None) -> Storage | StorageView:
+    global _storage
+    if _storage is None:
+        _storage = Storage()
+    host = getattr(bot, "host", None)
+    namespace = host.profile.namespace if host else ""
+    if not namespace:
+        return _storage
+    view = _views.get(namespace)
+    if view is None:
+        view = _views[namespace] = StorageView(_storage, namespace)
+    return view
+
+
+# --------------------------
+# 有効期限付きテーブル（TTL + 上限 + 定期掃除）
+# --------------------------
+class ExpiringTable:
+    def __init__(self, table: Table | None, ttl: float, max_size: int, sweep_interval: float = 60.0):
+        self.table = table  # None ならメモリ上だけで保持する
+        self.ttl = ttl
+        self.max_size = max_size
+        self.sweep_interval = sweep_interval
+        self.task: asyncio.Task | None = None
+
+        # 期限順（TTL は一定なので挿入順 = 期限順）
+        self.entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        now = time.time()
+        rows = []
+        for key, row in list(table.items()) if table is not None else ():
+            if isinstance(row, dict) and row.get("expires", 0) > now:
+                rows.append((row["expires"], key, row["value"]))
+            else:
+                table.delete(key)  # 期限切れ・旧形式のデータは破棄
+        for expires, key, value in sorted(rows, key=lambda r: r[0]):
+            self.entries[key] = (expires, value)
+        self._trim()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entry = self.entries.get(str(key))
+        if entry is None or entry[0] <= time.time():
+            return default
+        return entry[1]
+
+    def set(self, key, value):
+        key = str(key)
+        expires = time.time() + self.ttl
+        self.entries.pop(key, None)
+        self.entries[key] = (expires, value)
+        self._write(key, {"value": value, "expires": expires})
+        self._trim()
+
+    def pop(self, key, default=None):
+        key = str(key)
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return default
+        self._write(key, None)
+        return entry[1]
+
+    def _write(self, key: str, row):
+        if self.table is None:
+            return
+        if row is None:
+            self.table.delete(key)
+        else:
+            self.table.set(key, row)
+
+    def _trim(self):
+        # 上限を超えたら古いものから捨てる
+        while len(self.entries) > self.max_size:
+            key, _ = self.entries.popitem(last=False)
+            self._write(key, None)
+
+    def sweep(self) -> int:
+        now = time.time()
+        removed = 0
+        while self.entries:
+            key, (expires, _) = next(iter(self.entries.items()))
+            if expires > now:
+                break
+            del self.entries[key]
+            self._write(key, None)
+            removed += 1
+        return removed
+
+    # ---------- 定期掃除 ----------
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._sweeper())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+
+import discord
+
+from bot.config import TICKET_POOL_SIZE
+from bot.storage import get_storage
+
+log = logging.getLogger(__name__)
+
+CATEGORY_NAME = "Tickets"
+POOL_PREFIX = "ticket-pool"  # 待機チャンネルの名前（判定は保存した ID で行う）
+
+
+# --------------------------
+# チケットチャンネルの事前作成プール
+# --------------------------
+class TicketEngine:
+    def __init__(self, bot, pool_size: int = TICKET_POOL_SIZE):
+        self.bot = bot
+        self.pool_size = pool_size
+        self.categories = get_storage(bot).table("ticket_categories")  # guild_id -> category_id
+        # guild_id -> 待機チャンネル ID（名前で拾うと "ticket-pool…" という名前のユーザーのチケットと区別できない）
+        self.pool_ids = get_storage(bot).table("ticket_pools")
+        self.pools: dict[int, list[int]] = {}
+        self.locks: dict[int, asyncio.Lock] = {}
+        self.refills: dict[int, asyncio.Task] = {}
+
+    def lock(self, guild_id: int) -> asyncio.Lock:
+        # 作成処理はギルドごとに直列化（カテゴリの二重作成を防ぐ）
+        return self.locks.setdefault(guild_id, asyncio.Lock())
+
+    # ---------- カテゴリ ----------
+    def cached_category(self, guild: discord.Guild):
+        category_id = self.categories.get(guild.id)
+        if category_id:
+            category = guild.get_channel(int(category_id))
+            if isinstance(category, discord.CategoryChannel):
+                return category
+        return None
+
+    async def category(self, guild: discord.Guild) -> discord.CategoryChannel:
+        category = self.cached_category(guild)
+        if category:
+            return category
+
+        async with self.lock(guild.id):
+            category = self.cached_category(guild)
+            if category:
+                return category
+            category = discord.utils.get(guild.categories, name=CATEGORY_NAME)
+            if not category:
+                category = await guild.create_category(
+                    CATEGORY_NAME,
+                    overwrites={guild.default_role: discord.PermissionOverwrite(read_messages=False)},
+                )
+            self.categories.set(guild.id, str(category.id))
+            self.pools.pop(guild.id, None)
+            self.pool_ids.delete(guild.id)
+            return category
+
+    # ---------- プール ----------
+    def _pool(self, guild: discord.Guild, category: discord.CategoryChannel) -> list[int]:
+        pool = self.pools.get(guild.id)
+        if pool is None:
+            # 再起動後は保存しておいた ID から、まだカテゴリに残っているものを拾い直す
+            existing = {ch.id for ch in category.text_channels}
+            pool = self.pools[guild.id] = [
+                int(channel_id) for channel_id in self.pool_ids.get(guild.id, []) if int(channel_id) in existing
+            ]
+        return pool
+
+    def _save(self, guild_id: int):
+        pool = self.pools.get(guild_id)
+        if pool:
+            self.pool_ids.set(guild_id, list(pool))
+        else:
+            self.pool_ids.delete(guild_id)
+
+    def discard(self, channel_id: int, guild_id: int):
+        pool = self.pools.get(guild_id)
+        if pool and channel_id in pool:
+            pool.remove(channel_id)
+            self._save(guild_id)
+
+    def schedule_refill(self, guild: discord.Guild):
+        task = self.refills.get(guild.id)
+        if task is None or task.done():
+            self.refills[guild.id] = asyncio.create_task(self._refill(guild))
+
+    async def _refill(self, guild: discord.Guild):
+        try:
+            category = await self.category(guild)
+            pool = self._pool(guild, category)
+            while len(pool) < self.pool_size:
+                # 1チャンネルずつロックを取り、チケット作成を長く待たせない
+                async with self.lock(guild.id):
+                    channel = await guild.create_text_channel(
+                        f"{POOL_PREFIX}-{len(pool) + 1}",
+                        category=category,
+                        overwrites={
+                            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                            guild.me: discord.PermissionOverwrite(read_messages=True),
+                        },
+                    )
+                pool.append(channel.id)
+                self._save(guild.id)
+        except discord.HTTPException as e:
+            log.warning("プール補充失敗", extra={"guild_id": guild.id, "error": str(e)})
+
+    def _take(self, pool: list[int], guild: discord.Guild):
+        channel = None
+        while pool and channel is None:
+            channel = guild.get_channel(pool.pop(0))
+        self._save(guild.id)
+        return channel
+
+    # ---------- チケット作成 ----------
+    async def open(self, guild: discord.Guild, user: discord.Member) -> discord.TextChannel:
+        category = await self.category(guild)
+        name = f"ticket-{user.name}"
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            guild.me: discord.PermissionOverwrite(read_messages=True),
+            user: discord.PermissionOverwrite(read_messages=True),
+        }
+
+        pool = self._pool(guild, category)
+        channel = self._take(pool, guild)
+        if channel is None:
+            async with self.lock(guild.id):
+                # 補充中のチャンネルができていればそれを使う
+                channel = self._take(pool, guild)
+                if channel is None:
+                    channel = await guild.create_text_channel(name, category=category, overwrites=overwrites)
+                    self.schedule_refill(guild)
+                    return channel
+
+        # 待機チャンネルを名前と権限の変更1回で割り当てる
+        channel = await channel.edit(name=name, overwrites=overwrites) or channel
+        self.schedule_refill(guild)
+        return channel
+
+
+# --------------------------
+# 開いているチケットの索引（ギルド×ユーザー / チャンネル）
+# --------------------------
+class TicketRegistry:
+    def __init__(self, bot):
+        self.table = get_storage(bot).table("tickets")  # channel_id -> {"guild_id", "user_id"}
+        self.by_user: dict[int, dict[int, int]] = {}
+        self.by_channel: dict[int, tuple[int, int]] = {}
+        for channel_id, ticket in self.table.items():
+            self._index(int(channel_id), ticket["guild_id"], ticket["user_id"])
+
+    def _index(self, channel_id: int, guild_id: int, user_id: int):
+        self.by_user.setdefault(guild_id, {})[user_id] = channel_id
+        self.by_channel[channel_id] = (guild_id, user_id)
+
+    # ---------- 参照 ----------
+    def get(self, guild_id: int, user_id: int) -> int | None:
+        return self.by_user.get(guild_id, {}).get(user_id)
+
+    def owner(self, channel_id: int) -> tuple[int, int] | None:
+        return self.by_channel.get(channel_id)
+
+    def count(self, guild_id: int) -> int:
+        return len(self.by_user.get(guild_id, {}))
+
+    # ---------- 更新 ----------
+    def add(self, guild_id: int, user_id: int, channel_id: int):
+        self._index(channel_id, guild_id, user_id)
+        self.table.set(channel_id, {"guild_id": guild_id, "user_id": user_id})
+
+    def remove(self, channel_id: int):
+        entry = self.by_channel.pop(channel_id, None)
+        if entry is None:
+            return
+        guild_id, user_id = entry
+        users = self.by_user.get(guild_id, {})
+        if users.get(user_id) == channel_id:
+            del users[user_id]
+        self.table.delete(channel_id)
+
+    # ---------- 再起動時の再構築 ----------
+    def rebuild(self, guild: discord.Guild, category: discord.CategoryChannel):
+        found = {}
+        for channel in category.text_channels:
+            if not channel.name.startswith("ticket-"):
+                continue
+            # 閲覧を許可されているメンバー（Bot 以外）が持ち主（待機チャンネルにはいないので拾われない）
+            for target, overwrite in channel.overwrites.items():
+                if isinstance(target, discord.Role) or target.id == guild.me.id:
+                    continue
+                if overwrite.read_messages:
+                    found[channel.id] = target.id
+                    break
+
+        for channel_id, (guild_id, _) in list(self.by_channel.items()):
+            if guild_id == guild.id and channel_id not in found:
+                self.remove(channel_id)
+        for channel_id, user_id in found.items():
+            if self.owner(channel_id) != (guild.id, user_id):
+                self.add(guild.id, user_id, channel_id)
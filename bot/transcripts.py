@@ -0,0 +1,103 @@
+import os
+import contextlib
+import gzip
+import json
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+import discord
+
+from bot.config import TRANSCRIPT_DIR, TRANSCRIPT_CONCURRENCY
+
+log = logging.getLogger(__name__)
+
+PAGE_SIZE = 100  # この件数ごとにまとめてファイルへ書き出す
+
+
+# --------------------------
+# チケットのトランスクリプト保存（gzip 圧縮 JSONL）
+# --------------------------
+class TranscriptArchiver:
+    def __init__(self, directory: str = TRANSCRIPT_DIR, per_guild: int = TRANSCRIPT_CONCURRENCY):
+        self.directory = directory
+        self.per_guild = per_guild
+        self.sems: dict[int, asyncio.Semaphore] = {}
+        self.jobs: dict[int, asyncio.Task] = {}  # channel_id -> 保存ジョブ
+
+    def submit(self, channel: discord.TextChannel, then=None) -> asyncio.Task:
+        # 同じチャンネルの二重保存はしない
+        task = self.jobs.get(channel.id)
+        if task is None:
+            task = self.jobs[channel.id] = asyncio.create_task(self._run(channel, then))
+        return task
+
+    async def _run(self, channel: discord.TextChannel, then):
+        sem = self.sems.setdefault(channel.guild.id, asyncio.Semaphore(self.per_guild))
+        try:
+            async with sem:
+                path = await self.archive(channel)
+            log.info("トランスクリプトを保存しました", extra={"channel_id": channel.id, "path": path})
+            if then:
+                await then(path)
+        except Exception as e:
+            # 保存できなかった場合はチャンネルを残す
+            log.error("トランスクリプトの保存に失敗", extra={"channel_id": channel.id, "error": str(e)})
+            try:
+                await channel.send("⚠️ トランスクリプトの保存に失敗したため、チャンネルの削除を中止しました")
+            except discord.HTTPException:
+                pass
+        finally:
+            self.jobs.pop(channel.id, None)
+
+    async def archive(self, channel: discord.TextChannel) -> str:
+        folder = os.path.join(self.directory, str(channel.guild.id))
+        closed_at = datetime.now(timezone.utc)
+        path = os.path.join(folder, f"{channel.id}-{closed_at:%Y%m%d%H%M%S}.jsonl.gz")
+        partial = path + ".part"
+
+        await asyncio.to_thread(os.makedirs, folder, exist_ok=True)
+        f = await asyncio.to_thread(gzip.open, partial, "wt", encoding="utf-8")
+        try:
+            header = {
+                "type": "meta",
+                "guild_id": channel.guild.id,
+                "channel_id": channel.id,
+                "channel": channel.name,
+                "closed_at": closed_at.isoformat(),
+            }
+            page = [json.dumps(header, ensure_ascii=False)]
+
+            # 履歴はページ単位で取得・書き出しし、メモリに溜め込まない
+            async for message in channel.history(limit=None, oldest_first=True):
+                page.append(json.dumps(self._record(message), ensure_ascii=False))
+                if len(page) >= PAGE_SIZE:
+                    await asyncio.to_thread(f.write, "\n".join(page) + "\n")
+                    page = []
+            if page:
+                await asyncio.to_thread(f.write, "\n".join(page) + "\n")
+        except BaseException:
+            # 取得・書き込みに失敗した書きかけは残さない（キャンセル中でも確実に消えるよう同期で）
+            f.close()
+            with contextlib.suppress(OSError):
+                os.remove(partial)
+            raise
+        else:
+            await asyncio.to_thread(f.close)
+
+        # 書き終わってから名前を付け替える（途中で落ちても不完全なファイルを残さない）
+        await asyncio.to_thread(os.replace, partial, path)
+        return path
+
+    @staticmethod
+    def _record(message: discord.Message) -> dict:
+        return {
+            "id": message.id,
+            "author_id": message.author.id,
+            "author": str(message.author),
+            "created_at": message.created_at.isoformat(),
+            "edited_at": message.edited_at.isoformat() if message.edited_at else None,
+            "content": message.content,
+            "attachments": [a.url for a in message.attachments],
+            "embeds": [e.to_dict() for e in message.embeds],
+        }
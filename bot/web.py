@@ -0,0 +1,60 @@
+import logging
+
+from aiohttp import web
+
+from bot.config import WEB_HOST, WEB_PORT
+
+log = logging.getLogger(__name__)
+
+
+# --------------------------
+# Bot のイベントループ上で動く HTTP サーバー
+# --------------------------
+class WebServer:
+    def __init__(self, host: str = WEB_HOST, port: int = WEB_PORT):
+        self.host = host
+        self.port = port
+        self.app = web.Application()
+        self.runner: web.AppRunner | None = None
+        # 起動後もルートを追加・削除できるよう自前で振り分ける
+        self.routes: dict[tuple[str, str], object] = {}
+        self.app.router.add_route("*", "/{tail:.*}", self._dispatch)
+
+    def add_route(self, method: str, path: str, handler):
+        self.routes[(method.upper(), path)] = handler
+
+    def remove_route(self, method: str, path: str):
+        self.routes.pop((method.upper(), path), None)
+
+    async def _dispatch(self, request: web.Request):
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            raise web.HTTPNotFound()
+        return await handler(request)
+
+    @property
+    def running(self) -> bool:
+        return self.runner is not None
+
+    async def start(self):
+        if self.runner:
+            return
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        log.info("HTTP サーバー起動", extra={"host": self.host, "port": self.port})
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+_server: WebServer | None = None
+
+
+def get_web_server() -> WebServer:
+    global _server
+    if _server is None:
+        _server = WebServer()
+    return _server